@@ -2,24 +2,35 @@ import os
 import re
 from langchain.agents import Tool
 from backend.tools.llm_tools import stream_grok
+from backend.tools.prompt_builder import PromptTemplate
 from backend.tools.refactored_retriever import RAGRetriever
-from backend.tools.image_fetcher import fetch_figures_only, search_subchapter_by_query
-from backend.tools.video_fetcher import fetch_animated_videos
-
-# Initialize RAG retriever
-rag_retriever = RAGRetriever(
-    knowledge_path="backend/knowledgebase.json",
-    metadata_path="backend/metadata.json",
-    embed_path="backend/title_embeddings.npy",
-    index_path="backend/faiss_index_ms_marco.index"
-)
+from backend.tools.startup import load_once
+from backend.tools.image_fetcher import search_figures
+from backend.tools.progress import TopicOrder
+from backend.tools.video_worker import video_worker
+
+# RAG retriever is built on first use (or by the startup warmup in main.py)
+@load_once
+def get_rag_retriever() -> RAGRetriever:
+    return RAGRetriever(
+        knowledge_path="backend/knowledgebase.json",
+        metadata_path="backend/metadata.json",
+        embed_path="backend/title_embeddings.npy",
+        index_path="backend/faiss_index_ms_marco.index"
+    )
+
+
+@load_once
+def get_topic_order() -> TopicOrder:
+    # Textbook order of the sections, for predicting the next lesson
+    return TopicOrder(get_rag_retriever().store.titles())
 
 
 def custom_retrieve_tool(input_text: str) -> str:
     """
     Retrieve top-k textbook passages for the input query.
     """
-    results = rag_retriever.retrieve(input_text, k=5)
+    results = get_rag_retriever().retrieve(input_text, k=5)
     return "\n".join(results)
 
 
@@ -39,75 +50,108 @@ tools = [
 ]
 
 
-def get_lesson_prompt(subtopic: str) -> str:
-    """
-    Constructs the base lesson prompt for streaming a lesson sentence-by-sentence.
-    Media tags and halting logic are handled here; resume logic is in get_resume_prompt.
-    """
-    retrieved = custom_retrieve_tool(subtopic)
-    if not retrieved.strip():
-        return (
-            f"⚠️ You are deviating from the lesson topic. "
-            f"Here’s a general, engaging explanation of '{subtopic}'—"  
-            "stream it sentence by sentence, and after each sentence emit the token [[HALT]]."
-        )
-
-    retrieved_cleaned = strip_figure_mentions(retrieved)
-    exact_subchapter = search_subchapter_by_query(subtopic)
-    figures = fetch_figures_only(exact_subchapter) if exact_subchapter else []
-    video = fetch_animated_videos(subtopic)
-
-    image_list = (
-        "\n".join(f"<<image:{os.path.basename(f['path'])}>>" for f in figures)
-        if figures else "- None found"
-    )
-    video_tag = f"<<video:{video['id']}>>" if video and video.get("id") else "None"
-
-    return (
-        f"You are a fun and interactive 8th-grade science teacher.\n"
-        f"Topic: '{subtopic}'.\n\n"
+LESSON_TEMPLATE = PromptTemplate(
+    "lesson",
+    prefix=(
+        "You are a fun and interactive 8th-grade science teacher.\n"
         "Use the textbook content below (ground every explanation in it). "
         "Stream your lesson one complete sentence at a time, and after each sentence output the token [[HALT]]. "
         "That signal tells the front end it can pause for student questions.\n\n"
+    ),
+    body=(
+        "Topic: '{subtopic}'.\n\n"
         "# Lesson Content:\n"
-        f"{retrieved_cleaned}\n\n"
+        "{content}\n\n"
         "# Available images (embed with <<image:NAME>>):\n"
-        f"{image_list}\n\n"
+        "{image_list}\n\n"
         "# Available video (embed with <<video:ID>>):\n"
-        f"{video_tag}\n\n"
+        "{video_tag}\n\n"
         "Now, begin your flowing lesson. Whenever it makes sense to illustrate visually, "
         "insert the exact inline tag (<<image:...>> or <<video:...>>). "
         "Avoid repeating media. After each two or three related points, "
         "pose a follow-up question (e.g., 'Still with me?' or 'Need more detail?') "
         "as part of your streaming—always finishing each question sentence with [[HALT]]."
-    )
+    ),
+)
+
+RESUME_TEMPLATE = PromptTemplate(
+    "resume",
+    prefix=(
+        "You are a friendly 8th-grade science teacher continuing a lesson.\n"
+        "First, welcome the student back with a natural bridge that recalls the point below, ending with [[HALT]].\n"
+        "Then continue the lesson, one complete sentence at a time, each ending with [[HALT]].\n\n"
+    ),
+    body=(
+        "Topic: '{subtopic}'.\n"
+        "The last thing I said was:\n\n"
+        "    \"{last_halt}\"\n\n"
+        "# Lesson Context (do not repeat):\n"
+        "{content}\n\n"
+        "# Available images (embed with <<image:NAME>>):\n"
+        "{image_list}\n\n"
+        "# Available video (embed with <<video:ID>>):\n"
+        "{video_tag}\n"
+    ),
+)
 
 
-def get_resume_prompt(last_halt: str, subtopic: str) -> str:
-    
-    print(f"[get_resume_prompt] last_halt={last_halt!r}, subtopic={subtopic!r}")
-    retrieved = custom_retrieve_tool(subtopic)
-    retrieved_cleaned = strip_figure_mentions(retrieved)
-    exact_subchapter = search_subchapter_by_query(subtopic)
-    figures = fetch_figures_only(exact_subchapter) if exact_subchapter else []
-    video = fetch_animated_videos(subtopic)
+def retrieve_passages(subtopic: str, k: int = None):
+    """
+    Retrieve (score, passage) pairs with figure mentions stripped, ready for packing.
+    """
+    return [
+        (score, strip_figure_mentions(content))
+        for score, content in get_rag_retriever().retrieve_scored(subtopic, k=k)
+    ]
+
+
+def get_media_tags(subtopic: str):
+    figures = search_figures(subtopic)
+    # Never wait for yt_dlp here: a video that is not known yet is pushed by the lesson stream later
+    video = video_worker.peek(subtopic)
 
     image_list = (
         "\n".join(f"<<image:{os.path.basename(f['path'])}>>" for f in figures)
         if figures else "- None found"
     )
     video_tag = f"<<video:{video['id']}>>" if video and video.get("id") else "None"
+    return image_list, video_tag
+
 
+def get_lesson_prompt(subtopic: str) -> str:
+    """
+    Constructs the base lesson prompt for streaming a lesson sentence-by-sentence.
+    Media tags and halting logic are handled here; resume logic is in get_resume_prompt.
+    """
+    passages = retrieve_passages(subtopic)
+    if not passages:
+        return (
+            f"⚠️ You are deviating from the lesson topic. "
+            f"Here’s a general, engaging explanation of '{subtopic}'—"  
+            "stream it sentence by sentence, and after each sentence emit the token [[HALT]]."
+        )
+
+    image_list, video_tag = get_media_tags(subtopic)
+    return LESSON_TEMPLATE.build(passages, subtopic=subtopic, image_list=image_list, video_tag=video_tag)
+
+
+def get_continuation_prompt(prompt: str, opening: str) -> str:
+    """
+    A lesson prompt for a lesson whose opening sentence was already sent (from the prefetch cache).
+    """
     return (
-        f"You are a friendly 8th-grade science teacher continuing the lesson on '{subtopic}'.\n"
-        f"The last thing I said was:\n\n"
-        f"    \"{last_halt}\"\n\n"
-        "First, welcome the student back with a natural bridge that recalls that point, ending with [[HALT]].\n"
-        "Then continue the lesson, one complete sentence at a time, each ending with [[HALT]].\n\n"
-        "# Lesson Context (do not repeat):\n"
-        f"{retrieved_cleaned}\n\n"
-        "# Available images (embed with <<image:NAME>>):\n"
-        f"{image_list}\n\n"
-        "# Available video (embed with <<video:ID>>):\n"
-        f"{video_tag}\n"
-    )
\ No newline at end of file
+        f"{prompt}\n\n"
+        "You have already said the opening sentence below; do not repeat it. "
+        "Continue the lesson right after it, one complete sentence at a time, each ending with [[HALT]].\n\n"
+        f"    \"{opening}\""
+    )
+
+
+def get_resume_prompt(last_halt: str, subtopic: str) -> str:
+    
+    print(f"[get_resume_prompt] last_halt={last_halt!r}, subtopic={subtopic!r}")
+    passages = retrieve_passages(subtopic)
+    image_list, video_tag = get_media_tags(subtopic)
+    return RESUME_TEMPLATE.build(
+        passages, subtopic=subtopic, last_halt=last_halt, image_list=image_list, video_tag=video_tag
+    )
@@ -1,20 +1,108 @@
+import asyncio
+import json
 import os
 import re
-from fastapi import FastAPI, WebSocket
+import time
+from collections import deque
+from fastapi import FastAPI, Request, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import StreamingResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
 
-from backend.agent import get_lesson_prompt, get_resume_prompt, rag_retriever
+from backend.agent import get_continuation_prompt, get_lesson_prompt, get_resume_prompt, get_rag_retriever, get_topic_order
+from backend.tools import image_fetcher, llm_router, prompt_builder
+from backend.tools.admission import BACKGROUND, INTERACTIVE, LIVE, Overloaded, admission, rate_limiter
+from backend.tools.answer_cache import answer_cache, is_follow_up, replay
+from backend.tools.embedding_cache import embedding_cache
+from backend.tools.image_delivery import ImageStore, not_modified, response_headers
 from backend.tools.llm_tools import stream_grok, summarize_text
+from backend.tools.progress import LessonPrefetcher, PrefetchedLesson, ProgressStore, register
+from backend.tools.startup import on_warmup, start_warmup, readiness, record_request
+from backend.tools.tracing import observe, registry, span, start_trace
+from backend.tools.video_worker import video_worker
 
 app = FastAPI()
 
-# Serve images
+# Most recent sampled request traces, served at /traces
+recent_traces = deque(maxlen=100)
+
+# --------- Startup ---------
+
+@on_warmup
+def warm_retriever():
+    get_rag_retriever().preload_titles()
+
+@on_warmup
+def warm_images():
+    image_fetcher.warmup()
+
+@on_warmup
+def warm_video_worker():
+    video_worker.warmup()
+
+@app.on_event("startup")
+async def schedule_warmup():
+    # Runs in a background thread so uvicorn can bind the socket immediately
+    start_warmup()
+
+@app.on_event("shutdown")
+async def stop_video_worker():
+    video_worker.shutdown()
+
+@app.get("/stats")
+async def stats():
+    return {
+        "admission": admission.stats(),
+        "rate_limits": rate_limiter.stats(),
+        "answer_cache": answer_cache.stats(),
+        "embedding_cache": embedding_cache.stats(),
+        "llm": llm_router.router.stats(),
+        "prompts": prompt_builder.stats.summary(),
+        "video": video_worker.stats(),
+        "prefetch": prefetcher.stats(),
+        "progress": {"sessions": len(progress)},
+    }
+
+@app.get("/progress/{session}")
+async def session_progress(session: str):
+    return progress.get(session)
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/traces")
+async def traces():
+    return list(recent_traces)
+
+@app.get("/ready")
+async def ready():
+    status = readiness()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+# Serve images (resized variants built offline: python -m backend.tools.image_delivery <image dir>)
 def get_image_dir():
     return os.path.join(os.path.dirname(__file__), "tools", "images")
-app.mount("/images", StaticFiles(directory=get_image_dir()), name="images")
+image_store = ImageStore(get_image_dir())
+
+IMAGE_TAG_RE = re.compile(r"<<image:\s*([^\s>]+)\s*>>")
+
+def image_versions(prompt: str) -> dict:
+    """{name: ?v= value} for the figures a lesson prompt offers, so the client can request cacheable URLs."""
+    versions = {name: image_store.version(name) for name in set(IMAGE_TAG_RE.findall(prompt))}
+    return {name: version for name, version in versions.items() if version}
+
+@app.get("/images/{filename:path}")
+async def send_figure(filename: str, request: Request, w: int = None, v: str = None):
+    # ?w= picks the smallest variant at least that wide; WebP if the browser accepts it
+    found = image_store.select(filename, w, request.headers.get("accept", ""))
+    if found is None:
+        return JSONResponse({"detail": "Not Found"}, status_code=404)
+    path, etag, media_type = found
+    headers = response_headers(etag, versioned=v is not None and v == image_store.version(filename))
+    if not_modified(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=media_type, headers=headers)
 
 # CORS
 app.add_middleware(
@@ -27,33 +115,33 @@ app.add_middleware(
 
 # --------- Helpers ---------
 
+def overloaded_response(e: Overloaded):
+    return JSONResponse(
+        {"detail": str(e), "retry_after": e.retry_after},
+        status_code=503,
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
 async def classify_confirmation(reply: str) -> bool:
     prompt = (
         f"You are a tutor. The student replied:\n\"{reply}\"\n"
         "Does this mean 'no more doubts'? Answer 'Yes' or 'No'."
     )
     response = ""
-    async for chunk in stream_grok(prompt):
+    async for chunk in stream_grok(prompt, task="classify"):
         response += chunk
     return response.strip().lower().startswith("y")
 
 # --------- Chat Endpoint ---------
 
-class ChatRequest(BaseModel):
-    subtopic: str
-    history: list[dict]
-    question: str
-
-@app.post("/chat")
-async def chat(req: ChatRequest):
-    q = req.question.strip()
-
+def build_chat_prompt(subtopic: str, history: list[dict], question: str) -> str:
     # Retrieve lesson context via RAG
-    lesson_content = "\n".join(rag_retriever.retrieve(req.subtopic, k=5)).strip() or "⚠️ (No lesson content found)"
+    with span("retrieval.total"):
+        lesson_content = "\n".join(get_rag_retriever().retrieve(subtopic, k=5)).strip() or "⚠️ (No lesson content found)"
 
     # Unified system prompt—no hard-coded branches in code
-    system_prompt = f"""
-You are an expert 8th-grade science teacher. The lesson content on "{req.subtopic}" is:
+    return f"""
+You are an expert 8th-grade science teacher. The lesson content on "{subtopic}" is:
 
 ---
 {lesson_content}
@@ -73,7 +161,7 @@ When the student asks a question, follow these instructions exactly:
 
 4. **Check-in**:  
    - End every response with exactly one context-specific check-in question about what you just explained, for example:  
-     • "Did this cover everything you needed on {req.subtopic}?"  
+     • "Did this cover everything you needed on {subtopic}?"  
      • "Does that clarify how the brain integrates sensory inputs?"
 
 5. **Doubt follow-ups**:  
@@ -84,15 +172,129 @@ When the student asks a question, follow these instructions exactly:
    - If the student replies to your check-in with “yes” or “no” (or equivalent indicating no more doubts), respond with exactly `[[RESUME_LESSON]]` and nothing else.
 
 Here is the conversation so far:
-{chr(10).join(f"{turn['role'].upper()}: {turn['text']}" for turn in req.history)}
-STUDENT: {q}
+{chr(10).join(f"{turn['role'].upper()}: {turn['text']}" for turn in history)}
+STUDENT: {question}
 """
 
-    async def event_stream():
-        async for chunk in stream_grok(system_prompt):
+class ChatRequest(BaseModel):
+    subtopic: str
+    history: list[dict]
+    question: str
+
+@app.post("/chat")
+async def chat(req: ChatRequest, request: Request):
+    start = time.perf_counter()
+    # Send "X-Trace: 1" to force a trace for this request
+    trace = start_trace("chat", force=request.headers.get("x-trace") == "1")
+    q = req.question.strip()
+
+    # Self-contained questions are answered from the semantic cache when a
+    # classmate already asked something equivalent about this subtopic
+    cacheable = not is_follow_up(q, req.history)
+    q_vector = None
+    if cacheable:
+        with span("answer_cache.lookup"):
+            # The encoder runs off the event loop so other streams keep flowing
+            q_vector = (await asyncio.to_thread(get_rag_retriever().embed_model.encode, [q], convert_to_numpy=True))[0]
+            cached = answer_cache.lookup(req.subtopic, q, q_vector)
+        if cached is not None:
+            record_request(time.perf_counter() - start)
+            headers = {"X-Answer-Cache": "hit"}
+            if trace is not None:
+                headers["Server-Timing"] = trace.server_timing()
+                recent_traces.append(trace.to_dict())
+            return StreamingResponse(replay(cached), media_type="text/plain", headers=headers)
+    else:
+        answer_cache.record_bypass()
+
+    try:
+        await admission.acquire_async(INTERACTIVE)
+    except Overloaded as e:
+        return overloaded_response(e)
+    slot_start = time.perf_counter()
+    released = False
+
+    def release_slot():
+        nonlocal released
+        if not released:
+            released = True
+            admission.release(time.perf_counter() - slot_start)
+
+    async def event_stream(system_prompt):
+        first = True
+        parts = []
+        llm_start = time.perf_counter()
+        try:
+            async for chunk in stream_grok(system_prompt, task="chat"):
+                if first:
+                    record_request(time.perf_counter() - start)
+                    first = False
+                parts.append(chunk)
+                yield chunk
+        finally:
+            release_slot()
+        if cacheable:
+            answer_cache.put(req.subtopic, q, q_vector, "".join(parts), time.perf_counter() - llm_start)
+        if trace is not None:
+            recent_traces.append(trace.to_dict())
+
+    # Everything that can fail between taking the slot and handing the stream to Starlette
+    # gives it back; the stream is run to its first chunk here so that, once started, its
+    # `finally` releases the slot even if the client leaves before the body is iterated
+    try:
+        body = event_stream(build_chat_prompt(req.subtopic, req.history, q))
+        first_chunk = await body.__anext__()
+    except StopAsyncIteration:
+        first_chunk = ""
+    except BaseException:
+        release_slot()
+        raise
+
+    async def response_body():
+        yield first_chunk
+        async for chunk in body:
             yield chunk
 
-    return StreamingResponse(event_stream(), media_type="text/plain")
+    # Only stages finished before streaming starts can go in the header;
+    # the full trace (including the LLM) is kept at /traces
+    headers = {"X-Answer-Cache": "miss" if cacheable else "bypass"}
+    if trace is not None:
+        headers["Server-Timing"] = trace.server_timing()
+    return StreamingResponse(response_body(), media_type="text/plain", headers=headers)
+
+# --------- Next-Topic Prefetch ---------
+
+async def prefetch_lesson(subtopic: str):
+    """Prompt (retrieval, figures, video) and opening sentence for `subtopic`, built before the student asks."""
+    start = time.perf_counter()
+    # Wait for the video here so the cached prompt can embed it
+    await video_worker.lookup(subtopic)
+    prompt = await asyncio.to_thread(get_lesson_prompt, subtopic)
+    if prompt.startswith("⚠️"):
+        return None
+    opening = ""
+    try:
+        async with admission.aslot(BACKGROUND):
+            stream = stream_grok(prompt)
+            try:
+                async for chunk in stream:
+                    opening += chunk
+                    if "[[HALT]]" in opening:
+                        break
+            finally:
+                # Stops the provider stream once the opening sentence is in
+                await stream.aclose()
+    except Overloaded:
+        return None
+    opening = opening.split("[[HALT]]", 1)[0].strip()
+    if not opening or opening.startswith("[Error]"):
+        return None
+    observe("prefetch.lesson", time.perf_counter() - start)
+    return PrefetchedLesson(subtopic, prompt, opening)
+
+# Completed subtopics per session (in memory, per process) and the next lessons built ahead of time
+progress = ProgressStore()
+prefetcher = register(LessonPrefetcher(prefetch_lesson))
 
 # --------- WebSocket Lesson Stream ---------
 
@@ -101,44 +303,127 @@ async def lesson_stream(websocket: WebSocket):
     await websocket.accept()
     data = await websocket.receive_json()
     print(f"[lesson_stream] Received payload: {data!r}")
+    # A payload with "trace": true forces a trace, returned as a [[TRACE]] frame before [[DONE]]
+    trace = start_trace("ws.lesson", force=bool(data.get("trace")))
+    start = time.perf_counter()
+    # Progress is tracked only under a client-supplied "session" id: students behind one
+    # school NAT share an address, so the address cannot stand in for it
+    session = data.get("session")
+    subtopic = data.get("subtopic")
+
+    # Live lesson streams are admitted ahead of chat and background work
+    try:
+        await admission.acquire_async(LIVE)
+    except Overloaded as e:
+        await websocket.send_text(f"⚠️ The class is very busy right now. Please try again in {e.retry_after} seconds.")
+        await websocket.close(code=1013)
+        return
+    slot_start = time.perf_counter()
+    try:
+        if session:
+            progress.record_started(session, subtopic)
+        buffer = await stream_lesson(websocket, data, start)
+    finally:
+        admission.release(time.perf_counter() - slot_start)
 
+    # Start building the next section in textbook order while the student reads the summary
+    if session:
+        progress.record_completed(session, subtopic)
+    # The first call loads the retriever, so it runs off the event loop
+    topic_order = await asyncio.to_thread(get_topic_order)
+    next_topic = topic_order.next_topic(subtopic, progress.completed(session) if session else ())
+    if next_topic:
+        prefetcher.schedule(next_topic)
+
+    # The summary is background work: skipped rather than queued behind live lessons when overloaded
+    await websocket.send_text("\n\n**Lesson Complete!**")
+    try:
+        async with admission.aslot(BACKGROUND):
+            summary = await summarize_text(buffer)
+        await websocket.send_text(f"**Summary:** {summary}")
+    except Overloaded:
+        pass
+    if trace is not None:
+        recent_traces.append(trace.to_dict())
+        if data.get("trace"):
+            await websocket.send_text("[[TRACE]]" + json.dumps(trace.to_dict()))
+    if next_topic:
+        await websocket.send_text(f"[[NEXT]]{next_topic}")
+    await websocket.send_text("[[DONE]]")
+    await websocket.close()
+
+
+async def stream_lesson(websocket: WebSocket, data: dict, start: float) -> str:
+    """Stream the lesson (fresh or resumed) to the socket; returns the unflushed tail."""
     # Decide whether starting fresh or resuming
     subtopic = data.get("subtopic")
     resume_text = data.get("resumeFrom")
+    prefetched = None
     if resume_text:
         print("[lesson_stream] Calling get_resume_prompt…")
-        prompt = get_resume_prompt(resume_text, subtopic)
+        prompt = await asyncio.to_thread(get_resume_prompt, resume_text, subtopic)
         print("[lesson_stream] Resumed prompt is:", prompt[:200], "...")
     else:
         print(f"[lesson_stream] → Starting fresh on topic: {subtopic!r}")
-        
-        prompt = get_lesson_prompt( subtopic)
+        prefetched = await prefetcher.take(subtopic)
+        if prefetched is not None:
+            prompt = prefetched.prompt
+        else:
+            # Encoding and index searches run off the event loop, as in prefetch_lesson
+            prompt = await asyncio.to_thread(get_lesson_prompt, subtopic)
     # If fallback warning
     if prompt.startswith("⚠️"):
         await websocket.send_text(f"\n{prompt}\n")
+        video_task = None
+    else:
+        # The prompt only names a video that was already known; the lesson starts now and a
+        # video found within the worker's deadline is pushed as its own frame at the next sentence break
+        video_task = asyncio.create_task(video_worker.lookup(subtopic))
 
-    buffer = ""
-    async for chunk in stream_grok(prompt):
-        buffer += chunk
+    async def push_video():
+        nonlocal video_task
+        if video_task is None or not video_task.done():
+            return
+        video, video_task = video_task.result(), None
+        if video and video.get("id") and f"<<video:{video['id']}>>" not in prompt:
+            await websocket.send_text(f"<<video:{video['id']}>>[[HALT]]")
 
-        # Flush everything up through each [[HALT]] marker immediately
-        while "[[HALT]]" in buffer:
-            before, after = buffer.split("[[HALT]]", 1)
-            await websocket.send_text(before + "[[HALT]]")
-            buffer = after
+    observe("lesson.prompt", time.perf_counter() - start)
+    versions = await asyncio.to_thread(image_versions, prompt)
+    if versions:
+        await websocket.send_text("[[IMAGES]]" + json.dumps(versions))
+    llm_prompt = prompt
+    if prefetched is not None:
+        # The opening sentence comes from the prefetch; the model picks up right after it
+        await websocket.send_text(prefetched.opening + "[[HALT]]")
+        observe("lesson.prefetched_opening", time.perf_counter() - start)
+        llm_prompt = get_continuation_prompt(prompt, prefetched.opening)
+    buffer = ""
+    stream_start = time.perf_counter()
+    try:
+        async for chunk in stream_grok(llm_prompt):
+            buffer += chunk
 
-        # Also flush on natural boundaries if buffer grows too large
-        if len(buffer) > 300 or buffer.endswith((".", "!", "?")):
-            await websocket.send_text(buffer)
-            buffer = ""
+            # Flush everything up through each [[HALT]] marker immediately
+            while "[[HALT]]" in buffer:
+                before, after = buffer.split("[[HALT]]", 1)
+                await websocket.send_text(before + "[[HALT]]")
+                buffer = after
+                await push_video()
 
-    # Flush any remaining text
-    if buffer:
-        await websocket.send_text(buffer)
+            # Also flush on natural boundaries if buffer grows too large
+            if len(buffer) > 300 or buffer.endswith((".", "!", "?")):
+                await websocket.send_text(buffer)
+                buffer = ""
 
-    # Lesson complete and summary
-    await websocket.send_text("\n\n**Lesson Complete!**")
-    summary = await summarize_text(buffer)
-    await websocket.send_text(f"**Summary:** {summary}")
-    await websocket.send_text("[[DONE]]")
-    await websocket.close()
+        # Flush any remaining text
+        if buffer:
+            await websocket.send_text(buffer)
+        if video_task is not None:
+            await asyncio.wait([video_task])
+            await push_video()
+    finally:
+        if video_task is not None:
+            video_task.cancel()
+    observe("stream.lesson", time.perf_counter() - stream_start)
+    return buffer
@@ -0,0 +1,307 @@
+"""
+Admission control for LLM-backed requests.
+
+* AdmissionController: at most LLM_MAX_ACTIVE requests hold a slot at once; the
+  rest wait in a bounded priority queue (live lesson streams first, background
+  work last). When the queue is full a more urgent request evicts the least
+  urgent waiter, otherwise it is shed with `Overloaded` carrying a Retry-After
+  estimate. Waiters give up after LLM_MAX_QUEUE_WAIT seconds.
+* TokenBucket / RateLimiter: per provider:model request rate limits, applied by
+  llm_router before each provider call so bursts are spread out (or failed over
+  to the hedge provider) instead of all hitting the provider's 429s together.
+"""
+import asyncio
+import heapq
+import itertools
+import json
+import math
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+from .tracing import metric_family, registry
+
+LIVE, INTERACTIVE, BACKGROUND = 0, 1, 2
+PRIORITY_NAMES = {LIVE: "live", INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+LLM_MAX_ACTIVE = int(os.environ.get("LLM_MAX_ACTIVE", "12"))
+LLM_MAX_QUEUE = int(os.environ.get("LLM_MAX_QUEUE", "48"))
+LLM_MAX_QUEUE_WAIT = float(os.environ.get("LLM_MAX_QUEUE_WAIT", "15"))
+
+# requests/second and burst per provider (or provider:model); override with
+# LLM_RATE_LIMITS='{"groq": [0.5, 10], "gemini:gemini-1.5-flash-8b-latest": [2, 20]}'
+DEFAULT_RATE_LIMITS = {"groq": (0.5, 10), "gemini": (1.0, 15)}
+LLM_RATE_LIMIT_WAIT = float(os.environ.get("LLM_RATE_LIMIT_WAIT", "5"))
+
+
+class Overloaded(RuntimeError):
+    """Raised when a request is shed; `retry_after` is a hint in seconds."""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# -------------------------
+# Priority admission
+# -------------------------
+class _Waiter:
+    __slots__ = ("priority", "seq", "notify", "state", "enqueued")
+
+    def __init__(self, priority, seq, notify):
+        self.priority = priority
+        self.seq = seq
+        self.notify = notify
+        self.state = "waiting"  # -> "granted" | "evicted" | "expired"
+        self.enqueued = time.perf_counter()
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class AdmissionController:
+    def __init__(self, max_active=LLM_MAX_ACTIVE, max_queue=LLM_MAX_QUEUE, max_wait=LLM_MAX_QUEUE_WAIT):
+        self.max_active = max_active
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.active = 0
+        self._queue = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._hold_ema = 5.0  # seconds a slot is typically held, for Retry-After
+        self.admitted = {name: 0 for name in PRIORITY_NAMES.values()}
+        self.shed = {"queue_full": 0, "evicted": 0, "timeout": 0}
+
+    def retry_after(self):
+        waiting = len(self._queue) + 1
+        return max(1, math.ceil(self._hold_ema * waiting / max(1, self.max_active)))
+
+    def _enqueue(self, priority, notify):
+        """Grant a slot now (returns None) or queue a waiter; raises Overloaded if shed."""
+        evicted = None
+        with self._lock:
+            if self.active < self.max_active and not self._queue:
+                self.active += 1
+                self.admitted[PRIORITY_NAMES[priority]] += 1
+                return None
+            if len(self._queue) >= self.max_queue:
+                worst = max(self._queue, default=None)
+                if worst is None or worst.priority <= priority:
+                    self.shed["queue_full"] += 1
+                    raise Overloaded("LLM queue is full", self.retry_after())
+                self._queue.remove(worst)
+                heapq.heapify(self._queue)
+                worst.state = "evicted"
+                self.shed["evicted"] += 1
+                evicted = worst
+            waiter = _Waiter(priority, next(self._seq), notify)
+            heapq.heappush(self._queue, waiter)
+        if evicted is not None:
+            evicted.notify()
+        return waiter
+
+    def _expire(self, waiter, reason="timeout"):
+        """Drop a waiter that gave up; returns False if it was granted meanwhile."""
+        with self._lock:
+            if waiter.state != "waiting":
+                return False
+            self._queue.remove(waiter)
+            heapq.heapify(self._queue)
+            waiter.state = "expired"
+            if reason:
+                self.shed[reason] += 1
+            return True
+
+    def _admitted(self, waiter):
+        registry.observe(f"admission.wait.{PRIORITY_NAMES[waiter.priority]}", time.perf_counter() - waiter.enqueued)
+        if waiter.state != "granted":
+            raise Overloaded("Request was displaced by higher-priority work", self.retry_after())
+
+    def release(self, held_seconds=None):
+        granted = None
+        with self._lock:
+            if held_seconds is not None:
+                self._hold_ema = 0.9 * self._hold_ema + 0.1 * held_seconds
+            if self._queue:
+                granted = heapq.heappop(self._queue)
+                granted.state = "granted"
+                self.admitted[PRIORITY_NAMES[granted.priority]] += 1
+            else:
+                self.active -= 1
+        if granted is not None:
+            granted.notify()
+
+    def acquire(self, priority=INTERACTIVE):
+        event = threading.Event()
+        waiter = self._enqueue(priority, event.set)
+        if waiter is None:
+            return
+        if not event.wait(self.max_wait) and self._expire(waiter):
+            raise Overloaded("Timed out waiting for an LLM slot", self.retry_after())
+        self._admitted(waiter)
+
+    async def acquire_async(self, priority=INTERACTIVE):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def notify():
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        waiter = self._enqueue(priority, notify)
+        if waiter is None:
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.max_wait)
+        except asyncio.TimeoutError:
+            if self._expire(waiter):
+                raise Overloaded("Timed out waiting for an LLM slot", self.retry_after())
+        except asyncio.CancelledError:
+            # Client went away while queued; hand back a slot granted in the meantime
+            if not self._expire(waiter, reason=None) and waiter.state == "granted":
+                self.release()
+            raise
+        self._admitted(waiter)
+
+    @contextmanager
+    def slot(self, priority=INTERACTIVE):
+        self.acquire(priority)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - start)
+
+    @asynccontextmanager
+    async def aslot(self, priority=INTERACTIVE):
+        await self.acquire_async(priority)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - start)
+
+    def stats(self):
+        with self._lock:
+            depth = {name: 0 for name in PRIORITY_NAMES.values()}
+            for waiter in self._queue:
+                depth[PRIORITY_NAMES[waiter.priority]] += 1
+            return {
+                "active": self.active,
+                "max_active": self.max_active,
+                "queue_depth": depth,
+                "max_queue": self.max_queue,
+                "admitted": dict(self.admitted),
+                "shed": dict(self.shed),
+                "retry_after": self.retry_after(),
+            }
+
+
+# -------------------------
+# Provider rate limits
+# -------------------------
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait):
+        """
+        Take one token, returning how long the caller must sleep before using it,
+        or None (nothing taken) if that would be longer than `max_wait`.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+            if wait > max_wait:
+                return None
+            self.tokens -= 1
+            return wait
+
+
+class RateLimited(RuntimeError):
+    """A provider's request budget is exhausted for longer than the allowed wait."""
+
+
+class RateLimiter:
+    def __init__(self, limits=None, max_wait=LLM_RATE_LIMIT_WAIT):
+        self.limits = dict(DEFAULT_RATE_LIMITS if limits is None else limits)
+        self.max_wait = max_wait
+        self.buckets = {}
+        self.waited = {}
+        self.rejected = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, key):
+        with self._lock:
+            if key not in self.buckets:
+                limit = self.limits.get(key) or self.limits.get(key.split(":", 1)[0])
+                self.buckets[key] = TokenBucket(*limit) if limit else None
+            return self.buckets[key]
+
+    def acquire(self, key):
+        """Block until `key` may send a request; raises RateLimited instead of waiting too long."""
+        bucket = self.bucket(key)
+        if bucket is None:
+            return
+        wait = bucket.reserve(self.max_wait)
+        with self._lock:
+            if wait is None:
+                self.rejected[key] = self.rejected.get(key, 0) + 1
+            elif wait:
+                self.waited[key] = self.waited.get(key, 0) + 1
+        if wait is None:
+            raise RateLimited(f"{key} rate limit exceeded")
+        if wait:
+            time.sleep(wait)
+
+    def stats(self):
+        with self._lock:
+            return {
+                key: {
+                    "rate": bucket.rate,
+                    "burst": bucket.burst,
+                    "tokens": round(bucket.tokens, 2),
+                    "waited": self.waited.get(key, 0),
+                    "rejected": self.rejected.get(key, 0),
+                }
+                for key, bucket in self.buckets.items() if bucket is not None
+            }
+
+
+def _load_rate_limits():
+    raw = os.environ.get("LLM_RATE_LIMITS")
+    if not raw:
+        return None
+    limits = dict(DEFAULT_RATE_LIMITS)
+    limits.update({key: tuple(value) for key, value in json.loads(raw).items()})
+    return limits
+
+
+admission = AdmissionController()
+rate_limiter = RateLimiter(_load_rate_limits())
+
+
+@registry.add_collector
+def _admission_metrics():
+    stats = admission.stats()
+    limits = sorted(rate_limiter.stats().items())
+    return (
+        metric_family("ai_teacher_llm_active", "gauge", "Requests holding an LLM admission slot.",
+                      [(None, stats["active"])])
+        + metric_family("ai_teacher_llm_queue_depth", "gauge", "Requests waiting for a slot per priority.",
+                        [({"priority": name}, n) for name, n in stats["queue_depth"].items()])
+        + metric_family("ai_teacher_llm_admitted_total", "counter", "Requests admitted per priority.",
+                        [({"priority": name}, n) for name, n in stats["admitted"].items()])
+        + metric_family("ai_teacher_llm_shed_total", "counter", "Requests shed per reason.",
+                        [({"reason": reason}, n) for reason, n in stats["shed"].items()])
+        + metric_family("ai_teacher_llm_rate_limit_tokens", "gauge", "Tokens left in each provider's bucket.",
+                        [({"provider": key}, bucket["tokens"]) for key, bucket in limits])
+        + metric_family("ai_teacher_llm_rate_limited_total", "counter", "Calls rejected by a provider rate limit.",
+                        [({"provider": key}, bucket["rejected"]) for key, bucket in limits])
+    )
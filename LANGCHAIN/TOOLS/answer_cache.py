@@ -0,0 +1,198 @@
+"""
+Semantic answer cache for /chat.
+
+Students in a class ask near-identical questions about the same subtopic
+("what is a combination reaction for 3 marks"). Answers are cached per
+(subtopic, marks) and looked up by cosine similarity of the question embedding;
+a hit above ANSWER_CACHE_THRESHOLD is replayed instead of calling the LLM.
+Entries expire after ANSWER_CACHE_TTL seconds and the least recently used are
+evicted beyond ANSWER_CACHE_SIZE.
+
+Questions that depend on the conversation (yes/no replies, "5th point",
+"what do you mean by that?") bypass the cache.
+"""
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from .startup import lazy_import
+from .tracing import metric_family, registry
+
+np = lazy_import("numpy")
+
+ANSWER_CACHE_THRESHOLD = float(os.environ.get("ANSWER_CACHE_THRESHOLD", "0.9"))
+ANSWER_CACHE_SIZE = int(os.environ.get("ANSWER_CACHE_SIZE", "2048"))
+ANSWER_CACHE_TTL = float(os.environ.get("ANSWER_CACHE_TTL", str(24 * 3600)))
+
+MARKS_RE = re.compile(r"\b(\d+)\s*marks?\b", re.IGNORECASE)
+SHORT_REPLY_RE = re.compile(
+    r"^\s*(yes|no|yeah|yep|nope|nah|ok(ay)?|sure|thanks?( you)?|got it|fine|not really)\b[\s.!?]*$",
+    re.IGNORECASE,
+)
+REFERENCE_RE = re.compile(
+    r"\b(\d+\s*(st|nd|rd|th)|first|second|third|fourth|fifth|last|next|previous)\s+point\b"
+    r"|\b(you (just )?(said|mentioned|told)|above|earlier|previous(ly)?|again|elaborate|expand on"
+    r"|what do you mean|explain (it|that|this|those|these))\b"
+    r"|^\s*(and|but|so|also|then)\b",
+    re.IGNORECASE,
+)
+# Answers that must never be replayed to another student
+UNCACHEABLE_MARKERS = ("[[RESUME_LESSON]]", "[Error]")
+
+
+def normalize_subtopic(subtopic):
+    return " ".join((subtopic or "").lower().split())
+
+
+def is_follow_up(question, history):
+    """True if the answer depends on this session's conversation, so the cache must be bypassed."""
+    if SHORT_REPLY_RE.match(question):
+        return True
+    if not history:
+        return False
+    return bool(REFERENCE_RE.search(question)) or len(question.split()) < 3
+
+
+class _Entry:
+    __slots__ = ("question", "vector", "answer", "created", "llm_seconds", "hits")
+
+    def __init__(self, question, vector, answer, llm_seconds):
+        self.question = question
+        self.vector = vector
+        self.answer = answer
+        self.created = time.time()
+        self.llm_seconds = llm_seconds
+        self.hits = 0
+
+
+class AnswerCache:
+    def __init__(self, threshold=ANSWER_CACHE_THRESHOLD, max_entries=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # (bucket, seq) -> _Entry, least recently used first
+        self._buckets = {}             # bucket -> [(bucket, seq), ...]
+        self._seq = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.stores = 0
+        self.saved_seconds = 0.0
+
+    @staticmethod
+    def bucket(subtopic, question):
+        # "for 3 marks" and "for 5 marks" embed almost identically but need different answers
+        marks = MARKS_RE.search(question)
+        return normalize_subtopic(subtopic), marks.group(1) if marks else None
+
+    @staticmethod
+    def _unit(vector):
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
+
+    def _drop(self, key):
+        self._entries.pop(key, None)
+        keys = self._buckets.get(key[0])
+        if keys is not None:
+            keys.remove(key)
+            if not keys:
+                del self._buckets[key[0]]
+
+    def lookup(self, subtopic, question, vector):
+        """Return the cached answer for the most similar question, or None."""
+        bucket = self.bucket(subtopic, question)
+        query = self._unit(vector)
+        now = time.time()
+        with self._lock:
+            for key in [k for k in self._buckets.get(bucket, ()) if now - self._entries[k].created > self.ttl]:
+                self._drop(key)
+            keys = self._buckets.get(bucket)
+            if not keys:
+                self.misses += 1
+                return None
+            scores = np.stack([self._entries[k].vector for k in keys]) @ query
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+            key = keys[best]
+            entry = self._entries[key]
+            self._entries.move_to_end(key)
+            entry.hits += 1
+            self.hits += 1
+            self.saved_seconds += entry.llm_seconds
+            return entry.answer
+
+    def put(self, subtopic, question, vector, answer, llm_seconds):
+        if not answer.strip() or any(marker in answer for marker in UNCACHEABLE_MARKERS):
+            return False
+        bucket = self.bucket(subtopic, question)
+        with self._lock:
+            self._seq += 1
+            key = (bucket, self._seq)
+            self._entries[key] = _Entry(question, self._unit(vector), answer, llm_seconds)
+            self._buckets.setdefault(bucket, []).append(key)
+            self.stores += 1
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+        return True
+
+    def record_bypass(self):
+        with self._lock:
+            self.bypassed += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "stores": self.stores,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "saved_llm_seconds": round(self.saved_seconds, 2),
+            }
+
+
+answer_cache = AnswerCache()
+
+
+@registry.add_collector
+def _answer_cache_metrics():
+    stats = answer_cache.stats()
+    families = (
+        ("entries", "gauge", "Cached chat answers."),
+        ("hits", "counter", "Chat questions answered from the cache."),
+        ("misses", "counter", "Cacheable chat questions sent to the LLM."),
+        ("bypassed", "counter", "Follow-up chat questions that skipped the cache."),
+        ("stores", "counter", "Chat answers added to the cache."),
+        ("saved_llm_seconds", "counter", "LLM time saved by cache hits."),
+    )
+    return [
+        line for name, kind, help_text in families
+        for line in metric_family(f"ai_teacher_answer_cache_{name}", kind, help_text, [(None, stats[name])])
+    ]
+
+
+async def replay(answer, chunk_chars=48):
+    """Stream a cached answer back in word-aligned chunks."""
+    buffer = ""
+    for piece in re.findall(r"\s+|\S+\s*", answer):
+        buffer += piece
+        if len(buffer) >= chunk_chars:
+            yield buffer
+            buffer = ""
+    if buffer:
+        yield buffer
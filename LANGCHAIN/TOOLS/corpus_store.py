@@ -0,0 +1,282 @@
+"""
+Compact, memory-mapped corpus store.
+
+One binary file replaces the knowledgebase/metadata/figure JSON files at runtime:
+
+    magic "AITCORP1" | u64 header length | JSON header | aligned arrays | text blob
+
+* Section ids are the row ids of metadata.json, i.e. the FAISS row ids of the
+  title indexes, so `store.text(faiss_id)` is a direct O(1) lookup.
+* Titles, chapters, figure names and subchapters are interned once in a string
+  table; sections and figures refer to them by integer id.
+* Section texts and figure descriptions live in a UTF-8 blob addressed by
+  offset arrays. The file is mmap'ed and the arrays are numpy views over it, so
+  processes share the pages instead of each holding its own dict copies.
+
+`open_corpus()` rebuilds the file whenever a source JSON is newer, and returns
+one shared instance per path. Benchmark: benchmarks/corpus_store.py.
+"""
+import json
+import mmap
+import os
+import tempfile
+
+from .startup import lazy_import, load_once
+
+np = lazy_import("numpy")
+
+MAGIC = b"AITCORP1"
+FORMAT_VERSION = 1
+
+
+def normalize_title(title):
+    return title.strip().lower()
+
+
+# -------------------------
+# Building
+# -------------------------
+class _Interner:
+    def __init__(self):
+        self.ids = {}
+        self.strings = []
+
+    def __call__(self, text):
+        text = text or ""
+        if text not in self.ids:
+            self.ids[text] = len(self.strings)
+            self.strings.append(text)
+        return self.ids[text]
+
+
+def _source_stamp(paths):
+    return {name: [os.path.getsize(path), os.stat(path).st_mtime_ns] for name, path in paths.items() if path}
+
+
+def build_corpus(out_path, knowledge_path=None, metadata_path=None, figures_path=None, figure_rows_path=None):
+    """Build the store from any subset of the JSON sources and write it atomically."""
+    intern = _Interner()
+    texts, arrays = [], {}
+
+    def add_text(text):
+        encoded = (text or "").encode("utf-8")
+        texts.append(encoded)
+        return len(encoded)
+
+    if metadata_path:
+        with open(metadata_path, "r", encoding="utf-8") as f:
+            metadata = json.load(f)
+        knowledge = {}
+        if knowledge_path:
+            with open(knowledge_path, "r", encoding="utf-8") as f:
+                knowledge = json.load(f)
+        normalized = {
+            (chapter, normalize_title(title)): content
+            for chapter, topics in knowledge.items() for title, content in topics.items()
+        }
+        lengths = []
+        for item in metadata:
+            chapter, title = item["chapter"], item["title"]
+            content = knowledge.get(chapter, {}).get(title)
+            if content is None:
+                content = normalized.get((chapter, normalize_title(title)), "")
+            lengths.append(add_text(content))
+        arrays["section_chapter"] = np.array([intern(item["chapter"]) for item in metadata], dtype=np.uint32)
+        arrays["section_title"] = np.array([intern(item["title"]) for item in metadata], dtype=np.uint32)
+        arrays["section_text"] = np.concatenate([[0], np.cumsum(lengths, dtype=np.uint64)]).astype(np.uint64)
+
+    if figures_path:
+        with open(figures_path, "r", encoding="utf-8") as f:
+            figures = json.load(f)
+        base = int(sum(len(t) for t in texts))
+        lengths = [add_text(fig.get("description", "")) for fig in figures]
+        arrays["figure_chapter"] = np.array([intern(fig.get("chapter")) for fig in figures], dtype=np.uint32)
+        arrays["figure_subchapter"] = np.array([intern(fig["subchapter"]) for fig in figures], dtype=np.uint32)
+        arrays["figure_name"] = np.array([intern(fig["figure"]) for fig in figures], dtype=np.uint32)
+        arrays["figure_text"] = (base + np.concatenate([[0], np.cumsum(lengths, dtype=np.uint64)])).astype(np.uint64)
+
+    if figure_rows_path:
+        with open(figure_rows_path, "r", encoding="utf-8") as f:
+            rows = json.load(f)
+        row_ids = np.full(max((int(k) for k in rows), default=-1) + 1, 0xFFFFFFFF, dtype=np.uint32)
+        for row, subchapter in rows.items():
+            row_ids[int(row)] = intern(subchapter)
+        arrays["figure_row_subchapter"] = row_ids
+
+    encoded_strings = [s.encode("utf-8") for s in intern.strings]
+    arrays["string_offsets"] = np.concatenate(
+        [[0], np.cumsum([len(s) for s in encoded_strings], dtype=np.uint64)]
+    ).astype(np.uint64)
+    string_blob = b"".join(encoded_strings)
+    text_blob = b"".join(texts)
+
+    # Lay out arrays (8-byte aligned) after the header, then the two blobs
+    header = {
+        "version": FORMAT_VERSION,
+        "sources": _source_stamp({
+            "knowledge": knowledge_path, "metadata": metadata_path,
+            "figures": figures_path, "figure_rows": figure_rows_path,
+        }),
+        "arrays": {},
+    }
+    body, offset = [], 0
+    for name, array in arrays.items():
+        data = np.ascontiguousarray(array).tobytes()
+        header["arrays"][name] = {"offset": offset, "dtype": array.dtype.str, "shape": list(array.shape)}
+        padding = -len(data) % 8
+        body.append(data + b"\0" * padding)
+        offset += len(data) + padding
+    header["strings"] = {"offset": offset, "length": len(string_blob)}
+    offset += len(string_blob)
+    header["text"] = {"offset": offset, "length": len(text_blob)}
+    body += [string_blob, text_blob]
+
+    header_bytes = json.dumps(header).encode("utf-8")
+    header_bytes += b" " * (-(len(header_bytes) + 16) % 8)
+    directory = os.path.dirname(os.path.abspath(out_path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".corpus-", suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(MAGIC + len(header_bytes).to_bytes(8, "little") + header_bytes)
+        for chunk in body:
+            f.write(chunk)
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+# -------------------------
+# Reading
+# -------------------------
+class CorpusStore:
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:8] != MAGIC:
+            raise ValueError(f"{path} is not a corpus store")
+        header_length = int.from_bytes(self._mm[8:16], "little")
+        self.header = json.loads(self._mm[16:16 + header_length])
+        self._data_start = 16 + header_length
+
+        self._arrays = {}
+        for name, spec in self.header["arrays"].items():
+            dtype = np.dtype(spec["dtype"])
+            count = int(np.prod(spec["shape"]))
+            self._arrays[name] = np.frombuffer(
+                self._mm, dtype=dtype, count=count, offset=self._data_start + spec["offset"]
+            ).reshape(spec["shape"])
+        self._text_start = self._data_start + self.header["text"]["offset"]
+
+        # The interned string table is small (titles, chapters, figure names)
+        start = self._data_start + self.header["strings"]["offset"]
+        offsets = self._arrays["string_offsets"]
+        blob = self._mm[start:start + self.header["strings"]["length"]]
+        self.strings = [blob[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+        self._string_ids = {s: i for i, s in enumerate(self.strings)}
+
+        self._by_title = {}
+        for i, (chapter, title) in enumerate(zip(self._array("section_chapter"), self._array("section_title"))):
+            self._by_title.setdefault((int(chapter), normalize_title(self.strings[title])), i)
+        self._figures_by_subchapter = {}
+        for i, subchapter in enumerate(self._array("figure_subchapter")):
+            self._figures_by_subchapter.setdefault(int(subchapter), []).append(i)
+
+    def _array(self, name):
+        return self._arrays.get(name, np.zeros(0, dtype=np.uint32))
+
+    def _text(self, offsets, i):
+        start, end = int(offsets[i]), int(offsets[i + 1])
+        return self._mm[self._text_start + start:self._text_start + end].decode("utf-8")
+
+    # ---- sections (ids == FAISS row ids) ----
+    def __len__(self):
+        return len(self._array("section_title"))
+
+    def title(self, i):
+        return self.strings[self._arrays["section_title"][i]]
+
+    def chapter(self, i):
+        return self.strings[self._arrays["section_chapter"][i]]
+
+    def text(self, i):
+        return self._text(self._arrays["section_text"], i)
+
+    def titles(self):
+        return [self.strings[i] for i in self._array("section_title")]
+
+    def find(self, chapter, title):
+        """Section id for (chapter, title) with title matched case/space-insensitively, or None."""
+        chapter_id = self._string_ids.get(chapter)
+        return None if chapter_id is None else self._by_title.get((chapter_id, normalize_title(title)))
+
+    # ---- figures ----
+    def figure_count(self):
+        return len(self._array("figure_name"))
+
+    def figure(self, i):
+        return {
+            "chapter": self.strings[self._arrays["figure_chapter"][i]],
+            "subchapter": self.strings[self._arrays["figure_subchapter"][i]],
+            "figure": self.strings[self._arrays["figure_name"][i]],
+            "description": self._text(self._arrays["figure_text"], i),
+        }
+
+    def figures(self):
+        return [self.figure(i) for i in range(self.figure_count())]
+
+    def figures_for_subchapter(self, subchapter):
+        subchapter_id = self._string_ids.get(subchapter)
+        return [self.figure(i) for i in self._figures_by_subchapter.get(subchapter_id, ())]
+
+    def figure_row_subchapter(self, row):
+        """Subchapter of row `row` of subchapter_faiss.index, or None."""
+        rows = self._array("figure_row_subchapter")
+        if not 0 <= row < len(rows) or rows[row] == 0xFFFFFFFF:
+            return None
+        return self.strings[rows[row]]
+
+    def figure_subchapters(self):
+        return sorted({self.strings[i] for i in self._array("figure_row_subchapter") if i != 0xFFFFFFFF})
+
+
+def _is_stale(store_path, sources):
+    if not os.path.exists(store_path):
+        return True
+    try:
+        with open(store_path, "rb") as f:
+            if f.read(8) != MAGIC:
+                return True
+            header = json.loads(f.read(int.from_bytes(f.read(8), "little")))
+    except (OSError, ValueError):
+        return True
+    return header.get("version") != FORMAT_VERSION or header.get("sources") != _source_stamp(sources)
+
+
+def load_corpus(store_path, knowledge_path=None, metadata_path=None, figures_path=None, figure_rows_path=None):
+    """New CorpusStore for `store_path`, (re)built from the JSON sources if missing or stale."""
+    sources = {"knowledge": knowledge_path, "metadata": metadata_path,
+               "figures": figures_path, "figure_rows": figure_rows_path}
+    if any(sources.values()) and _is_stale(store_path, sources):
+        print(f"📦 Building corpus store {store_path}")
+        build_corpus(store_path, knowledge_path, metadata_path, figures_path, figure_rows_path)
+    return CorpusStore(store_path)
+
+
+@load_once
+def open_corpus(store_path, knowledge_path=None, metadata_path=None, figures_path=None, figure_rows_path=None):
+    """Shared `load_corpus()` instance per path, kept for the life of the process."""
+    return load_corpus(store_path, knowledge_path, metadata_path, figures_path, figure_rows_path)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build a corpus store from the JSON sources")
+    parser.add_argument("output")
+    parser.add_argument("--knowledge")
+    parser.add_argument("--metadata")
+    parser.add_argument("--figures")
+    parser.add_argument("--figure-rows", help="subchapter_metadata.json (figure index row -> subchapter)")
+    args = parser.parse_args()
+    build_corpus(args.output, args.knowledge, args.metadata, args.figures, args.figure_rows)
+    store = CorpusStore(args.output)
+    print(f"✅ {len(store)} sections, {store.figure_count()} figures, {len(store.strings)} strings → {args.output}")
@@ -0,0 +1,191 @@
+"""
+Query embedding cache.
+
+Embeddings are keyed by (model name and encoder backend, normalized text), so
+torch and ONNX int8 vectors never mix, and kept as float16 in a
+bounded LRU, optionally backed by a directory of .npy files that survives
+restarts. `CachedEncoder` wraps any encoder with the SentenceTransformer
+`encode()` signature and only sends cache misses to the model.
+
+Only query strings belong in the cache: encode passages and other bulk text
+with `uncached(encoder)` so they do not evict queries or fill the disk store.
+"""
+import hashlib
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+
+from .startup import lazy_import
+from .tracing import metric_family, registry
+
+np = lazy_import("numpy")
+
+EMBEDDING_CACHE_SIZE = int(os.environ.get("EMBEDDING_CACHE_SIZE", "8192"))
+EMBEDDING_CACHE_DIR = os.environ.get("EMBEDDING_CACHE_DIR") or None
+
+_SPACE_RE = re.compile(r"\s+")
+
+# encode() options that do not change the returned vectors
+_PASSTHROUGH_KWARGS = {"batch_size", "show_progress_bar", "convert_to_numpy", "convert_to_tensor", "device"}
+
+
+def normalize_query(text):
+    return _SPACE_RE.sub(" ", unicodedata.normalize("NFKC", text)).strip().lower()
+
+
+class EmbeddingCache:
+    def __init__(self, max_entries=EMBEDDING_CACHE_SIZE, disk_dir=EMBEDDING_CACHE_DIR):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def _disk_path(self, key):
+        digest = hashlib.sha1(f"{key[0]}\0{key[1]}".encode("utf-8")).hexdigest()
+        return os.path.join(self.disk_dir, key[0].replace("/", "__"), f"{digest}.npy")
+
+    def get(self, model_name, text):
+        key = (model_name, normalize_query(text))
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return vector
+        if self.disk_dir:
+            path = self._disk_path(key)
+            if os.path.exists(path):
+                vector = np.load(path)
+                self._store(key, vector)
+                with self._lock:
+                    self.disk_hits += 1
+                return vector
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, model_name, text, vector):
+        key = (model_name, normalize_query(text))
+        vector = np.asarray(vector, dtype=np.float16)
+        self._store(key, vector)
+        if self.disk_dir:
+            path = self._disk_path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            np.save(path, vector)
+        return vector
+
+    def _store(self, key, vector):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._entries[key] = vector
+            self._bytes += vector.nbytes
+            while len(self._entries) > self.max_entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else None,
+            }
+
+
+# Shared by every encoder in the process
+embedding_cache = EmbeddingCache()
+
+
+@registry.add_collector
+def _cache_metrics():
+    stats = embedding_cache.stats()
+    families = (
+        ("entries", "gauge", "Query embeddings held in memory."),
+        ("bytes", "gauge", "Memory used by cached query embeddings."),
+        ("hits", "counter", "Query embeddings served from memory."),
+        ("disk_hits", "counter", "Query embeddings served from the disk store."),
+        ("misses", "counter", "Query embeddings computed by the model."),
+    )
+    return [
+        line for name, kind, help_text in families
+        for line in metric_family(f"ai_teacher_embedding_cache_{name}", kind, help_text, [(None, stats[name])])
+    ]
+
+
+class CachedEncoder:
+    """
+    Drop-in wrapper around an encoder that serves repeated texts from `cache`.
+    `backend` (e.g. "torch", "onnx-int8") is part of the cache key.
+    """
+
+    def __init__(self, encoder, model_name, cache=embedding_cache, backend=None):
+        self.encoder = encoder
+        self.model_name = model_name
+        self.cache_name = f"{model_name}@{backend}" if backend else model_name
+        self.cache = cache
+
+    def __getattr__(self, attr):
+        return getattr(self.encoder, attr)
+
+    def encode(self, sentences, convert_to_numpy=True, convert_to_tensor=False, **kwargs):
+        if set(kwargs) - _PASSTHROUGH_KWARGS:
+            return self.encoder.encode(
+                sentences, convert_to_numpy=convert_to_numpy, convert_to_tensor=convert_to_tensor, **kwargs
+            )
+
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        vectors = [self.cache.get(self.cache_name, text) for text in texts]
+
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            # Encode each distinct missing text once
+            unique = list(OrderedDict.fromkeys(texts[i] for i in missing))
+            encoded = self.encoder.encode(unique, convert_to_numpy=True, **kwargs)
+            fresh = {}
+            for text, vec in zip(unique, encoded):
+                # The cache keeps float16; a miss returns the model's own vector
+                self.cache.put(self.cache_name, text, vec)
+                fresh[text] = vec
+            for i in missing:
+                vectors[i] = fresh[texts[i]]
+
+        embeddings = np.stack(vectors).astype(np.float32) if vectors else np.zeros((0, 0), dtype=np.float32)
+        if single:
+            embeddings = embeddings[0]
+        if convert_to_tensor:
+            import torch
+            return torch.from_numpy(embeddings)
+        return embeddings
+
+    def preload(self, texts, batch_size=64):
+        """Encode and cache `texts` ahead of time (used by the startup warmup)."""
+        texts = [text for text in texts if text and text.strip()]
+        if texts:
+            self.encode(texts, batch_size=batch_size)
+        return len(texts)
+
+
+def uncached(encoder):
+    """The model behind a CachedEncoder (any other encoder unchanged), for text that is not a query."""
+    return encoder.encoder if isinstance(encoder, CachedEncoder) else encoder
@@ -0,0 +1,165 @@
+"""
+Sentence encoder backends.
+
+`get_encoder(model_name)` returns either the usual SentenceTransformer (torch) or
+an OnnxEncoder that runs an int8 dynamically-quantized ONNX export of the same
+model through onnxruntime. Both expose the same `encode()` call, so callers do
+not care which one they get. Select with ENCODER_BACKEND=torch|onnx.
+"""
+import json
+import os
+
+from .embedding_cache import CachedEncoder
+from .startup import lazy_import
+
+np = lazy_import("numpy")
+
+ENCODER_BACKEND = os.environ.get("ENCODER_BACKEND", "torch")
+ENCODER_THREADS = int(os.environ.get("ENCODER_THREADS", "0")) or os.cpu_count() or 1
+ONNX_CACHE_DIR = os.environ.get(
+    "ONNX_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "ai-teacher", "onnx")
+)
+
+
+def _model_dir(model_name, cache_dir=ONNX_CACHE_DIR):
+    return os.path.join(cache_dir, model_name.replace("/", "__"))
+
+
+def export_onnx(model_name, cache_dir=ONNX_CACHE_DIR, quantize=True):
+    """
+    Export `model_name` to ONNX (plus tokenizer and pooling config) and optionally
+    quantize the weights to int8. Returns the export directory. Needs torch once.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    out_dir = _model_dir(model_name, cache_dir)
+    os.makedirs(out_dir, exist_ok=True)
+
+    st_model = SentenceTransformer(model_name, device="cpu")
+    transformer = st_model[0].auto_model.eval()
+    tokenizer = st_model.tokenizer
+    tokenizer.save_pretrained(out_dir)
+
+    sample = tokenizer(["warmup sentence"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    fp32_path = os.path.join(out_dir, "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            tuple(sample[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14,
+        )
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(fp32_path, os.path.join(out_dir, "model.int8.onnx"), weight_type=QuantType.QInt8)
+
+    config = {
+        "model_name": model_name,
+        "input_names": input_names,
+        "max_seq_length": st_model.max_seq_length,
+        "normalize": any(type(module).__name__ == "Normalize" for module in st_model),
+    }
+    with open(os.path.join(out_dir, "encoder_config.json"), "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+    return out_dir
+
+
+class OnnxEncoder:
+    """
+    CPU encoder with the SentenceTransformer `encode()` signature, backed by onnxruntime.
+    Mean pooling (and L2 normalization when the source model had it) is done in numpy.
+    """
+
+    def __init__(self, model_name, cache_dir=ONNX_CACHE_DIR, threads=ENCODER_THREADS, quantized=True):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        model_dir = _model_dir(model_name, cache_dir)
+        onnx_file = "model.int8.onnx" if quantized else "model.onnx"
+        self.backend = "onnx-int8" if quantized else "onnx-fp32"
+        if not os.path.exists(os.path.join(model_dir, onnx_file)):
+            export_onnx(model_name, cache_dir, quantize=quantized)
+
+        with open(os.path.join(model_dir, "encoder_config.json"), "r", encoding="utf-8") as f:
+            self.config = json.load(f)
+        self.model_name = model_name
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, onnx_file), options, providers=["CPUExecutionProvider"]
+        )
+
+    def get_sentence_embedding_dimension(self):
+        return int(self.encode("dimension probe").shape[-1])
+
+    def _encode_batch(self, batch):
+        tokens = self.tokenizer(
+            batch, padding=True, truncation=True,
+            max_length=self.config["max_seq_length"], return_tensors="np",
+        )
+        feeds = {name: tokens[name].astype("int64") for name in self.config["input_names"]}
+        hidden = self.session.run(["last_hidden_state"], feeds)[0]
+        mask = tokens["attention_mask"][..., None].astype("float32")
+        return (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+    def encode(
+        self,
+        sentences,
+        batch_size=32,
+        show_progress_bar=None,
+        convert_to_numpy=True,
+        convert_to_tensor=False,
+        normalize_embeddings=False,
+        **kwargs,
+    ):
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+
+        if sentences:
+            embeddings = np.concatenate(
+                [self._encode_batch(sentences[i:i + batch_size]) for i in range(0, len(sentences), batch_size)]
+            ).astype("float32")
+        else:
+            embeddings = np.zeros((0, 0), dtype="float32")
+        if self.config["normalize"] or normalize_embeddings:
+            embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+
+        if single:
+            embeddings = embeddings[0]
+        if convert_to_tensor:
+            import torch
+            return torch.from_numpy(embeddings)
+        return embeddings
+
+
+def get_encoder(model_name, backend=None, device=None, cached=True):
+    """
+    Return an encoder for `model_name` using ENCODER_BACKEND unless `backend` is given.
+    With `cached`, repeated texts are served from the shared embedding cache.
+    """
+    backend = backend or ENCODER_BACKEND
+    if backend == "onnx":
+        encoder = OnnxEncoder(model_name)
+        backend = encoder.backend  # quantized or not
+    elif backend == "torch":
+        import torch
+        from sentence_transformers import SentenceTransformer
+        device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        encoder = SentenceTransformer(model_name).to(torch.device(device))
+    else:
+        raise ValueError(f"Unknown encoder backend: {backend}")
+    return CachedEncoder(encoder, model_name, backend=backend) if cached else encoder
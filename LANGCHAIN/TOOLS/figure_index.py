@@ -0,0 +1,183 @@
+"""
+Figure-level semantic index: one vector per figure in output.json.
+
+Each figure is embedded from its subchapter title and caption/description, so a
+query returns the most relevant figures directly (one encode + one FAISS search)
+instead of picking a subchapter first and filtering output.json for it.
+
+The index is built from output.json on first use, and rebuilt whenever
+output.json, the index or its metadata no longer match the size/mtime stamps
+recorded next to the index (<index>.stamp.json) at build time; to rebuild it
+explicitly:
+
+    python -m LANGCHAIN.TOOLS.figure_index output.json figure_faiss.index figure_metadata.json
+"""
+import json
+import os
+import re
+import threading
+
+from .embedding_cache import uncached
+from .startup import lazy_import
+from .tracing import span
+
+faiss = lazy_import("faiss")
+np = lazy_import("numpy")
+
+FIGURE_TOP_K = int(os.environ.get("FIGURE_TOP_K", "3"))
+# At most this many figures from the same subchapter, so one section can't fill every slot
+FIGURES_PER_SUBCHAPTER = int(os.environ.get("FIGURES_PER_SUBCHAPTER", "2"))
+FIGURE_MIN_SCORE = float(os.environ.get("FIGURE_MIN_SCORE", "0.25"))
+
+FIGURE_LABEL_RE = re.compile(r"^\s*(Figure|Fig\.?)\s*\d+(\.\d+)?\s*", re.IGNORECASE)
+
+
+def figure_text(fig):
+    """Text embedded for a figure: subchapter title plus the caption without its 'Figure x.y' label."""
+    caption = FIGURE_LABEL_RE.sub("", fig.get("description") or "")
+    return f"{fig['subchapter']}: {caption}".strip()
+
+
+def _file_stamp(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _stamps(figures_path, index_path, metadata_path):
+    return {"figures": _file_stamp(figures_path), "index": _file_stamp(index_path),
+            "metadata": _file_stamp(metadata_path)}
+
+
+def _stamp_path(index_path):
+    return f"{index_path}.stamp.json"
+
+
+def _normalized(vectors):
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def build_figure_index(figures, encoder, index_path, metadata_path):
+    """Embed every figure, write an inner-product (cosine) index and its row metadata."""
+    metadata = [
+        {"figure": fig["figure"], "subchapter": fig["subchapter"],
+         "chapter": fig.get("chapter"), "description": fig.get("description", "")}
+        for fig in figures
+    ]
+    vectors = _normalized(uncached(encoder).encode([figure_text(fig) for fig in figures], convert_to_numpy=True))
+    index = faiss.IndexFlatIP(vectors.shape[1])
+    index.add(vectors)
+    faiss.write_index(index, index_path)
+    with open(metadata_path, "w", encoding="utf-8") as f:
+        json.dump(metadata, f, ensure_ascii=False, indent=2)
+    return index, metadata
+
+
+def write_stamp(figures_path, index_path, metadata_path):
+    """Record the files an index was built from, so a later change triggers a rebuild."""
+    with open(_stamp_path(index_path), "w", encoding="utf-8") as f:
+        json.dump(_stamps(figures_path, index_path, metadata_path), f)
+
+
+def is_stale(figures_path, index_path, metadata_path):
+    """True if the index is missing or output.json, the index or its metadata changed since the build."""
+    if not (os.path.exists(index_path) and os.path.exists(metadata_path)):
+        return True
+    if not os.path.exists(figures_path):
+        return False  # nothing to rebuild from; serve the index as it is
+    try:
+        with open(_stamp_path(index_path), "r", encoding="utf-8") as f:
+            recorded = json.load(f)
+    except (OSError, ValueError):
+        return True
+    return recorded != _stamps(figures_path, index_path, metadata_path)
+
+
+class FigureIndex:
+    def __init__(self, index_path, metadata_path, figures_path, encoder):
+        self.index_path = index_path
+        self.metadata_path = metadata_path
+        self.figures_path = figures_path
+        self.encoder = encoder
+        self._index = None
+        self._metadata = None
+        self._source = None  # stamp of output.json when the loaded index was checked
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Load the index, building or rebuilding it if output.json changed (checked on every call)."""
+        source = _file_stamp(self.figures_path)
+        with self._lock:
+            if self._index is not None and source == self._source:
+                return
+            if is_stale(self.figures_path, self.index_path, self.metadata_path):
+                print(f"🖼️ Building figure index from {self.figures_path}")
+                with open(self.figures_path, "r", encoding="utf-8") as f:
+                    figures = json.load(f)
+                index, metadata = build_figure_index(figures, self.encoder, self.index_path, self.metadata_path)
+                write_stamp(self.figures_path, self.index_path, self.metadata_path)
+            else:
+                index = faiss.read_index(self.index_path)
+                with open(self.metadata_path, "r", encoding="utf-8") as f:
+                    metadata = json.load(f)
+            self._index, self._metadata, self._source = index, metadata, source
+
+    def search(self, query, k=FIGURE_TOP_K, per_subchapter=FIGURES_PER_SUBCHAPTER, min_score=FIGURE_MIN_SCORE,
+               keep=None):
+        """
+        Return up to k figure dicts (figure, subchapter, chapter, description, score),
+        best first, with at most `per_subchapter` from any one subchapter. Figures for
+        which `keep(fig)` is false (e.g. no image file on disk) never take a slot.
+        """
+        self.load()
+        index, metadata = self._index, self._metadata
+        with span("figures.encode"):
+            query_vector = _normalized(self.encoder.encode([query], convert_to_numpy=True))
+        # Over-fetch so the per-subchapter cap and `keep` can still fill k slots; widen if they did not
+        fetch = min(index.ntotal, max(k * 4, k + per_subchapter))
+        while True:
+            with span("figures.faiss"):
+                scores, ids = index.search(query_vector, fetch)
+            results = self._select(metadata, scores[0], ids[0], k, per_subchapter, min_score, keep)
+            if len(results) == k or fetch >= index.ntotal or scores[0][-1] < min_score:
+                return results
+            fetch = min(index.ntotal, fetch * 4)
+
+    @staticmethod
+    def _select(metadata, scores, ids, k, per_subchapter, min_score, keep):
+        results, per_section, seen = [], {}, set()
+        for score, idx in zip(scores, ids):
+            if idx < 0 or score < min_score:
+                break
+            fig = metadata[idx]
+            if fig["figure"] in seen or per_section.get(fig["subchapter"], 0) >= per_subchapter:
+                continue
+            if keep is not None and not keep(fig):
+                continue
+            seen.add(fig["figure"])
+            per_section[fig["subchapter"]] = per_section.get(fig["subchapter"], 0) + 1
+            results.append({**fig, "score": float(score)})
+            if len(results) == k:
+                break
+        return results
+
+
+if __name__ == "__main__":
+    import sys
+
+    from .encoders import get_encoder
+
+    figures_path, index_path, metadata_path = (sys.argv[1:4] + [None] * 3)[:3]
+    figures_path = figures_path or "output.json"
+    with open(figures_path, "r", encoding="utf-8") as f:
+        figures = json.load(f)
+    index_path, metadata_path = index_path or "figure_faiss.index", metadata_path or "figure_metadata.json"
+    index, _ = build_figure_index(
+        figures, get_encoder("sentence-transformers/all-MiniLM-L6-v2"), index_path, metadata_path,
+    )
+    write_stamp(figures_path, index_path, metadata_path)
+    print(f"✅ Indexed {index.ntotal} figures")
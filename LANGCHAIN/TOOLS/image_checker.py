@@ -1,4 +1,4 @@
-from image_fetcher import search_subchapter_by_query, fetch_figures_only
+from backend.tools.image_fetcher import search_subchapter_by_query, fetch_figures_only
 
 def check_images_for_query(query_name):
     subchapter = search_subchapter_by_query(query_name, top_k=1)
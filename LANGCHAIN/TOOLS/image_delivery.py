@@ -0,0 +1,215 @@
+"""
+Figure delivery: pre-generated resized WebP/PNG variants, strong ETags and long-lived caching.
+
+Offline step (re-run after adding figures; unchanged sources are skipped):
+
+    python -m LANGCHAIN.TOOLS.image_delivery images
+
+This writes `<image_dir>/variants/` and a `manifest.json` with the size and
+content hash of every file. At request time `ImageStore.select()` picks the
+smallest variant at least as wide as the requested `?w=` in the best format the
+client accepts; responses carry the file's hash as ETag so repeat views are 304s.
+The manifest and original-file ETags are re-read whenever the file's size or
+mtime changes, so regenerated or replaced figures are picked up without a restart.
+"""
+import hashlib
+import json
+import os
+import threading
+
+VARIANT_WIDTHS = (320, 640, 1024)
+VARIANT_FORMATS = ("webp", "png")
+VARIANTS_DIRNAME = "variants"
+MANIFEST_NAME = "manifest.json"
+
+# URLs carrying ?v=<current version> can be cached for a year; unversioned or
+# stale-versioned URLs are revalidated hourly with If-None-Match
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+UNVERSIONED_CACHE_CONTROL = "public, max-age=3600"
+CONTENT_TYPES = {".png": "image/png", ".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".webp": "image/webp"}
+SOURCE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+
+def _stamp(path):
+    """(size, mtime) of `path`, or None if it does not exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def file_etag(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()[:20]
+
+
+# -------------------------
+# Offline variant generation
+# -------------------------
+def build_variants(image_dir, widths=VARIANT_WIDTHS, formats=VARIANT_FORMATS, webp_quality=80):
+    """Generate resized variants for every figure in `image_dir` and write the manifest."""
+    from PIL import Image
+
+    variants_dir = os.path.join(image_dir, VARIANTS_DIRNAME)
+    os.makedirs(variants_dir, exist_ok=True)
+    manifest_path = os.path.join(image_dir, MANIFEST_NAME)
+    old_manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            old_manifest = json.load(f)
+
+    manifest, built = {}, 0
+    for name in sorted(os.listdir(image_dir)):
+        source = os.path.join(image_dir, name)
+        if not name.lower().endswith(SOURCE_EXTENSIONS) or not os.path.isfile(source):
+            continue
+        etag = file_etag(source)
+        previous = old_manifest.get(name)
+        if previous and previous["etag"] == etag and all(
+            os.path.exists(os.path.join(variants_dir, v["file"])) for v in previous["variants"]
+        ):
+            manifest[name] = previous
+            continue
+
+        stem = os.path.splitext(name)[0]
+        with Image.open(source) as img:
+            img.load()
+            width, height = img.size
+            entry = {"etag": etag, "width": width, "height": height,
+                     "bytes": os.path.getsize(source), "variants": []}
+            # Never upscale; the original width is always offered as the largest variant
+            for target in sorted({w for w in widths if w < 0.9 * width} | {width}):
+                resized = img if target == width else img.resize(
+                    (target, max(1, round(height * target / width))), Image.LANCZOS
+                )
+                for fmt in formats:
+                    filename = f"{stem}.w{target}.{fmt}"
+                    path = os.path.join(variants_dir, filename)
+                    if fmt == "webp":
+                        resized.save(path, "WEBP", quality=webp_quality, method=6)
+                    else:
+                        out = resized if resized.mode in ("RGB", "RGBA", "L", "P") else resized.convert("RGBA")
+                        out.save(path, "PNG", optimize=True)
+                    entry["variants"].append({
+                        "file": filename, "width": target, "format": fmt,
+                        "etag": file_etag(path), "bytes": os.path.getsize(path),
+                    })
+        manifest[name] = entry
+        built += 1
+
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return {"figures": len(manifest), "rebuilt": built}
+
+
+# -------------------------
+# Request-time selection
+# -------------------------
+class ImageStore:
+    def __init__(self, image_dir):
+        self.image_dir = image_dir
+        self.variants_dir = os.path.join(image_dir, VARIANTS_DIRNAME)
+        self._manifest = (None, {})  # (stamp of manifest.json, manifest)
+        self._etags = {}              # name -> (stamp of the file, etag)
+        self._lock = threading.Lock()
+
+    @property
+    def manifest(self):
+        path = os.path.join(self.image_dir, MANIFEST_NAME)
+        stamp = _stamp(path)
+        with self._lock:
+            cached_stamp, manifest = self._manifest
+        if stamp != cached_stamp:
+            manifest = {}
+            if stamp is not None:
+                with open(path, "r", encoding="utf-8") as f:
+                    manifest = json.load(f)
+            with self._lock:
+                self._manifest = (stamp, manifest)
+        return manifest
+
+    def _original(self, name):
+        path = os.path.join(self.image_dir, name)
+        if not os.path.isfile(path):
+            return None
+        stamp = _stamp(path)
+        with self._lock:
+            cached_stamp, etag = self._etags.get(name, (None, None))
+        if etag is None or stamp != cached_stamp:
+            etag = file_etag(path)
+            with self._lock:
+                self._etags[name] = (stamp, etag)
+        return path, etag, CONTENT_TYPES.get(os.path.splitext(name)[1].lower(), "application/octet-stream")
+
+    def select(self, name, width=None, accept=""):
+        """
+        Return (path, etag, content_type) for the best file for `name`, or None.
+        Without a manifest entry the original file is served.
+        """
+        name = os.path.basename(name)
+        entry = self.manifest.get(name)
+        if not entry:
+            return self._original(name)
+
+        fmt = "webp" if "image/webp" in (accept or "") else "png"
+        candidates = sorted((v for v in entry["variants"] if v["format"] == fmt), key=lambda v: v["width"])
+        if not candidates:
+            return self._original(name)
+        chosen = candidates[-1]
+        if width:
+            chosen = next((v for v in candidates if v["width"] >= width), candidates[-1])
+        return (os.path.join(self.variants_dir, chosen["file"]), chosen["etag"],
+                CONTENT_TYPES[f".{chosen['format']}"])
+
+    def version(self, name):
+        """Current `?v=` value for `name`: a prefix of its source file's hash (None if missing)."""
+        name = os.path.basename(name)
+        entry = self.manifest.get(name)
+        if entry:
+            return entry["etag"][:8]
+        original = self._original(name)
+        return original[1][:8] if original else None
+
+    def srcset(self, name, url_prefix="/images/"):
+        """`srcset` value listing every width available for `name` (empty if not built)."""
+        entry = self.manifest.get(os.path.basename(name))
+        if not entry:
+            return ""
+        widths = sorted({v["width"] for v in entry["variants"]})
+        version = entry["etag"][:8]
+        return ", ".join(f"{url_prefix}{name}?w={w}&v={version} {w}w" for w in widths)
+
+    def url(self, name, url_prefix="/images/"):
+        version = self.version(name)
+        return f"{url_prefix}{name}?v={version}" if version else f"{url_prefix}{name}"
+
+
+def not_modified(if_none_match, etag):
+    """True if the client's If-None-Match already names `etag`."""
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/").strip('"') for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+def response_headers(etag, versioned):
+    """
+    Caching headers for an image response (same for 200 and 304); `versioned` only
+    when the request's ?v= matches ImageStore.version(), else the URL may go stale.
+    """
+    return {
+        "ETag": f'"{etag}"',
+        "Cache-Control": CACHE_CONTROL if versioned else UNVERSIONED_CACHE_CONTROL,
+        "Vary": "Accept",
+    }
+
+
+if __name__ == "__main__":
+    import sys
+
+    target = sys.argv[1] if len(sys.argv) > 1 else "images"
+    print(json.dumps(build_variants(target), indent=2))
@@ -1,24 +1,40 @@
-import json
 import os
-import faiss
-import torch
-from sentence_transformers import SentenceTransformer
+
+from .corpus_store import open_corpus
+from .encoders import get_encoder
+from .figure_index import FIGURE_TOP_K, FigureIndex
+from .startup import lazy_import, load_once
+from .tracing import span
+
+faiss = lazy_import("faiss")
 
 FIGURE_JSON = r"C:\Users\neesh\OneDrive\Documents\Ai teacher robot\AI ROBOT AGENT\backend\tools\output.json"
 IMAGE_DIR = r"C:\Users\neesh\OneDrive\Documents\Ai teacher robot\AI ROBOT AGENT\backend\tools\images"
 FAISS_INDEX_FILE = r"C:\Users\neesh\OneDrive\Documents\Ai teacher robot\AI ROBOT AGENT\backend\subchapter_faiss.index"
 METADATA_FILE = r"C:\Users\neesh\OneDrive\Documents\Ai teacher robot\AI ROBOT AGENT\backend\subchapter_metadata.json"
+FIGURE_INDEX_FILE = r"C:\Users\neesh\OneDrive\Documents\Ai teacher robot\AI ROBOT AGENT\backend\figure_faiss.index"
+FIGURE_METADATA_FILE = r"C:\Users\neesh\OneDrive\Documents\Ai teacher robot\AI ROBOT AGENT\backend\figure_metadata.json"
+FIGURE_STORE_FILE = r"C:\Users\neesh\OneDrive\Documents\Ai teacher robot\AI ROBOT AGENT\backend\figures.bin"
+
+@load_once
+def get_image_model():
+    return get_encoder("sentence-transformers/all-MiniLM-L6-v2")
 
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-image_model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2").to(device)
+def get_figure_store():
+    """output.json and subchapter_metadata.json as a memory-mapped corpus store."""
+    return open_corpus(FIGURE_STORE_FILE, figures_path=FIGURE_JSON, figure_rows_path=METADATA_FILE)
 
-with open(FIGURE_JSON, "r", encoding="utf-8") as f:
-    figures_data = json.load(f)
+@load_once
+def get_index_figures():
+    return faiss.read_index(FAISS_INDEX_FILE)
 
-with open(METADATA_FILE, "r", encoding="utf-8") as f:
-    metadata_figures = json.load(f)
+@load_once
+def get_figure_index():
+    return FigureIndex(FIGURE_INDEX_FILE, FIGURE_METADATA_FILE, FIGURE_JSON, get_image_model())
 
-index_figures = faiss.read_index(FAISS_INDEX_FILE)
+def warmup():
+    get_figure_store()
+    get_figure_index().load()
 
 def get_image_path(figure_ref, image_dir=IMAGE_DIR):
     base_name = figure_ref.replace(" ", "_")
@@ -34,7 +50,7 @@ def get_image_path(figure_ref, image_dir=IMAGE_DIR):
     return None
 
 def fetch_figures_only(subchapter_name):
-    figures = [fig for fig in figures_data if fig["subchapter"] == subchapter_name]
+    figures = get_figure_store().figures_for_subchapter(subchapter_name)
     figure_blocks = []
     for fig in figures:
         fig_path = get_image_path(fig['figure'])
@@ -47,13 +63,27 @@ def fetch_figures_only(subchapter_name):
     return figure_blocks
 
 def search_subchapter_by_query(query, top_k=1):
-    query_embedding = image_model.encode([query], convert_to_numpy=True).astype('float32')
-    _, indices = index_figures.search(query_embedding.reshape(1, -1), top_k)
-    best_match_index = str(indices[0][0])
-    return metadata_figures.get(best_match_index, None)
+    with span("figures.encode"):
+        query_embedding = get_image_model().encode([query], convert_to_numpy=True).astype('float32')
+    with span("figures.faiss"):
+        _, indices = get_index_figures().search(query_embedding.reshape(1, -1), top_k)
+    return get_figure_store().figure_row_subchapter(int(indices[0][0]))
+
+def search_figures(query, k=FIGURE_TOP_K):
+    """Top-k figures for the query, best first, as {name, path, desc, subchapter, score} blocks."""
+    figure_blocks = []
+    # Figures without an image file are skipped before they can take one of the k slots
+    for fig in get_figure_index().search(query, k=k, keep=lambda fig: get_image_path(fig["figure"]) is not None):
+        fig_path = get_image_path(fig["figure"])
+        if fig_path:
+            figure_blocks.append({
+                "name": fig["figure"],
+                "path": fig_path,
+                "desc": fig["description"],
+                "subchapter": fig["subchapter"],
+                "score": fig["score"],
+            })
+    return figure_blocks
 
 def fetch_images_for_topic(query):
-    subchapter = search_subchapter_by_query(query)
-    if not subchapter:
-        return []
-    return fetch_figures_only(subchapter)
+    return search_figures(query)
@@ -0,0 +1,644 @@
+"""
+Provider abstraction for every LLM call made by the Flask app (app.py) and the
+LangChain backend (llm_tools.py).
+
+Each task type (hook, intro, explanation, lesson, chat, classify, summarize) is
+routed to a primary provider/model and an optional hedge. If the primary has not
+answered by its p95 deadline the hedge is fired as well and the first answer wins;
+a stream that loses the race is stopped.
+Latency is recorded per (provider, task): total call time, plus time-to-first-chunk
+for streams, which is what stream hedging is decided on. Every call passes the
+provider's token-bucket rate limit first (see admission.py); a provider that is
+over its budget counts as failed, so the hedge takes the request. After
+LLM_CIRCUIT_FAILURES consecutive errors a provider's circuit opens and it is
+skipped for LLM_CIRCUIT_COOLDOWN seconds, then one trial call decides whether it
+closes again. API keys come only from GROQ_API_KEY / GEMINI_API_KEY; a provider
+without one is left out of every route.
+"""
+import asyncio
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .admission import rate_limiter
+from .tracing import histogram_family, metric_family, registry
+
+GROQ_API_URL = os.environ.get("GROQ_API_URL", "https://api.groq.com/openai/v1/chat/completions")
+# No defaults: a provider without a key is skipped by every route (see Provider.available)
+GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
+GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
+
+# Used as the hedge deadline until a provider has enough samples for a p95 on the task.
+DEFAULT_HEDGE_DELAY = float(os.environ.get("LLM_HEDGE_DELAY", "2.0"))
+MIN_SAMPLES_FOR_P95 = 20
+
+LLM_CIRCUIT_FAILURES = int(os.environ.get("LLM_CIRCUIT_FAILURES", "5"))
+LLM_CIRCUIT_COOLDOWN = float(os.environ.get("LLM_CIRCUIT_COOLDOWN", "30"))
+
+# Provider calls (primary + hedge) and async stream pumps use separate pools so
+# waiting pumps can never starve the calls they are waiting on.
+LLM_CALL_WORKERS = int(os.environ.get("LLM_CALL_WORKERS", "32"))
+LLM_STREAM_WORKERS = int(os.environ.get("LLM_STREAM_WORKERS", "16"))
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0, 64.0)
+
+
+class LLMError(RuntimeError):
+    """Raised when no provider for a task produced an answer."""
+
+
+class CircuitOpen(LLMError):
+    """Raised instead of calling a provider whose circuit is open."""
+
+
+# -------------------------
+# Latency histograms
+# -------------------------
+class LatencyHistogram:
+    """Fixed-bucket histogram plus a bounded window of raw samples for quantiles."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS, window=500):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.errors = 0
+        self._window = window
+        self._samples = []
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, error=False):
+        with self._lock:
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    self.counts[i] += 1
+                    break
+            else:
+                self.counts[-1] += 1
+            self.total += seconds
+            self.count += 1
+            if error:
+                self.errors += 1
+            self._samples.append(seconds)
+            if len(self._samples) > self._window:
+                del self._samples[0]
+
+    def quantile(self, q):
+        with self._lock:
+            if not self._samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "sum": round(self.total, 4),
+            "buckets": dict(zip([str(b) for b in self.buckets] + ["+Inf"], self.counts)),
+            "p50": self.quantile(0.50),
+            "p95": self.quantile(0.95),
+        }
+
+
+# -------------------------
+# Circuit breaker
+# -------------------------
+class CircuitBreaker:
+    """Opens after `failures` consecutive errors; after `cooldown` seconds one trial call is let through."""
+
+    def __init__(self, failures=LLM_CIRCUIT_FAILURES, cooldown=LLM_CIRCUIT_COOLDOWN):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.consecutive = 0
+        self.opens = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def _state(self):
+        if self._opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self._opened_at >= self.cooldown else "open"
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def allow(self):
+        with self._lock:
+            state = self._state()
+            if state == "half_open" and not self._trial:
+                self._trial = True
+                return True
+            return state == "closed"
+
+    def abandon(self):
+        """An allowed call was not sent after all: a half-open trial passes to the next request."""
+        with self._lock:
+            self._trial = False
+
+    def record(self, ok):
+        with self._lock:
+            self._trial = False
+            if ok:
+                self.consecutive = 0
+                self._opened_at = None
+                return
+            self.consecutive += 1
+            if self._opened_at is not None or self.consecutive >= self.failures:
+                # A failed trial (or a late failure while open) restarts the cooldown
+                if self._opened_at is None or self._state() == "half_open":
+                    self.opens += 1
+                self._opened_at = time.monotonic()
+
+
+# -------------------------
+# Providers
+# -------------------------
+class Provider:
+    """A model endpoint. Subclasses implement `complete` and optionally `stream`."""
+
+    name = "base"
+
+    def __init__(self, model):
+        self.model = model
+
+    @property
+    def key(self):
+        return f"{self.name}:{self.model}"
+
+    @property
+    def available(self):
+        """False when the provider is not configured (e.g. no API key); routes skip it."""
+        return True
+
+    def complete(self, prompt, max_tokens=1000, temperature=0.7):
+        raise NotImplementedError
+
+    def stream(self, prompt, max_tokens=1000, temperature=0.7):
+        yield self.complete(prompt, max_tokens=max_tokens, temperature=temperature)
+
+
+class GroqProvider(Provider):
+    """OpenAI-compatible chat completions endpoint (Groq by default)."""
+
+    name = "groq"
+
+    def __init__(self, model, api_url=None, api_key=None, timeout=(5, 60)):
+        super().__init__(model)
+        self.api_url = api_url or GROQ_API_URL
+        self.api_key = api_key or GROQ_API_KEY
+        self.timeout = timeout
+
+    @property
+    def available(self):
+        return bool(self.api_key)
+
+    def _post(self, prompt, max_tokens, temperature, stream):
+        import requests
+
+        response = requests.post(
+            self.api_url,
+            headers={"Authorization": f"Bearer {self.api_key}"},
+            json={
+                "model": self.model,
+                "messages": [{"role": "user", "content": prompt}],
+                "max_tokens": max_tokens,
+                "temperature": temperature,
+                "stream": stream,
+            },
+            timeout=self.timeout,
+            stream=stream,
+        )
+        response.raise_for_status()
+        return response
+
+    def complete(self, prompt, max_tokens=1000, temperature=0.7):
+        result = self._post(prompt, max_tokens, temperature, stream=False).json()
+        if "choices" not in result:
+            raise LLMError(f"Unexpected response from {self.key}: {result}")
+        return result["choices"][0]["message"]["content"]
+
+    def stream(self, prompt, max_tokens=1000, temperature=0.7):
+        response = self._post(prompt, max_tokens, temperature, stream=True)
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            delta = json.loads(data)["choices"][0].get("delta", {})
+            if delta.get("content"):
+                yield delta["content"]
+
+
+class GeminiProvider(Provider):
+    """Google Gemini through google.generativeai (imported on first use)."""
+
+    name = "gemini"
+    _configured = False
+
+    def __init__(self, model, api_key=None):
+        super().__init__(model)
+        self.api_key = api_key or GEMINI_API_KEY
+        self._model = None
+
+    @property
+    def available(self):
+        return bool(self.api_key)
+
+    def _client(self):
+        if self._model is None:
+            import google.generativeai as genai
+
+            if not GeminiProvider._configured:
+                genai.configure(api_key=self.api_key)
+                GeminiProvider._configured = True
+            self._model = genai.GenerativeModel(self.model)
+        return self._model
+
+    def _config(self, max_tokens, temperature):
+        return {"max_output_tokens": max_tokens, "temperature": temperature}
+
+    def complete(self, prompt, max_tokens=1000, temperature=0.7):
+        response = self._client().generate_content(
+            prompt, generation_config=self._config(max_tokens, temperature)
+        )
+        return response.text
+
+    def stream(self, prompt, max_tokens=1000, temperature=0.7):
+        response = self._client().generate_content(
+            prompt, stream=True, generation_config=self._config(max_tokens, temperature)
+        )
+        for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+
+class MockProvider(Provider):
+    """
+    Local stand-in with configurable latency, used for tests and benchmarks.
+    `reply` may be a string or a callable taking the prompt.
+    """
+
+    name = "mock"
+
+    def __init__(self, model="mock", latency=0.0, chunk_delay=0.0, reply="Mock answer.", fail=False):
+        super().__init__(model)
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+        self.reply = reply
+        self.fail = fail
+        self.calls = 0
+
+    def _text(self, prompt):
+        self.calls += 1
+        time.sleep(self.latency)
+        if self.fail:
+            raise LLMError(f"{self.key} configured to fail")
+        return self.reply(prompt) if callable(self.reply) else self.reply
+
+    def complete(self, prompt, max_tokens=1000, temperature=0.7):
+        return self._text(prompt)
+
+    def stream(self, prompt, max_tokens=1000, temperature=0.7):
+        for word in self._text(prompt).split(" "):
+            time.sleep(self.chunk_delay)
+            yield word + " "
+
+
+PROVIDER_TYPES = {
+    "groq": GroqProvider,
+    "gemini": GeminiProvider,
+    "mock": MockProvider,
+}
+
+
+# -------------------------
+# Routing
+# -------------------------
+class Route:
+    def __init__(self, primary, hedge=None, max_tokens=1000, temperature=0.7):
+        self.primary = primary
+        self.hedge = hedge
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+
+
+GROQ_LLAMA = ("groq", "llama3-70b-8192")
+GEMINI_FLASH = ("gemini", "gemini-1.5-flash-8b-latest")
+
+DEFAULT_ROUTES = {
+    # Flask lesson page (app.py)
+    "hook": Route(GROQ_LLAMA, GEMINI_FLASH, max_tokens=1000, temperature=0.9),
+    "intro": Route(GROQ_LLAMA, GEMINI_FLASH, max_tokens=1000, temperature=0.9),
+    "explanation": Route(GROQ_LLAMA, GEMINI_FLASH, max_tokens=4000, temperature=0.8),
+    # LangChain backend (llm_tools.py)
+    "lesson": Route(GEMINI_FLASH, GROQ_LLAMA, max_tokens=4000, temperature=0.8),
+    "chat": Route(GEMINI_FLASH, GROQ_LLAMA, max_tokens=2000, temperature=0.7),
+    "classify": Route(GEMINI_FLASH, GROQ_LLAMA, max_tokens=10, temperature=0.0),
+    "summarize": Route(GEMINI_FLASH, GROQ_LLAMA, max_tokens=500, temperature=0.3),
+}
+
+
+class LLMRouter:
+    def __init__(self, routes=None, hedge_delay=DEFAULT_HEDGE_DELAY,
+                 max_workers=LLM_CALL_WORKERS, stream_workers=LLM_STREAM_WORKERS):
+        self.routes = dict(routes or DEFAULT_ROUTES)
+        self.hedge_delay = hedge_delay
+        self.providers = {}
+        self.histograms = {}  # (provider key, task) -> total call / stream latency
+        self.ttft = {}        # (provider key, task) -> stream time to first chunk
+        self.breakers = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-call")
+        self._stream_executor = ThreadPoolExecutor(max_workers=stream_workers, thread_name_prefix="llm-stream")
+        self._lock = threading.Lock()
+
+    # ---- configuration ----
+    def register(self, provider):
+        """Register a provider instance, replacing any with the same name:model."""
+        with self._lock:
+            self.providers[provider.key] = provider
+            self.breakers.setdefault(provider.key, CircuitBreaker())
+        return provider
+
+    def set_route(self, task, primary, hedge=None, **params):
+        self.routes[task] = Route(primary, hedge, **params)
+
+    def provider(self, spec):
+        name, model = spec
+        key = f"{name}:{model}"
+        if key not in self.providers:
+            if name not in PROVIDER_TYPES:
+                raise LLMError(f"Unknown LLM provider: {name}")
+            self.register(PROVIDER_TYPES[name](model))
+        return self.providers[key]
+
+    def route(self, task):
+        if task not in self.routes:
+            raise LLMError(f"No LLM route for task: {task}")
+        return self.routes[task]
+
+    def _histogram(self, table, provider, task):
+        key = (provider.key, task)
+        hist = table.get(key)
+        if hist is None:
+            with self._lock:
+                hist = table.setdefault(key, LatencyHistogram())
+        return hist
+
+    def hedge_deadline(self, provider, task, first_chunk=False):
+        """p95 of the provider's latency on `task`: time to first chunk for streams, else total time."""
+        hist = (self.ttft if first_chunk else self.histograms).get((provider.key, task))
+        if hist is not None and hist.count >= MIN_SAMPLES_FOR_P95:
+            return hist.quantile(0.95)
+        return self.hedge_delay
+
+    def _admit(self, provider):
+        # Breaker first: requests it rejects are never sent, so they must not spend rate-limit tokens
+        breaker = self.breakers[provider.key]
+        if not breaker.allow():
+            raise CircuitOpen(f"{provider.key} circuit open")
+        try:
+            rate_limiter.acquire(provider.key)
+        except Exception:
+            breaker.abandon()
+            raise
+
+    def _candidates(self, task):
+        route = self.route(task)
+        specs = [route.primary] + ([route.hedge] if route.hedge else [])
+        candidates = [provider for provider in map(self.provider, specs) if provider.available]
+        if not candidates:
+            keys = ", ".join(f"{name}:{model}" for name, model in specs)
+            raise LLMError(f"No configured LLM provider for task {task} ({keys}); set its API key")
+        return route, candidates
+
+    # ---- calls ----
+    def _timed_complete(self, provider, task, prompt, route):
+        self._admit(provider)
+        hist = self._histogram(self.histograms, provider, task)
+        start = time.perf_counter()
+        try:
+            text = provider.complete(prompt, max_tokens=route.max_tokens, temperature=route.temperature)
+        except Exception:
+            hist.observe(time.perf_counter() - start, error=True)
+            self.breakers[provider.key].record(False)
+            raise
+        hist.observe(time.perf_counter() - start)
+        self.breakers[provider.key].record(True)
+        return text
+
+    def complete(self, task, prompt):
+        """
+        Return the full completion for `prompt` using the route for `task`.
+        The hedge fires after the primary's p95 deadline, or immediately if the primary
+        fails or its circuit is open; a blocking call that loses the race is ignored.
+        """
+        route, candidates = self._candidates(task)
+        events = queue.Queue()
+
+        def run(provider):
+            try:
+                events.put((provider, self._timed_complete(provider, task, prompt, route), None))
+            except Exception as e:
+                events.put((provider, None, e))
+
+        self._executor.submit(run, candidates[0])
+        launched, failures = 1, []
+        deadline = self.hedge_deadline(candidates[0], task)
+        while True:
+            try:
+                provider, text, error = events.get(timeout=deadline if launched < len(candidates) else None)
+            except queue.Empty:
+                self._executor.submit(run, candidates[launched])
+                launched += 1
+                continue
+            if error is None:
+                return text.strip()
+            failures.append(f"{provider.key}: {error}")
+            if launched < len(candidates):
+                self._executor.submit(run, candidates[launched])
+                launched += 1
+            elif len(failures) == launched:
+                raise LLMError("; ".join(failures))
+
+    def stream(self, task, prompt):
+        """
+        Yield chunks for `prompt`. Hedging is decided on the primary's time-to-first-chunk
+        p95; once a provider has produced a chunk it wins and the other stream is stopped.
+        """
+        route, candidates = self._candidates(task)
+        events = queue.Queue()
+        done = object()
+        closed = threading.Event()  # set when the caller stops reading
+        race = {"winner": None}
+
+        def run(provider):
+            try:
+                self._admit(provider)
+            except Exception as e:
+                events.put((provider, e))
+                return
+            breaker = self.breakers[provider.key]
+            start, first = time.perf_counter(), True
+            try:
+                for chunk in provider.stream(prompt, max_tokens=route.max_tokens, temperature=route.temperature):
+                    if first:
+                        self._histogram(self.ttft, provider, task).observe(time.perf_counter() - start)
+                        first = False
+                    if closed.is_set() or race["winner"] not in (None, provider):
+                        # Caller is gone or the other provider won: the partial time is not recorded
+                        breaker.record(True)
+                        return
+                    events.put((provider, chunk))
+            except Exception as e:
+                self._histogram(self.histograms, provider, task).observe(time.perf_counter() - start, error=True)
+                breaker.record(False)
+                events.put((provider, e))
+                return
+            self._histogram(self.histograms, provider, task).observe(time.perf_counter() - start)
+            breaker.record(True)
+            events.put((provider, done))
+
+        self._executor.submit(run, candidates[0])
+        launched, failures, winner = 1, [], None
+        deadline = self.hedge_deadline(candidates[0], task, first_chunk=True)
+        try:
+            while True:
+                hedging = winner is None and launched < len(candidates)
+                try:
+                    provider, item = events.get(timeout=deadline if hedging else None)
+                except queue.Empty:
+                    self._executor.submit(run, candidates[launched])
+                    launched += 1
+                    continue
+                if winner is not None and provider is not winner:
+                    continue
+                if item is done:
+                    # A provider that finishes without any text counts as an empty answer.
+                    return
+                if isinstance(item, Exception):
+                    if winner is not None:
+                        raise LLMError(f"{provider.key}: {item}")
+                    failures.append(f"{provider.key}: {item}")
+                    if launched < len(candidates):
+                        self._executor.submit(run, candidates[launched])
+                        launched += 1
+                    elif len(failures) == launched:
+                        raise LLMError("; ".join(failures))
+                    continue
+                winner = race["winner"] = provider
+                yield item
+        finally:
+            closed.set()
+
+    async def astream(self, task, prompt):
+        """
+        Async wrapper around `stream` that never blocks the event loop. Closing it
+        early (client gone, or only the opening was needed) stops the provider stream.
+        """
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue()
+        end = object()
+        stop = threading.Event()
+
+        def pump():
+            stream = self.stream(task, prompt)
+            try:
+                for chunk in stream:
+                    if stop.is_set():
+                        break
+                    loop.call_soon_threadsafe(chunks.put_nowait, chunk)
+            except Exception as e:
+                loop.call_soon_threadsafe(chunks.put_nowait, e)
+            finally:
+                stream.close()
+            loop.call_soon_threadsafe(chunks.put_nowait, end)
+
+        loop.run_in_executor(self._stream_executor, pump)
+        try:
+            while True:
+                item = await chunks.get()
+                if item is end:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+
+    def stats(self):
+        """Per provider: circuit state and, per task, total latency and stream time to first chunk."""
+        stats = {
+            key: {"circuit": breaker.state, "circuit_opens": breaker.opens, "tasks": {}}
+            for key, breaker in list(self.breakers.items())
+        }
+        for name, table in (("seconds", self.histograms), ("ttft", self.ttft)):
+            for (key, task), hist in list(table.items()):
+                stats[key]["tasks"].setdefault(task, {})[name] = hist.snapshot()
+        return stats
+
+
+def load_routes(path):
+    """
+    Read task routes from a JSON file of the form
+    {"chat": {"primary": ["gemini", "..."], "hedge": ["groq", "..."], "max_tokens": 2000}}.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    routes = dict(DEFAULT_ROUTES)
+    for task, spec in raw.items():
+        hedge = spec.get("hedge")
+        routes[task] = Route(
+            tuple(spec["primary"]),
+            tuple(hedge) if hedge else None,
+            max_tokens=spec.get("max_tokens", 1000),
+            temperature=spec.get("temperature", 0.7),
+        )
+    return routes
+
+
+_config_path = os.environ.get("LLM_ROUTER_CONFIG")
+router = LLMRouter(load_routes(_config_path) if _config_path else None)
+
+
+@registry.add_collector
+def _llm_metrics():
+    def samples(table):
+        # LatencyHistogram keeps an overflow slot after the bounded buckets; +Inf is the total count
+        return [
+            ({"provider": key, "task": task}, hist.buckets, hist.counts, hist.total, hist.count)
+            for (key, task), hist in sorted(table.items())
+        ]
+
+    histograms = sorted(router.histograms.items())
+    return (
+        histogram_family("ai_teacher_llm_seconds", "LLM call latency per provider and task.",
+                         samples(router.histograms))
+        + histogram_family("ai_teacher_llm_ttft_seconds", "LLM stream time to first chunk per provider and task.",
+                           samples(router.ttft))
+        + metric_family("ai_teacher_llm_errors_total", "counter", "Failed LLM calls per provider and task.", [
+            ({"provider": key, "task": task}, hist.errors) for (key, task), hist in histograms
+        ])
+        + metric_family("ai_teacher_llm_circuit_open", "gauge", "1 while a provider's circuit is open.", [
+            ({"provider": key}, int(breaker.state == "open")) for key, breaker in sorted(router.breakers.items())
+        ])
+    )
+
+
+def complete(task, prompt):
+    return router.complete(task, prompt)
+
+
+def stream(task, prompt):
+    return router.stream(task, prompt)
+
+
+def astream(task, prompt):
+    return router.astream(task, prompt)
@@ -0,0 +1,232 @@
+"""
+Student progress and next-topic prefetch for live lessons.
+
+Lessons follow the textbook order (1.1 → 1.1.1 → 1.2 ...), so once a student
+finishes a subtopic the next one is highly predictable.
+
+* ProgressStore: per-session started/completed subtopics, kept in memory and
+  dropped after PROGRESS_SESSION_TTL seconds of inactivity.
+* TopicOrder: textbook order from the section titles; `next_topic()` is the
+  first section after the current one that the session has not completed.
+* LessonPrefetcher: builds the next lesson in the background (retrieval,
+  figures, video and the opening LLM segment) so it can start from cache.
+  Lessons for the same topic share one entry across sessions; entries expire
+  after PREFETCH_TTL seconds. `stats()["hit_rate"]` is the share of fresh
+  lessons that started from a prefetch.
+"""
+import asyncio
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from .tracing import metric_family, registry
+
+PROGRESS_SESSION_TTL = float(os.environ.get("PROGRESS_SESSION_TTL", str(6 * 3600)))
+PROGRESS_MAX_SESSIONS = int(os.environ.get("PROGRESS_MAX_SESSIONS", "10000"))
+PREFETCH_TTL = float(os.environ.get("PREFETCH_TTL", "1800"))
+PREFETCH_MAX_ENTRIES = int(os.environ.get("PREFETCH_MAX_ENTRIES", "256"))
+# A lesson joins a prefetch still in progress for at most this long before building its own
+PREFETCH_JOIN_WAIT = float(os.environ.get("PREFETCH_JOIN_WAIT", "2"))
+
+SECTION_NUMBER_RE = re.compile(r"^\s*\d+(\.\d+)*\s*")
+
+
+def topic_title(title):
+    """Section title without its number: '1.2.1 Combination Reaction' -> 'Combination Reaction'."""
+    return SECTION_NUMBER_RE.sub("", title or "").strip()
+
+
+def topic_key(title):
+    return " ".join(topic_title(title).lower().split())
+
+
+# -------------------------
+# Progress
+# -------------------------
+class ProgressStore:
+    def __init__(self, ttl=PROGRESS_SESSION_TTL, max_sessions=PROGRESS_MAX_SESSIONS):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()  # session -> {"current", "completed": {key: title}, "updated"}
+        self._lock = threading.Lock()
+
+    def _session(self, session):
+        """Caller holds the lock."""
+        now = time.time()
+        state = self._sessions.pop(session, None)
+        if state is None or state["updated"] + self.ttl < now:
+            state = {"current": None, "completed": {}}
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if oldest["updated"] + self.ttl >= now and len(self._sessions) < self.max_sessions:
+                break
+            self._sessions.popitem(last=False)
+        state["updated"] = now
+        self._sessions[session] = state
+        return state
+
+    def record_started(self, session, subtopic):
+        with self._lock:
+            self._session(session)["current"] = subtopic
+
+    def record_completed(self, session, subtopic):
+        with self._lock:
+            state = self._session(session)
+            state["completed"][topic_key(subtopic)] = subtopic
+            if state["current"] == subtopic:
+                state["current"] = None
+
+    def completed(self, session):
+        with self._lock:
+            state = self._sessions.get(session)
+            return set(state["completed"]) if state else set()
+
+    def get(self, session):
+        with self._lock:
+            state = self._sessions.get(session)
+            if state is None:
+                return {"current": None, "completed": []}
+            return {"current": state["current"], "completed": list(state["completed"].values())}
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class TopicOrder:
+    def __init__(self, titles):
+        self.titles = [topic_title(t) for t in titles]
+        self._keys = [topic_key(t) for t in titles]
+
+    def position(self, subtopic):
+        """Index of the section `subtopic` names (exact title, else the first title containing it)."""
+        key = topic_key(subtopic)
+        if not key:
+            return None
+        if key in self._keys:
+            return self._keys.index(key)
+        return next((i for i, k in enumerate(self._keys) if key in k), None)
+
+    def next_topic(self, subtopic, completed=()):
+        position = self.position(subtopic)
+        if position is None:
+            return None
+        current = self._keys[position]
+        for title, key in zip(self.titles[position + 1:], self._keys[position + 1:]):
+            if key and key != current and key not in completed:
+                return title
+        return None
+
+
+# -------------------------
+# Prefetch
+# -------------------------
+class PrefetchedLesson:
+    __slots__ = ("topic", "prompt", "opening", "created")
+
+    def __init__(self, topic, prompt, opening):
+        self.topic = topic
+        self.prompt = prompt
+        self.opening = opening
+        self.created = time.time()
+
+
+class LessonPrefetcher:
+    def __init__(self, build, ttl=PREFETCH_TTL, max_entries=PREFETCH_MAX_ENTRIES, join_wait=PREFETCH_JOIN_WAIT):
+        """`build` is an async function topic -> PrefetchedLesson (or None to skip)."""
+        self.build = build
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.join_wait = join_wait
+        self._ready = OrderedDict()  # topic key -> PrefetchedLesson
+        self._tasks = {}             # topic key -> asyncio.Task still building
+        self.counts = {"scheduled": 0, "hits": 0, "inflight_hits": 0, "misses": 0,
+                       "expired": 0, "skipped": 0, "failed": 0}
+
+    def schedule(self, topic):
+        """Start building `topic` in the background unless it is cached or already building."""
+        key = topic_key(topic)
+        entry = self._ready.get(key)
+        if not key or key in self._tasks or (entry is not None and entry.created + self.ttl > time.time()):
+            return
+        self.counts["scheduled"] += 1
+        task = asyncio.create_task(self._run(key, topic))
+        self._tasks[key] = task
+
+    async def _run(self, key, topic):
+        try:
+            lesson = await self.build(topic)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ Prefetch of {topic!r} failed: {e}")
+            self.counts["failed"] += 1
+            return None
+        finally:
+            self._tasks.pop(key, None)
+        if lesson is None:
+            self.counts["skipped"] += 1
+            return None
+        self._ready[key] = lesson
+        self._ready.move_to_end(key)
+        while len(self._ready) > self.max_entries:
+            self._ready.popitem(last=False)
+        return lesson
+
+    async def take(self, topic):
+        """The prefetched lesson for `topic` (waiting for one already being built), or None."""
+        key = topic_key(topic)
+        entry = self._ready.get(key)
+        if entry is not None and entry.created + self.ttl <= time.time():
+            del self._ready[key]
+            self.counts["expired"] += 1
+            entry = None
+        if entry is not None:
+            self.counts["hits"] += 1
+            return entry
+        task = self._tasks.get(key)
+        if task is not None:
+            # Same work the live lesson would do, already under way; it keeps going for later students
+            try:
+                entry = await asyncio.wait_for(asyncio.shield(task), self.join_wait)
+            except (asyncio.TimeoutError, Exception):
+                entry = None
+            if entry is not None:
+                self.counts["inflight_hits"] += 1
+                return entry
+        self.counts["misses"] += 1
+        return None
+
+    def stats(self):
+        served = self.counts["hits"] + self.counts["inflight_hits"]
+        lookups = served + self.counts["misses"]
+        return {
+            **self.counts,
+            "ready": len(self._ready),
+            "building": len(self._tasks),
+            "hit_rate": round(served / lookups, 4) if lookups else None,
+        }
+
+
+_prefetchers = []
+
+
+def register(prefetcher):
+    """Expose a prefetcher's counters on /metrics."""
+    _prefetchers.append(prefetcher)
+    return prefetcher
+
+
+@registry.add_collector
+def _prefetch_metrics():
+    if not _prefetchers:
+        return []
+    stats = [prefetcher.stats() for prefetcher in _prefetchers]
+    names = ("scheduled", "hits", "inflight_hits", "misses", "expired", "skipped", "failed")
+    return (
+        metric_family("ai_teacher_prefetch_total", "counter", "Next-lesson prefetch events by result.",
+                      [({"result": name}, sum(s[name] for s in stats)) for name in names])
+        + metric_family("ai_teacher_prefetch_ready", "gauge", "Prefetched lessons ready to serve.",
+                        [(None, sum(s["ready"] for s in stats))])
+    )
@@ -0,0 +1,242 @@
+"""
+Token-budgeted prompt assembly.
+
+Retrieved passages are deduplicated, ranked by relevance and packed under a
+per-task token budget before they are inserted into a prompt template. Each
+template starts with a static prefix that is identical across calls (so a
+provider's prefix cache can reuse it); its token count is computed once.
+
+Prompt sizes are tracked per task together with the streaming time to first
+token, which is the part of LLM latency that grows with prompt length, to
+estimate how much latency packing saves.
+"""
+import logging
+import re
+import threading
+import time
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# Token budget for the retrieved-content part of each prompt
+TASK_BUDGETS = {
+    "lesson": 1800,
+    "resume": 1200,
+    "explanation": 2500,
+    "chat": 1500,
+}
+DEFAULT_BUDGET = 1500
+
+# Passages sharing at least this fraction of their word shingles are duplicates
+OVERLAP_THRESHOLD = 0.8
+SHINGLE_SIZE = 5
+
+# TTFT samples needed before the per-token latency slope is reported
+MIN_TTFT_SAMPLES = 20
+
+_WORD_RE = re.compile(r"\w+|[^\w\s]")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+# -------------------------
+# Token counting
+# -------------------------
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text):
+    """Count tokens with tiktoken when it is installed, else a word/punctuation estimate."""
+    enc = _encoding()
+    if enc is not None:
+        return len(enc.encode(text))
+    # BPE vocabularies split roughly 4 tokens per 3 words on English prose
+    return (len(_WORD_RE.findall(text)) * 4 + 2) // 3
+
+
+def cut_to_tokens(text, budget):
+    """The longest prefix of `text` within `budget` tokens, cut mid-sentence if needed."""
+    enc = _encoding()
+    if enc is not None:
+        return enc.decode(enc.encode(text)[:budget])
+    words = text.split()
+    n = min(len(words), budget * 3 // 4)
+    while n and count_tokens(" ".join(words[:n])) > budget:
+        n -= 1
+    return " ".join(words[:n])
+
+
+def truncate_to_tokens(text, budget):
+    """
+    Keep whole sentences from the start of `text` until `budget` tokens are used;
+    if even the first sentence is over budget, cut it instead of returning nothing.
+    """
+    kept, used = [], 0
+    for sentence in _SENTENCE_RE.split(text):
+        n = count_tokens(sentence)
+        if used + n > budget:
+            break
+        kept.append(sentence)
+        used += n
+    if not kept:
+        return cut_to_tokens(text, budget)
+    return " ".join(kept)
+
+
+# -------------------------
+# Deduplication
+# -------------------------
+def _shingles(text):
+    words = text.lower().split()
+    if len(words) <= SHINGLE_SIZE:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def dedupe_passages(scored_passages, threshold=OVERLAP_THRESHOLD):
+    """
+    Drop passages that mostly overlap an already-kept, higher-scoring passage.
+    `scored_passages` is a list of (score, text) pairs; higher scores are kept first.
+    """
+    kept, kept_shingles = [], []
+    for score, text in sorted(scored_passages, key=lambda p: p[0], reverse=True):
+        if not text or not text.strip():
+            continue
+        shingles = _shingles(text)
+        duplicate = any(
+            len(shingles & other) / max(1, min(len(shingles), len(other))) >= threshold
+            for other in kept_shingles
+        )
+        if not duplicate:
+            kept.append((score, text))
+            kept_shingles.append(shingles)
+    return kept
+
+
+# -------------------------
+# Stats
+# -------------------------
+def _slope(rows):
+    """Least-squares slope of seconds over prompt tokens, or None if prompt sizes do not vary."""
+    n = len(rows)
+    mean_x = sum(r[0] for r in rows) / n
+    mean_y = sum(r[1] for r in rows) / n
+    var_x = sum((r[0] - mean_x) ** 2 for r in rows)
+    if not var_x:
+        return None
+    return sum((r[0] - mean_x) * (r[1] - mean_y) for r in rows) / var_x
+
+
+class PromptStats:
+    """Prompt-size and time-to-first-token samples per task."""
+
+    def __init__(self, window=500):
+        self.window = window
+        self.samples = {}
+        self.ttfts = {}
+        self._lock = threading.Lock()
+
+    def record_build(self, task, raw_tokens, packed_tokens, build_seconds):
+        with self._lock:
+            rows = self.samples.setdefault(task, [])
+            rows.append((raw_tokens, packed_tokens, build_seconds))
+            del rows[:-self.window]
+
+    def record_ttft(self, task, prompt_tokens, seconds):
+        """Time to first token of a streamed call: prefill, unlike output generation, scales with the prompt."""
+        with self._lock:
+            rows = self.ttfts.setdefault(task, [])
+            rows.append((prompt_tokens, seconds))
+            del rows[:-self.window]
+
+    def summary(self):
+        out = {}
+        with self._lock:
+            for task, rows in self.samples.items():
+                packed = sorted(r[1] for r in rows)
+                out[task] = {
+                    "prompts": len(rows),
+                    "raw_tokens_mean": sum(r[0] for r in rows) / len(rows),
+                    "packed_tokens_mean": sum(packed) / len(packed),
+                    "packed_tokens_p50": packed[len(packed) // 2],
+                    "packed_tokens_p95": packed[min(len(packed) - 1, int(0.95 * len(packed)))],
+                    "build_ms_mean": 1000 * sum(r[2] for r in rows) / len(rows),
+                }
+            for task, rows in self.ttfts.items():
+                entry = out.setdefault(task, {})
+                entry["ttft_samples"] = len(rows)
+                entry["ttft_seconds_mean"] = sum(r[1] for r in rows) / len(rows)
+                # TTFT growth per prompt token (the regression intercept absorbs network and queueing)
+                slope = _slope(rows) if len(rows) >= MIN_TTFT_SAMPLES else None
+                entry["ttft_seconds_per_1k_tokens"] = 1000 * slope if slope is not None else None
+                if "raw_tokens_mean" in entry and slope is not None and slope > 0:
+                    saved = entry["raw_tokens_mean"] - entry["packed_tokens_mean"]
+                    entry["est_ttft_delta_seconds"] = -saved * slope
+        return out
+
+
+stats = PromptStats()
+
+
+# -------------------------
+# Templates
+# -------------------------
+class PromptTemplate:
+    """
+    A prompt made of a static `prefix` (identical across calls, tokenized once) and
+    a `body` format string that receives the packed passages as `{content}`.
+    """
+
+    def __init__(self, task, prefix, body, budget=None):
+        self.task = task
+        self.prefix = prefix
+        self.body = body
+        self.budget = budget or TASK_BUDGETS.get(task, DEFAULT_BUDGET)
+
+    @property
+    def prefix_tokens(self):
+        return _prefix_tokens(self.prefix)
+
+    def pack(self, scored_passages, budget=None):
+        """Return (content, packed_tokens, raw_tokens) for the passages under the budget."""
+        budget = budget or self.budget
+        raw_tokens = sum(count_tokens(text) for _, text in scored_passages if text)
+        packed, used = [], 0
+        # Greedy by relevance; a passage that does not fit is truncated if enough
+        # room is left, otherwise skipped so a shorter, lower-ranked one can fill the gap
+        for _, text in dedupe_passages(scored_passages):
+            n = count_tokens(text)
+            if used + n <= budget:
+                packed.append(text)
+                used += n
+                continue
+            remaining = budget - used
+            if remaining > 50:
+                partial = truncate_to_tokens(text, remaining)
+                if partial:
+                    packed.append(partial)
+                    used += count_tokens(partial)
+        return "\n\n".join(packed), used, raw_tokens
+
+    def build(self, scored_passages, budget=None, **fields):
+        start = time.perf_counter()
+        content, packed_tokens, raw_tokens = self.pack(scored_passages, budget)
+        prompt = self.prefix + self.body.format(content=content, **fields)
+        build_seconds = time.perf_counter() - start
+        stats.record_build(self.task, raw_tokens, packed_tokens, build_seconds)
+        logger.info(
+            "prompt[%s] content %d -> %d tokens (budget %d, prefix %d), built in %.1f ms",
+            self.task, raw_tokens, packed_tokens, budget or self.budget,
+            self.prefix_tokens, build_seconds * 1000,
+        )
+        return prompt
+
+
+@lru_cache(maxsize=64)
+def _prefix_tokens(prefix):
+    return count_tokens(prefix)
@@ -1,7 +1,14 @@
-import json
-import numpy as np
-import faiss
-from sentence_transformers import SentenceTransformer
+import os
+
+from .corpus_store import open_corpus
+from .encoders import get_encoder
+from .prompt_builder import PromptTemplate
+from .reranker import RERANK_CANDIDATES, RERANK_ENABLED, RERANK_TOP_K, get_reranker
+from .startup import lazy_import, load_once
+from .tracing import span
+
+np = lazy_import("numpy")
+faiss = lazy_import("faiss")
 
 class RAGRetriever:
     def __init__(
@@ -10,18 +17,19 @@ class RAGRetriever:
         metadata_path: str,
         embed_path: str,
         index_path: str,
-        model_name: str = "msmarco-distilbert-base-v4"
+        model_name: str = "msmarco-distilbert-base-v4",
+        store_path: str = None
     ):
-        # Load knowledge base (e.g., textbook content)
-        with open(knowledge_path, "r", encoding="utf-8") as f:
-            self.knowledge = json.load(f)
-
-        # Load metadata (e.g., titles, chapters)``
-        with open(metadata_path, "r", encoding="utf-8") as f:
-            self.metadata = json.load(f)
+        # Knowledge base + metadata as a memory-mapped corpus store (section id == FAISS row),
+        # rebuilt next to the JSON files whenever they change
+        self.store = open_corpus(
+            store_path or os.path.join(os.path.dirname(knowledge_path), "sections.bin"),
+            knowledge_path=knowledge_path,
+            metadata_path=metadata_path,
+        )
 
         # Initialize the embedding model
-        self.embed_model = SentenceTransformer(model_name)
+        self.embed_model = get_encoder(model_name)
 
         # Load precomputed embeddings
         self.embeddings = np.load(embed_path)
@@ -32,60 +40,91 @@ class RAGRetriever:
         # Normalize embeddings for cosine similarity
         faiss.normalize_L2(self.embeddings)
 
-    def retrieve(self, query: str, k: int = 5, threshold: float = 0.5):
-        """
-        Retrieves top-k relevant documents based on query using FAISS and SentenceTransformer.
+    def preload_titles(self):
+        """Cache embeddings of every section title, the most common queries."""
+        return self.embed_model.preload(self.store.titles())
 
-        Args:
-            query (str): The search query.
-            k (int): The number of results to return.
-            threshold (float): The similarity threshold to filter results.
+    def retrieve_scored(self, query: str, k: int = None, threshold: float = 0.5, rerank: bool = None):
+        """
+        Same as `retrieve`, but returns (score, content) pairs so callers can rank
+        and pack passages by relevance.
 
-        Returns:
-            list: A list of relevant content based on the query.
+        With `rerank` (default: RERANK env), FAISS fetches RERANK_CANDIDATES sections
+        and the cross-encoder keeps the best k (default RERANK_TOP_K), scored by the reranker.
+        Without reranking k defaults to 5.
         """
+        rerank = RERANK_ENABLED if rerank is None else rerank
+        if k is None:
+            k = RERANK_TOP_K if rerank else 5
+        if rerank:
+            candidates = self.retrieve_scored(query, k=max(k, RERANK_CANDIDATES), threshold=threshold, rerank=False)
+            ranked = get_reranker().rerank(query, [content for _, content in candidates], k)
+            return [(score, content) for score, content in ranked]
+
         # Encode the query into embedding using SentenceTransformer
-        q_emb = self.embed_model.encode([query], convert_to_numpy=True)
-        faiss.normalize_L2(q_emb)
+        with span("retrieval.encode"):
+            q_emb = self.embed_model.encode([query], convert_to_numpy=True)
+            faiss.normalize_L2(q_emb)
 
         # Perform the FAISS search
-        distances, indices = self.index.search(q_emb, k)
+        with span("retrieval.faiss"):
+            distances, indices = self.index.search(q_emb, k)
 
         # Collect search results
         results = []
         for dist, idx in zip(distances[0], indices[0]):
             if dist >= threshold:
-                # Extract metadata and content based on the index
-                meta = self.metadata[idx]
-                content = self.knowledge.get(meta["chapter"], {}).get(meta["title"], None)
+                # Section ids are FAISS row ids
+                content = self.store.text(idx)
                 if content:
-                    results.append(content)
+                    results.append((float(dist), content))
                 else:
-                    results.append(
-                        f"[Warning] Content for '{meta['title']}' not found in chapter '{meta['chapter']}'."
-                    )
+                    results.append((
+                        float(dist),
+                        f"[Warning] Content for '{self.store.title(idx)}' not found in chapter '{self.store.chapter(idx)}'."
+                    ))
         return results
 
+    def retrieve(self, query: str, k: int = None, threshold: float = 0.5, rerank: bool = None):
+        """
+        Retrieves top-k relevant documents based on query using FAISS and SentenceTransformer.
+
+        Args:
+            query (str): The search query.
+            k (int): The number of results to return (default: 5, or RERANK_TOP_K when reranking).
+            threshold (float): The similarity threshold to filter results.
+            rerank (bool): Rerank candidates with the cross-encoder (default: RERANK env).
 
+        Returns:
+            list: A list of relevant content based on the query.
+        """
+        return [content for _, content in self.retrieve_scored(query, k=k, threshold=threshold, rerank=rerank)]
+
+
+@load_once
+def get_rag_retriever():
+    return RAGRetriever(
+        knowledge_path=r"C:\Users\neesh\OneDrive\Documents\Ai teacher robot\AI ROBOT AGENT\backend\knowledgebase.json",
+        metadata_path=r"C:\Users\neesh\OneDrive\Documents\Ai teacher robot\AI ROBOT AGENT\backend\metadata.json",
+        embed_path=r"C:\Users\neesh\OneDrive\Documents\Ai teacher robot\AI ROBOT AGENT\backend\title_embeddings.npy",
+        index_path=r"C:\Users\neesh\OneDrive\Documents\Ai teacher robot\AI ROBOT AGENT\backend\faiss_index_ms_marco.index"
+    )
 
-rag_retriever = RAGRetriever(
-    knowledge_path=r"C:\Users\neesh\OneDrive\Documents\Ai teacher robot\AI ROBOT AGENT\backend\knowledgebase.json",
-    metadata_path=r"C:\Users\neesh\OneDrive\Documents\Ai teacher robot\AI ROBOT AGENT\backend\metadata.json",
-    embed_path=r"C:\Users\neesh\OneDrive\Documents\Ai teacher robot\AI ROBOT AGENT\backend\title_embeddings.npy",
-    index_path=r"C:\Users\neesh\OneDrive\Documents\Ai teacher robot\AI ROBOT AGENT\backend\faiss_index_ms_marco.index"
+LESSON_TEMPLATE = PromptTemplate(
+    "lesson",
+    prefix="You are an engaging 8th-grade science teacher. ",
+    body=(
+        "Use the following content to teach about **{subtopic}**:\n\n"
+        "{content}\n\n"
+        "Now deliver a clear, student-friendly lesson inline with this material."
+    ),
 )
 
-def get_lesson_prompt(subtopic: str, k: int = 5) -> str:
+
+def get_lesson_prompt(subtopic: str, k: int = None) -> str:
     
-    passages = rag_retriever.retrieve(subtopic, k=k)
+    passages = get_rag_retriever().retrieve_scored(subtopic, k=k)
     if not passages:
         return "**[OUT_OF_SYLLABUS]** No matching content found."
 
-    prompt = (
-        "You are an engaging 8th-grade science teacher. "
-        f"Use the following content to teach about **{subtopic}**:\n\n"
-    )
-    for i, p in enumerate(passages, start=1):
-        prompt += f"Passage {i}:\n{p}\n\n"
-    prompt += "Now deliver a clear, student-friendly lesson inline with this material."
-    return prompt
+    return LESSON_TEMPLATE.build(passages, subtopic=subtopic)
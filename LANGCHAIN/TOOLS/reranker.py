@@ -0,0 +1,130 @@
+"""
+Second-stage reranking with a small local cross-encoder.
+
+First-stage retrieval (FAISS over title embeddings) is fast but coarse, so
+callers used to take 5 whole sections to be safe. With reranking enabled the
+retriever fetches RERANK_CANDIDATES sections, scores every (query, passage) pair
+with the cross-encoder in one batch, and keeps the best RERANK_TOP_K (unless the
+caller asks for a specific number).
+Pair scores are cached, since the same subtopics are queried over and over.
+
+Enable with RERANK=1 (or pass rerank=True). Cost vs. prompt-token savings:
+benchmarks/rerank_cost.py.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from .embedding_cache import normalize_query
+from .startup import load_once
+from .tracing import metric_family, registry, span
+
+RERANK_ENABLED = os.environ.get("RERANK", "0") == "1"
+RERANK_MODEL = os.environ.get("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_CANDIDATES = int(os.environ.get("RERANK_CANDIDATES", "8"))
+RERANK_TOP_K = int(os.environ.get("RERANK_TOP_K", "2"))
+RERANK_BATCH_SIZE = int(os.environ.get("RERANK_BATCH_SIZE", "16"))
+RERANK_CACHE_SIZE = int(os.environ.get("RERANK_CACHE_SIZE", "20000"))
+# Passages are whole sections; the cross-encoder only sees the first max_length tokens
+RERANK_MAX_LENGTH = int(os.environ.get("RERANK_MAX_LENGTH", "512"))
+
+
+class CrossEncoderReranker:
+    def __init__(self, model_name=RERANK_MODEL, batch_size=RERANK_BATCH_SIZE,
+                 cache_size=RERANK_CACHE_SIZE, max_length=RERANK_MAX_LENGTH, device=None):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self.max_length = max_length
+        self.device = device
+        self._model = None
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.model_seconds = 0.0
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from sentence_transformers import CrossEncoder
+                    self._model = CrossEncoder(self.model_name, max_length=self.max_length, device=self.device)
+        return self._model
+
+    @staticmethod
+    def _key(query, passage):
+        return normalize_query(query), hashlib.sha1(passage.encode("utf-8")).hexdigest()[:16]
+
+    def score(self, query, passages):
+        """Relevance of each passage to `query` (higher is better); only uncached pairs hit the model."""
+        keys = [self._key(query, passage) for passage in passages]
+        scores = [None] * len(passages)
+        with self._lock:
+            for i, key in enumerate(keys):
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    scores[i] = self._cache[key]
+            missing = [i for i, score in enumerate(scores) if score is None]
+            self.hits += len(passages) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            start = time.perf_counter()
+            with span("retrieval.rerank"):
+                predicted = self.model.predict(
+                    [(query, passages[i]) for i in missing], batch_size=self.batch_size, show_progress_bar=False
+                )
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.model_seconds += elapsed
+                for i, value in zip(missing, predicted):
+                    scores[i] = float(value)
+                    self._cache[keys[i]] = scores[i]
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return scores
+
+    def rerank(self, query, items, top_n, text=lambda item: item):
+        """Return the best `top_n` of `items` as (score, item), best first."""
+        if not items:
+            return []
+        scores = self.score(query, [text(item) for item in items])
+        ranked = sorted(zip(scores, range(len(items))), key=lambda pair: -pair[0])
+        return [(score, items[i]) for score, i in ranked[:top_n]]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "model": self.model_name,
+                "cached_pairs": len(self._cache),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "model_seconds": round(self.model_seconds, 3),
+            }
+
+
+@load_once
+def get_reranker(model_name=RERANK_MODEL):
+    return CrossEncoderReranker(model_name)
+
+
+@registry.add_collector
+def _rerank_metrics():
+    if not get_reranker.is_loaded():
+        return []
+    stats = get_reranker().stats()
+    return (
+        metric_family("ai_teacher_rerank_cached_pairs", "gauge", "Cached (query, passage) rerank scores.",
+                      [(None, stats["cached_pairs"])])
+        + metric_family("ai_teacher_rerank_hits", "counter", "Rerank scores served from cache.", [(None, stats["hits"])])
+        + metric_family("ai_teacher_rerank_misses", "counter", "Rerank scores computed by the model.",
+                        [(None, stats["misses"])])
+        + metric_family("ai_teacher_rerank_model_seconds", "counter", "Time spent in the rerank model.",
+                        [(None, stats["model_seconds"])])
+    )
@@ -0,0 +1,378 @@
+"""
+Per-textbook shards for serving many grades and subjects from one deployment.
+
+A catalog (catalog.json) lists the books; each book keeps its own files in its
+own directory, under the same names the single-book app uses:
+
+    {"books": [
+        {"id": "sci8", "title": "Science 8", "grade": 8, "subject": "science", "dir": "books/sci8"},
+        {"id": "phy10", "title": "Physics 10", "grade": 10, "subject": "physics", "dir": "books/phy10",
+         "files": {"text_index": "faiss_minilm.index"}}
+    ]}
+
+Without a catalog the current directory is the only book ("default"), so the
+existing layout keeps working unchanged.
+
+* Shards (corpus store + text FAISS index, figure index on first use) are loaded
+  on demand and evicted least-recently-used once their approximate footprint
+  (index and store file sizes) exceeds SHARD_MEMORY_BUDGET_MB.
+* `ShardManager.search()` routes to one book or fans out over several in
+  parallel and merges the per-book top-k. All books must be embedded with the
+  same encoder and indexed with the same FAISS metric (checked when a shard
+  loads) for their scores to be comparable. Requests that name no book, grade
+  or subject only search the default book.
+* Images are namespaced per book: /images/<book id>/<name>. The default book
+  keeps the flat /images/<name> URLs.
+
+Validate a catalog and prebuild its corpus stores:
+
+    python -m LANGCHAIN.TOOLS.shards catalog.json
+"""
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from .corpus_store import load_corpus
+from .figure_index import FigureIndex
+from .image_delivery import ImageStore
+from .startup import lazy_import
+from .tracing import metric_family, registry, span
+
+faiss = lazy_import("faiss")
+
+DEFAULT_BOOK = "default"
+SHARD_MEMORY_BUDGET_MB = float(os.environ.get("SHARD_MEMORY_BUDGET_MB", "1024"))
+SHARD_FANOUT_WORKERS = int(os.environ.get("SHARD_FANOUT_WORKERS", "8"))
+
+# File names inside a book directory (overridable per book with "files")
+BOOK_FILES = {
+    "knowledge": "knowledgebase.json",
+    "metadata": "metadata.json",
+    "text_index": "textbook_faiss.index",
+    "figures": "output.json",
+    "figure_rows": "subchapter_metadata.json",
+    "figure_rows_index": "subchapter_faiss.index",
+    "figure_index": "figure_faiss.index",
+    "figure_metadata": "figure_metadata.json",
+    "corpus": "corpus.bin",
+    "images": "images",
+}
+
+
+# -------------------------
+# Catalog
+# -------------------------
+class Book:
+    def __init__(self, id, root=".", title=None, grade=None, subject=None, files=None):
+        if "/" in id or "\\" in id:
+            raise ValueError(f"Book id {id!r} may not contain path separators")
+        self.id = id
+        self.root = root
+        self.title = title or id
+        self.grade = grade
+        self.subject = subject
+        self.files = {**BOOK_FILES, **(files or {})}
+        self._titles = None
+
+    def path(self, name):
+        return os.path.join(self.root, self.files[name])
+
+    def optional_path(self, name):
+        path = self.path(name)
+        return path if os.path.exists(path) else None
+
+    def load_corpus(self):
+        # Not the process-wide open_corpus() cache, so an unloaded shard's store can be freed.
+        # Books without figures (output.json / subchapter_metadata.json) are fine
+        return load_corpus(
+            self.path("corpus"), self.path("knowledge"), self.path("metadata"),
+            self.optional_path("figures"), self.optional_path("figure_rows"),
+        )
+
+    def titles(self):
+        """[(chapter, title)] by section id, read from metadata.json only (no corpus store or FAISS index)."""
+        if self._titles is None:
+            with open(self.path("metadata"), "r", encoding="utf-8") as f:
+                self._titles = [(item["chapter"], item["title"]) for item in json.load(f)]
+        return self._titles
+
+    def to_dict(self):
+        return {"id": self.id, "title": self.title, "grade": self.grade, "subject": self.subject, "dir": self.root}
+
+
+class Catalog:
+    def __init__(self, books):
+        if not books:
+            raise ValueError("Catalog has no books")
+        self.books = OrderedDict((book.id, book) for book in books)
+        self.default = next(iter(self.books))
+
+    def __contains__(self, book_id):
+        return book_id in self.books
+
+    def __getitem__(self, book_id):
+        return self.books[book_id]
+
+    def route(self, book=None, grade=None, subject=None):
+        """
+        Ids of the books a query should search: one named book, every book matching
+        the grade/subject filters, or just the default book when nothing is given.
+        """
+        if book:
+            return [book] if book in self.books else []
+        if grade is None and subject is None:
+            return [self.default]
+        return [
+            b.id for b in self.books.values()
+            if (grade is None or str(b.grade) == str(grade))
+            and (subject is None or (b.subject or "").lower() == str(subject).lower())
+        ]
+
+
+def load_catalog(path, default=None):
+    """Catalog from `path`, or just `default` (a Book; the current directory if None) if it does not exist."""
+    if not os.path.exists(path):
+        return Catalog([default or Book(DEFAULT_BOOK)])
+    with open(path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    base = os.path.dirname(os.path.abspath(path))
+    return Catalog([
+        Book(item["id"], root=os.path.join(base, item.get("dir", item["id"])), title=item.get("title"),
+             grade=item.get("grade"), subject=item.get("subject"), files=item.get("files"))
+        for item in raw["books"]
+    ])
+
+
+# -------------------------
+# Shards
+# -------------------------
+class Shard:
+    def __init__(self, book, encoder, on_resize=None):
+        self.book = book
+        self.corpus = book.load_corpus()
+        self.text_index = faiss.read_index(book.path("text_index"))
+        # Merged results are ordered by this: L2 distances ascend, inner products descend
+        self.higher_is_better = self.text_index.metric_type == faiss.METRIC_INNER_PRODUCT
+        self._encoder = encoder
+        self._on_resize = on_resize  # called after an index attaches lazily, so the manager re-measures
+        self._figure_index = None
+        self._figure_rows_index = None
+        self._lock = threading.Lock()
+
+    @property
+    def figure_index(self):
+        with self._lock:
+            loaded = self._figure_index is None
+            if loaded:
+                self._figure_index = FigureIndex(
+                    self.book.path("figure_index"), self.book.path("figure_metadata"),
+                    self.book.path("figures"), self._encoder(),
+                )
+            figure_index = self._figure_index
+        if loaded and self._on_resize:
+            self._on_resize(self)
+        return figure_index
+
+    @property
+    def figure_rows_index(self):
+        """FAISS index over the figure subchapter rows (row -> subchapter via the corpus store)."""
+        with self._lock:
+            loaded = self._figure_rows_index is None
+            if loaded:
+                self._figure_rows_index = faiss.read_index(self.book.path("figure_rows_index"))
+            figure_rows_index = self._figure_rows_index
+        if loaded and self._on_resize:
+            self._on_resize(self)
+        return figure_rows_index
+
+    def nbytes(self):
+        """Approximate resident size: the FAISS indexes are read into memory, the store is mmap'ed."""
+        paths = [self.book.path("text_index"), self.book.path("corpus")]
+        if self._figure_index is not None and self._figure_index._index is not None:
+            paths.append(self.book.path("figure_index"))
+        if self._figure_rows_index is not None:
+            paths.append(self.book.path("figure_rows_index"))
+        return sum(os.path.getsize(path) for path in paths if os.path.exists(path))
+
+    def search(self, query_embedding, k):
+        """[(score, shard, section_id)] for this book's top-k sections."""
+        with span("shard.search"):
+            scores, ids = self.text_index.search(query_embedding, k)
+        return [(float(score), self, int(idx)) for score, idx in zip(scores[0], ids[0]) if idx >= 0]
+
+
+class ShardManager:
+    def __init__(self, catalog, encoder, memory_budget_mb=SHARD_MEMORY_BUDGET_MB, fanout_workers=SHARD_FANOUT_WORKERS):
+        self.catalog = catalog
+        self.encoder = encoder  # zero-argument callable returning the shared embedding model
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+        self._shards = OrderedDict()  # book id -> Shard, least recently used first
+        self._sizes = {}
+        self._load_locks = {book_id: threading.Lock() for book_id in catalog.books}
+        self._image_stores = {}
+        self.higher_is_better = None  # text index metric shared by every book, set by the first load
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=fanout_workers, thread_name_prefix="shard-search")
+        self.counts = {"hits": 0, "loads": 0, "evictions": 0, "fanouts": 0}
+
+    def _touch(self, book_id):
+        with self._lock:
+            shard = self._shards.get(book_id)
+            if shard is not None:
+                self._shards.move_to_end(book_id)
+                self.counts["hits"] += 1
+            return shard
+
+    def get(self, book_id=None):
+        """Loaded shard for `book_id` (default book if None), loading it and evicting others if needed."""
+        book_id = book_id or self.catalog.default
+        shard = self._touch(book_id)
+        if shard is not None:
+            return shard
+        with self._load_locks[book_id]:
+            shard = self._touch(book_id)
+            if shard is not None:
+                return shard
+            with span("shard.load"):
+                shard = Shard(self.catalog[book_id], self.encoder, on_resize=self._resized)
+            with self._lock:
+                self._check_metric(shard)
+                self._shards[book_id] = shard
+                self._sizes[book_id] = shard.nbytes()
+                self.counts["loads"] += 1
+            print(f"📚 Loaded textbook shard {book_id}")
+            self._evict(keep=book_id)
+            return shard
+
+    def _check_metric(self, shard):
+        # Scores are merged across books, so L2 distances and inner products must not mix
+        if self.higher_is_better is None:
+            self.higher_is_better = shard.higher_is_better
+        elif shard.higher_is_better != self.higher_is_better:
+            raise ValueError(
+                f"Textbook {shard.book.id} uses a different text index metric than the other books; "
+                "all books in a catalog must be indexed with the same metric"
+            )
+
+    def _resized(self, shard):
+        """Re-measure a shard after a lazily loaded index attaches, then evict if over budget."""
+        book_id = shard.book.id
+        with self._lock:
+            if self._shards.get(book_id) is not shard:
+                return  # already evicted; its memory goes with the last caller
+            self._sizes[book_id] = shard.nbytes()
+        self._evict(keep=book_id)
+
+    def _evict(self, keep):
+        """Drop least recently used shards until under budget; callers still holding one finish normally."""
+        with self._lock:
+            while sum(self._sizes.values()) > self.memory_budget and len(self._shards) > 1:
+                book_id = next(b for b in self._shards if b != keep)
+                del self._shards[book_id]
+                del self._sizes[book_id]
+                self.counts["evictions"] += 1
+                print(f"📤 Unloaded textbook shard {book_id}")
+
+    def unload(self, book_id):
+        with self._lock:
+            if self._shards.pop(book_id, None) is not None:
+                del self._sizes[book_id]
+                self.counts["evictions"] += 1
+
+    def map(self, fn, books=None):
+        """
+        [fn(shard) for each of `books`] (all if None), loading shards as needed:
+        one book runs inline, several run in parallel.
+        """
+        books = list(books) if books is not None else list(self.catalog.books)
+        if len(books) == 1:
+            return [fn(self.get(books[0]))]
+        with self._lock:
+            self.counts["fanouts"] += 1
+        with span("shard.fanout"):
+            return list(self._pool.map(lambda book_id: fn(self.get(book_id)), books))
+
+    def search(self, query_embedding, k, books=None):
+        """Merged top-k [(score, shard, section_id)] across `books` (all if None), see map()."""
+        per_book = self.map(lambda shard: shard.search(query_embedding, k), books)
+        if len(per_book) == 1:
+            return per_book[0]
+        hits = [hit for book_hits in per_book for hit in book_hits]
+        # Every loaded book shares one metric (checked on load), so scores are comparable
+        hits.sort(key=lambda hit: -hit[0] if self.higher_is_better else hit[0])
+        return hits[:k]
+
+    # ---- images ----
+    def image_prefix(self, book_id):
+        return "/images/" if book_id == self.catalog.default else f"/images/{book_id}/"
+
+    def image_store(self, book_id):
+        with self._lock:
+            if book_id not in self._image_stores:
+                self._image_stores[book_id] = ImageStore(self.catalog[book_id].path("images"))
+            return self._image_stores[book_id]
+
+    def resolve_image(self, path):
+        """(ImageStore, name) for an /images/ path: "<book id>/<name>", or a bare name in the default book."""
+        book_id, _, name = path.partition("/")
+        if name and book_id in self.catalog:
+            return self.image_store(book_id), name
+        return self.image_store(self.catalog.default), path
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self.counts,
+                "books": len(self.catalog.books),
+                "loaded": {book_id: self._sizes[book_id] for book_id in self._shards},
+                "resident_bytes": sum(self._sizes.values()),
+                "memory_budget_bytes": self.memory_budget,
+            }
+
+
+_managers = []
+
+
+def register(manager):
+    """Expose a manager's counters on /metrics."""
+    _managers.append(manager)
+    return manager
+
+
+@registry.add_collector
+def _shard_metrics():
+    if not _managers:
+        return []
+    stats = [manager.stats() for manager in _managers]
+    return (
+        metric_family("ai_teacher_shards_loaded", "gauge", "Textbook shards currently loaded.",
+                      [(None, sum(len(s["loaded"]) for s in stats))])
+        + metric_family("ai_teacher_shards_resident_bytes", "gauge", "Approximate size of the loaded shards.",
+                        [(None, sum(s["resident_bytes"] for s in stats))])
+        + metric_family("ai_teacher_shard_events_total", "counter", "Shard cache events.", [
+            ({"event": name}, sum(s[name] for s in stats)) for name in ("hits", "loads", "evictions", "fanouts")
+        ])
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Validate a textbook catalog and build its corpus stores")
+    parser.add_argument("catalog")
+    args = parser.parse_args()
+    catalog = load_catalog(args.catalog)
+    metrics = {}
+    for book in catalog.books.values():
+        missing = [name for name in ("knowledge", "metadata", "text_index") if not os.path.exists(book.path(name))]
+        if missing:
+            print(f"❌ {book.id}: missing {', '.join(book.path(name) for name in missing)}")
+            continue
+        store = book.load_corpus()
+        metrics.setdefault(faiss.read_index(book.path("text_index")).metric_type, []).append(book.id)
+        print(f"✅ {book.id}: {len(store)} sections, {store.figure_count()} figures → {book.path('corpus')}")
+    if len(metrics) > 1:
+        groups = "; ".join(", ".join(ids) for ids in metrics.values())
+        print(f"❌ Books use different text index metrics ({groups}); merged scores would not be comparable")
@@ -0,0 +1,142 @@
+"""
+Cold-start helpers shared by the Flask app and the FastAPI backend.
+
+Heavy modules (torch, faiss, sentence_transformers, yt_dlp, ...) are imported
+lazily, and models/indexes are loaded by warmup steps that run in a background
+thread once the server socket is bound. `readiness()` reports progress for the
+/ready endpoints. Loaders are wrapped in `load_once` so a request that arrives
+during the warmup waits for the model it needs instead of loading a second copy.
+"""
+import functools
+import importlib
+import logging
+import threading
+import time
+import traceback
+
+logger = logging.getLogger(__name__)
+
+PROCESS_START = time.time()
+
+
+class _LazyModule:
+    """Module proxy that performs the real import on first attribute access."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def lazy_import(name):
+    return _LazyModule(name)
+
+
+def load_once(fn):
+    """
+    Cache `fn`'s result per arguments like lru_cache(maxsize=None), but build each
+    value in one thread only: concurrent callers wait for it instead of loading it again.
+    """
+    cache = {}
+    locks = {}
+    guard = threading.Lock()
+
+    @functools.wraps(fn)
+    def loader(*args, **kwargs):
+        key = (args, tuple(sorted(kwargs.items())))
+        try:
+            return cache[key]
+        except KeyError:
+            pass
+        with guard:
+            lock = locks.setdefault(key, threading.Lock())
+        with lock:
+            if key not in cache:
+                cache[key] = fn(*args, **kwargs)
+            return cache[key]
+
+    loader.is_loaded = lambda: bool(cache)
+    return loader
+
+
+# -------------------------
+# Warmup
+# -------------------------
+_steps = []
+_state = {
+    "started_at": None,
+    "finished_at": None,
+    "steps": {},
+    "errors": {},
+    "first_request_seconds": None,
+}
+_ready = threading.Event()
+_lock = threading.Lock()
+
+
+def on_warmup(fn):
+    """Register `fn` as a warmup step. Steps run in registration order."""
+    _steps.append(fn)
+    return fn
+
+
+def _run_warmup():
+    for step in _steps:
+        name = step.__name__
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception:
+            _state["errors"][name] = traceback.format_exc(limit=3)
+            logger.exception("Warmup step %s failed", name)
+        _state["steps"][name] = round(time.perf_counter() - start, 3)
+    _state["finished_at"] = time.time()
+    _ready.set()
+    logger.info("Warmup finished in %.2fs", _state["finished_at"] - _state["started_at"])
+
+
+def start_warmup():
+    """Run the registered warmup steps in a daemon thread (idempotent)."""
+    with _lock:
+        if _state["started_at"] is not None:
+            return
+        _state["started_at"] = time.time()
+    threading.Thread(target=_run_warmup, name="warmup", daemon=True).start()
+
+
+def wait_ready(timeout=None):
+    return _ready.wait(timeout)
+
+
+def is_ready():
+    return _ready.is_set()
+
+
+def record_request(seconds):
+    """Remember how long the first request after start took."""
+    if _state["first_request_seconds"] is None:
+        _state["first_request_seconds"] = round(seconds, 3)
+
+
+def readiness():
+    started, finished = _state["started_at"], _state["finished_at"]
+    return {
+        "ready": is_ready(),
+        "uptime_seconds": round(time.time() - PROCESS_START, 3),
+        "cold_start_seconds": round(finished - PROCESS_START, 3) if finished else None,
+        "warmup_seconds": round(finished - started, 3) if finished else None,
+        "steps": dict(_state["steps"]),
+        "errors": dict(_state["errors"]),
+        "first_request_seconds": _state["first_request_seconds"],
+    }
@@ -0,0 +1,183 @@
+"""
+Lightweight per-stage latency tracing.
+
+`span("stage")` times a block. Durations always feed a Prometheus-style histogram
+per stage (cheap: one perf_counter pair and a bucket increment). A sampled
+fraction of requests (TRACE_SAMPLE_RATE) also keeps the individual spans so they
+can be returned as a Server-Timing header or a JSON trace.
+"""
+import contextvars
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", "0.05"))
+
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets=STAGE_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += seconds
+
+
+class Registry:
+    def __init__(self):
+        self.histograms = {}
+        self._lock = threading.Lock()
+        self._collectors = []
+
+    def observe(self, name, seconds):
+        with self._lock:
+            hist = self.histograms.get(name)
+            if hist is None:
+                hist = self.histograms[name] = Histogram()
+            hist.observe(seconds)
+
+    def add_collector(self, fn):
+        """
+        Register `fn() -> list[str]` returning extra exposition lines for /metrics.
+        Build them with `metric_family` / `histogram_family` so each family is contiguous.
+        """
+        self._collectors.append(fn)
+        return fn
+
+    def render(self, metric="ai_teacher_stage_seconds"):
+        """Prometheus text exposition format."""
+        with self._lock:
+            lines = histogram_family(metric, "Time spent per request stage.", [
+                ({"stage": name}, hist.buckets, hist.counts, hist.sum, hist.count)
+                for name, hist in sorted(self.histograms.items())
+            ])
+        for collector in self._collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+
+# -------------------------
+# Exposition helpers
+# -------------------------
+def _label_text(labels):
+    return ",".join(f'{key}="{value}"' for key, value in (labels or {}).items())
+
+
+def metric_family(name, kind, help_text, samples):
+    """One metric family: HELP and TYPE lines followed by all of its (labels, value) samples."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        text = _label_text(labels)
+        lines.append(f"{name}{{{text}}} {value}" if text else f"{name} {value}")
+    return lines
+
+
+def histogram_family(name, help_text, samples):
+    """One histogram family from (labels, bucket bounds, per-bucket counts, sum, count) samples."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for labels, bounds, counts, total, count in samples:
+        text = _label_text(labels)
+        prefix = text + "," if text else ""
+        cumulative = 0
+        for bound, n in zip(bounds, counts):
+            cumulative += n
+            lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {count}')
+        suffix = f"{{{text}}}" if text else ""
+        lines.append(f"{name}_sum{suffix} {total:.6f}")
+        lines.append(f"{name}_count{suffix} {count}")
+    return lines
+
+
+registry = Registry()
+
+
+class Trace:
+    """Spans recorded for one sampled request."""
+
+    def __init__(self, name):
+        self.name = name
+        self.start = time.perf_counter()
+        self.spans = []
+
+    def add(self, stage, start, duration):
+        self.spans.append((stage, start - self.start, duration))
+
+    def total(self):
+        return time.perf_counter() - self.start
+
+    def server_timing(self):
+        """Value for the Server-Timing response header (durations in ms)."""
+        totals = {}
+        for stage, _, duration in self.spans:
+            totals[stage] = totals.get(stage, 0.0) + duration
+        parts = [f"{stage.replace('.', '_')};dur={ms * 1000:.1f}" for stage, ms in totals.items()]
+        parts.append(f"total;dur={self.total() * 1000:.1f}")
+        return ", ".join(parts)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "total_ms": round(self.total() * 1000, 2),
+            "spans": [
+                {"stage": stage, "offset_ms": round(offset * 1000, 2), "duration_ms": round(duration * 1000, 2)}
+                for stage, offset, duration in self.spans
+            ],
+        }
+
+
+def start_trace(name, force=False):
+    """Begin a request trace; returns the Trace if sampled, else None."""
+    trace = Trace(name) if force or random.random() < TRACE_SAMPLE_RATE else None
+    _current_trace.set(trace)
+    return trace
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def span(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        registry.observe(stage, duration)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(stage, start, duration)
+
+
+def traced(stage):
+    """Decorator form of `span` for plain functions."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def observe(stage, seconds):
+    """Record a duration measured elsewhere (e.g. time to first streamed chunk)."""
+    registry.observe(stage, seconds)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(stage, time.perf_counter() - seconds, seconds)
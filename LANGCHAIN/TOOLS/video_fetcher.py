@@ -1,12 +1,17 @@
 # backend/tools/video_fetcher.py
-import yt_dlp
+from .startup import lazy_import
+from .tracing import traced
 
-def fetch_animated_videos(topic, num_videos=1):
+yt_dlp = lazy_import("yt_dlp")
+
+@traced("media.video")
+def fetch_animated_videos(topic, num_videos=1, socket_timeout=10):
     search_query = f"ytsearch{num_videos}:{topic} animation explained in english"
     ydl_opts = {
         "quiet": True,
         "extract_flat": True,
-        "force_generic_extractor": True
+        "force_generic_extractor": True,
+        "socket_timeout": socket_timeout
     }
 
     with yt_dlp.YoutubeDL(ydl_opts) as ydl:
@@ -0,0 +1,238 @@
+"""
+Background video lookup for live lessons.
+
+A yt_dlp search takes seconds, so running `fetch_animated_videos` inline while
+building a lesson prompt stalls the event loop and every socket on it. Instead:
+
+* searches run in a small process pool (VIDEO_WORKERS), off the event loop and
+  outside the GIL;
+* concurrent lookups for the same topic share one search;
+* results (including "no video") are cached, so a topic is searched once per
+  VIDEO_CACHE_TTL (VIDEO_NEGATIVE_TTL for misses and errors);
+* callers wait at most VIDEO_DEADLINE seconds and get None after that; the
+  search keeps running and its result is cached for the next request;
+* each search gives up after VIDEO_SEARCH_TIMEOUT seconds (counted from when it
+  was queued) inside the worker, so slow searches free their process instead of
+  piling up in the pool, and callers are never attached to a search past that point.
+
+`peek()` never waits: prompt building uses it to embed a video that is already
+known, and the lesson stream pushes a <<video:ID>> frame once `lookup()` resolves.
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from .tracing import metric_family, registry
+
+VIDEO_WORKERS = int(os.environ.get("VIDEO_WORKERS", "2"))
+VIDEO_DEADLINE = float(os.environ.get("VIDEO_DEADLINE", "6"))
+VIDEO_SEARCH_TIMEOUT = float(os.environ.get("VIDEO_SEARCH_TIMEOUT", "20"))
+VIDEO_CACHE_SIZE = int(os.environ.get("VIDEO_CACHE_SIZE", "1024"))
+VIDEO_CACHE_TTL = float(os.environ.get("VIDEO_CACHE_TTL", str(24 * 3600)))
+VIDEO_NEGATIVE_TTL = float(os.environ.get("VIDEO_NEGATIVE_TTL", "600"))
+
+
+def _search(topic, expires):
+    """
+    Runs in a pool process until `expires` (wall clock) at the latest; errors and
+    timeouts become "no video" instead of failing the lesson.
+    """
+    from .video_fetcher import fetch_animated_videos
+    remaining = expires - time.time()
+    if remaining <= 0:
+        return None  # waited in the queue past its deadline
+    result = {}
+
+    def run():
+        try:
+            result["video"] = fetch_animated_videos(topic, socket_timeout=remaining)
+        except Exception as e:
+            print(f"❌ Video search failed for {topic!r}: {e}")
+
+    # yt_dlp has no overall timeout; the search thread is abandoned (and ended by its
+    # socket timeout) so this worker can take the next search
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(remaining)
+    if thread.is_alive():
+        print(f"⏱️ Video search for {topic!r} gave up after {remaining:.1f}s")
+    return result.get("video")
+
+
+def _warm():
+    from .video_fetcher import yt_dlp
+    yt_dlp.YoutubeDL  # import yt_dlp in the worker ahead of the first lesson
+    return os.getpid()
+
+
+def normalize_topic(topic):
+    return " ".join((topic or "").lower().split())
+
+
+class VideoWorker:
+    def __init__(self, workers=VIDEO_WORKERS, deadline=VIDEO_DEADLINE, cache_size=VIDEO_CACHE_SIZE,
+                 ttl=VIDEO_CACHE_TTL, negative_ttl=VIDEO_NEGATIVE_TTL, search_timeout=VIDEO_SEARCH_TIMEOUT):
+        self.workers = workers
+        self.deadline = deadline
+        self.search_timeout = search_timeout
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._pool = None
+        self._cache = OrderedDict()  # topic -> (video or None, expires)
+        self._inflight = {}          # topic -> (concurrent.futures.Future, expires)
+        self._lock = threading.Lock()
+        self.counts = {"lookups": 0, "cache_hits": 0, "coalesced": 0, "searches": 0, "timeouts": 0, "errors": 0}
+        self.search_seconds = 0.0
+
+    @property
+    def pool(self):
+        with self._lock:
+            if self._pool is None:
+                # spawn: forking a process that already runs the event loop and model threads is unsafe
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._pool
+
+    def _discard_pool(self, pool):
+        """Drop a pool whose worker died so the next lookup starts a fresh one."""
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _cached(self, key):
+        """(True, video) if `key` has a live cache entry, else (False, None). Caller holds the lock."""
+        entry = self._cache.get(key)
+        if entry is None:
+            return False, None
+        video, expires = entry
+        if expires < time.time():
+            del self._cache[key]
+            return False, None
+        self._cache.move_to_end(key)
+        return True, video
+
+    def _store(self, key, video):
+        with self._lock:
+            self._inflight.pop(key, None)
+            self._cache[key] = (video, time.time() + (self.ttl if video else self.negative_ttl))
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _submit(self, topic):
+        """Cached result, or the shared in-flight search for `topic` (started if needed)."""
+        key = normalize_topic(topic)
+        pool = self.pool
+        with self._lock:
+            self.counts["lookups"] += 1
+            found, video = self._cached(key)
+            if found:
+                self.counts["cache_hits"] += 1
+                return True, video
+            if key in self._inflight:
+                future, expires = self._inflight[key]
+                if expires < time.time():
+                    # The worker gives that search up (no video) any moment now: nothing to wait for
+                    self.counts["timeouts"] += 1
+                    return True, None
+                self.counts["coalesced"] += 1
+                return False, future
+            try:
+                expires = time.time() + self.search_timeout
+                future = pool.submit(_search, topic, expires)
+                self._inflight[key] = (future, expires)
+            except (BrokenProcessPool, RuntimeError) as e:
+                # Lessons go on without a video; the pool is replaced for the next lookup
+                print(f"❌ Video worker pool unavailable: {e}")
+                self.counts["errors"] += 1
+                broken = True
+            else:
+                self.counts["searches"] += 1
+                broken = False
+        if broken:
+            self._discard_pool(pool)
+            return True, None
+        start = time.perf_counter()
+
+        def done(f):
+            elapsed = time.perf_counter() - start
+            registry.observe("media.video.search", elapsed)
+            error = None if f.cancelled() else f.exception()
+            with self._lock:
+                self.search_seconds += elapsed
+                if error is not None:
+                    self.counts["errors"] += 1
+            if isinstance(error, BrokenProcessPool):
+                self._discard_pool(pool)
+            self._store(key, None if f.cancelled() or error else f.result())
+
+        future.add_done_callback(done)
+        return False, future
+
+    def peek(self, topic):
+        """Known video (or None) without waiting; starts a background search on a miss."""
+        found, result = self._submit(topic)
+        if found:
+            return result
+        return result.result() if result.done() and not result.exception() else None
+
+    async def lookup(self, topic, deadline=None):
+        """The video for `topic`, or None if there is none or it is not found within the deadline."""
+        found, result = self._submit(topic)
+        if found:
+            return result
+        try:
+            return await asyncio.wait_for(
+                asyncio.shield(asyncio.wrap_future(result)), self.deadline if deadline is None else deadline
+            )
+        except asyncio.TimeoutError:
+            with self._lock:
+                self.counts["timeouts"] += 1
+            return None
+        except Exception:
+            return None
+
+    def warmup(self):
+        """Start the worker processes and import yt_dlp in them."""
+        for future in [self.pool.submit(_warm) for _ in range(self.workers)]:
+            future.result()
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.counts["lookups"]
+            return {
+                **self.counts,
+                "inflight": len(self._inflight),
+                "cached_topics": len(self._cache),
+                "hit_rate": round(self.counts["cache_hits"] / lookups, 4) if lookups else None,
+                "search_seconds": round(self.search_seconds, 3),
+                "deadline": self.deadline,
+            }
+
+
+video_worker = VideoWorker()
+
+
+@registry.add_collector
+def _video_metrics():
+    stats = video_worker.stats()
+    return (
+        metric_family("ai_teacher_video_lookups_total", "counter", "Video lookups by outcome.", [
+            ({"result": name}, stats[name]) for name in ("cache_hits", "coalesced", "searches", "timeouts", "errors")
+        ])
+        + metric_family("ai_teacher_video_inflight", "gauge", "Video searches in progress.",
+                        [(None, stats["inflight"])])
+    )
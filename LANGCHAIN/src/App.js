@@ -2,6 +2,16 @@ import React, { useState, useEffect } from 'react';
 import LessonStream from './LessonStream';
 import ChatWindow from './ChatWindow';
 
+// Stable per-browser id so the server can track completed subtopics
+const getSessionId = () => {
+  let id = localStorage.getItem('lessonSession');
+  if (!id) {
+    id = crypto.randomUUID();
+    localStorage.setItem('lessonSession', id);
+  }
+  return id;
+};
+
 function App() {
   const [topicInput, setTopicInput] = useState("");
   const [subtopic, setSubtopic] = useState("");
@@ -9,10 +19,9 @@ function App() {
   const [questionMode, setQuestionMode] = useState(false);
   const [resumeFlag, setResumeFlag] = useState(false);
   const [chatHistory, setChatHistory] = useState([]);
+  const [sessionId] = useState(getSessionId);
 
-  const handleStartLesson = () => {
-    const t = topicInput.trim();
-    if (!t) return;
+  const startTopic = (t) => {
     setSubtopic(t);
     setLessonStarted(true);
     setQuestionMode(false);
@@ -20,6 +29,12 @@ function App() {
     setChatHistory([]);
   };
 
+  const handleStartLesson = () => {
+    const t = topicInput.trim();
+    if (!t) return;
+    startTopic(t);
+  };
+
   const handleAskQuestion = () => setQuestionMode(true);
 
   const handleChatSend = async (message) => {
@@ -82,8 +97,10 @@ function App() {
         <> 
           <LessonStream
             subtopic={subtopic}
+            sessionId={sessionId}
             onAskQuestion={handleAskQuestion}
             resumeFlag={resumeFlag}
+            onStartTopic={startTopic}
           />
 
           {questionMode && (
@@ -2,9 +2,10 @@ import React, { useEffect, useState, useRef, useCallback } from 'react';
 
 const DISPLAY_DELAY_MS = 2000;
 
-const LessonStream = ({ subtopic, onAskQuestion, resumeFlag, onResumeComplete }) => {
+const LessonStream = ({ subtopic, sessionId, onAskQuestion, resumeFlag, onResumeComplete, onStartTopic }) => {
     const [elements, setElements] = useState([]);
     const [isFinished, setIsFinished] = useState(false);
+    const [nextTopic, setNextTopic] = useState('');
 
     const socketRef     = useRef(null);
     const queueRef      = useRef([]);
@@ -14,6 +15,7 @@ const LessonStream = ({ subtopic, onAskQuestion, resumeFlag, onResumeComplete })
     const lastHaltRef    = useRef('');
     const seenImagesRef  = useRef(new Set());
     const seenVideosRef  = useRef(new Set());
+    const imageVersionsRef = useRef({});
     const seenWarningRef = useRef(false);
 
     const parseSentence = useCallback(sentence => {
@@ -33,10 +35,16 @@ const LessonStream = ({ subtopic, onAskQuestion, resumeFlag, onResumeComplete })
                 const name = img[1];
                 if (seenImagesRef.current.has(name)) return [];
                 seenImagesRef.current.add(name);
+                // ?v= (sent by the server in the [[IMAGES]] frame) makes the URL cacheable for a year
+                const version = imageVersionsRef.current[name];
+                const imageUrl = w => `http://localhost:8000/images/${name}?w=${w}${version ? `&v=${version}` : ''}`;
                 return [
                     <div key={`img-${name}`} style={{ textAlign:'center', margin:'1em 0' }}>
                         <img
-                            src={`http://localhost:8000/images/${name}`}
+                            src={imageUrl(640)}
+                            srcSet={[320, 640, 1024].map(w => `${imageUrl(w)} ${w}w`).join(', ')}
+                            sizes="(max-width: 700px) 100vw, 640px"
+                            loading="lazy"
                             alt={name}
                             style={{ maxWidth:'100%', border:'1px solid #ccc', borderRadius:'4px' }}
                         />
@@ -91,6 +99,7 @@ const LessonStream = ({ subtopic, onAskQuestion, resumeFlag, onResumeComplete })
             seenWarningRef.current = false;
             setElements([]);
             setIsFinished(false);
+            setNextTopic('');
             queueRef.current = [];
             displayingRef.current = false;
             lastHaltRef.current = '';
@@ -101,9 +110,10 @@ const LessonStream = ({ subtopic, onAskQuestion, resumeFlag, onResumeComplete })
 
         socket.onopen = () => {
             const payload = initial
-                ? { subtopic }
+                ? { subtopic, session: sessionId }
                 : {
                     subtopic,
+                    session: sessionId,
                     resumeFrom: lastHaltRef.current || '(resume point unknown)',
                 };
             console.log('[LessonStream] socket.onopen — initial?', initial, 'payload=', payload);
@@ -118,6 +128,16 @@ const LessonStream = ({ subtopic, onAskQuestion, resumeFlag, onResumeComplete })
                 socket.close();
                 return;
             }
+            // Next section in textbook order; the server is already preparing it
+            if (data.startsWith('[[NEXT]]')) {
+                setNextTopic(data.slice('[[NEXT]]'.length));
+                return;
+            }
+            // Current versions of the lesson's figures, for cacheable image URLs
+            if (data.startsWith('[[IMAGES]]')) {
+                Object.assign(imageVersionsRef.current, JSON.parse(data.slice('[[IMAGES]]'.length)));
+                return;
+            }
             if (pausedRef.current) return;
 
             data
@@ -131,7 +151,7 @@ const LessonStream = ({ subtopic, onAskQuestion, resumeFlag, onResumeComplete })
 
         socket.onerror = err => console.error('WebSocket error', err);
         socket.onclose = () => { socketRef.current = null; };
-    }, [subtopic, displayNext, onResumeComplete]);
+    }, [subtopic, sessionId, displayNext, onResumeComplete]);
 
     useEffect(() => {
         startSocket(true);
@@ -175,6 +195,11 @@ const LessonStream = ({ subtopic, onAskQuestion, resumeFlag, onResumeComplete })
                 }}>
                     <h2>🎉 Lesson Complete!</h2>
                     <p>Key takeaways above!</p>
+                    {nextTopic && onStartTopic && (
+                        <button onClick={() => onStartTopic(nextTopic)}>
+                            Next: {nextTopic} →
+                        </button>
+                    )}
                 </div>
             )}
         </div>
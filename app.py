@@ -1,19 +1,30 @@
-from flask import Flask, request, render_template
+from flask import Flask, request, render_template, jsonify, send_file, abort
 from markupsafe import Markup
 import os
 import re
-import json
-import faiss
-import numpy as np
-import torch
-import requests
 import random
-import yt_dlp
-from sentence_transformers import SentenceTransformer, util
-from IPython.display import display as ipython_display, HTML as ipython_HTML, Image as ipython_Image
+import time
+from collections import deque
+from LANGCHAIN.TOOLS import llm_router, prompt_builder
+from LANGCHAIN.TOOLS.admission import INTERACTIVE, Overloaded, admission, rate_limiter
+from LANGCHAIN.TOOLS.embedding_cache import embedding_cache, uncached
+from LANGCHAIN.TOOLS.encoders import get_encoder
+from LANGCHAIN.TOOLS.image_delivery import not_modified, response_headers
+from LANGCHAIN.TOOLS.prompt_builder import PromptTemplate
+from LANGCHAIN.TOOLS.reranker import RERANK_CANDIDATES, RERANK_ENABLED, RERANK_TOP_K, get_reranker
+from LANGCHAIN.TOOLS.shards import DEFAULT_BOOK, Book, ShardManager, load_catalog, register
+from LANGCHAIN.TOOLS.tracing import registry, span, start_trace, traced
+from LANGCHAIN.TOOLS.startup import lazy_import, load_once, on_warmup, start_warmup, wait_ready, readiness, record_request
+
+# Heavy dependencies are imported on first use so the server can bind quickly
+yt_dlp = lazy_import("yt_dlp")
+st_util = lazy_import("sentence_transformers.util")
 
 app = Flask(__name__)
 
+# Most recent sampled request traces, served at /traces
+recent_traces = deque(maxlen=100)
+
 # -------------------------
 # General Debugging Utility
 # -------------------------
@@ -33,88 +44,122 @@ METADATA_JSON = "metadata.json"
 FAISS_TEXT_INDEX = "textbook_faiss.index"
 FAISS_FIGURES_INDEX = "subchapter_faiss.index"
 METADATA_FIGURES_JSON = "subchapter_metadata.json"
+FIGURE_INDEX = "figure_faiss.index"  # one vector per figure, built from FIGURES_JSON on first use
+FIGURE_INDEX_METADATA = "figure_metadata.json"
+CORPUS_STORE = "corpus.bin"  # memory-mapped copy of the JSON files above, rebuilt when they change
+# Multi-textbook catalog (see LANGCHAIN/TOOLS/shards.py); without it the files above are the only book
+CATALOG_JSON = "catalog.json"
 
-# Data for textual content
-with open(KNOWLEDGEBASE_JSON, "r", encoding="utf-8") as f:
-    kb_data = json.load(f)
-with open(METADATA_JSON, "r", encoding="utf-8") as f:
-    metadata = json.load(f)
+# Resized variants are built offline: python -m LANGCHAIN.TOOLS.image_delivery <book>/images
 
 # Normalize function for matching
 def normalize_title(title):
     return title.strip().lower()
 
-# Create normalized KB lookup
-normalized_kb = {}
-for chapter, topics in kb_data.items():
-    for title, content in topics.items():
-        norm_key = (chapter, normalize_title(title))
-        normalized_kb[norm_key] = content
+# Data, model and indexes are loaded on first use (or by the background warmup)
+@load_once
+def get_shards():
+    """Textbook shards, loaded on demand and evicted LRU under SHARD_MEMORY_BUDGET_MB."""
+    default = Book(DEFAULT_BOOK, root=".", files={
+        "knowledge": KNOWLEDGEBASE_JSON, "metadata": METADATA_JSON, "text_index": FAISS_TEXT_INDEX,
+        "figures": FIGURES_JSON, "figure_rows": METADATA_FIGURES_JSON, "figure_rows_index": FAISS_FIGURES_INDEX,
+        "figure_index": FIGURE_INDEX, "figure_metadata": FIGURE_INDEX_METADATA,
+        "corpus": CORPUS_STORE, "images": IMAGE_DIR,
+    })
+    return register(ShardManager(load_catalog(CATALOG_JSON, default), get_model))
+
+def get_corpus(book=None):
+    """Sections (ids == text index rows), figures and figure-index rows of `book` (default book if None)."""
+    return get_shards().get(book).corpus
 
-# Initialize embedding model
-model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-model.to(device)
+@load_once
+def get_model():
+    """Embedding model shared by text and figure search (torch or ONNX, see ENCODER_BACKEND)."""
+    return get_encoder("sentence-transformers/all-MiniLM-L6-v2")
 
-# Load FAISS index
-index = faiss.read_index(FAISS_TEXT_INDEX)
+def get_figure_index(book=None):
+    return get_shards().get(book).figure_index
 
 
-def search(query, top_k=5, similarity_threshold=0.98, mode="hybrid"):
+def search(query, top_k=None, similarity_threshold=0.98, mode="hybrid", rerank=None, books=None):
+    """
+    With `rerank` (default: RERANK env), semantic matches are taken from
+    RERANK_CANDIDATES FAISS hits and reordered by the cross-encoder, keeping
+    top_k (default RERANK_TOP_K, else 5); "score" is then the reranker score.
+    `books` limits the search to those textbook ids (default: the default book);
+    several books are searched in parallel and merged. Results carry their "book".
+    """
+    rerank = RERANK_ENABLED if rerank is None else rerank
+    if top_k is None:
+        top_k = RERANK_TOP_K if rerank else 5
+    fetch_k = max(top_k, RERANK_CANDIDATES) if rerank else top_k
     norm_query = normalize_title(query)
+    shards = get_shards()
+    books = books or [shards.catalog.default]
     results = []
     seen_embeddings = []
     seen_titles = set()
 
     def get_exact_matches():
-        for item in metadata:
-            title = item["title"]
-            chapter = item["chapter"]
-            norm_title = normalize_title(title)
-            if norm_query in norm_title:
-                norm_key = (chapter, norm_title)
-                content = normalized_kb.get(norm_key)
-                if content:
-                    seen_titles.add(norm_key)
-                    return [{
-                        "title_key": title,
-                        "chapter": chapter,
-                        "score": 0.0,
-                        "content": content
-                    }]
+        # Titles come from each book's metadata, so only a book with a matching title is loaded
+        for book in books:
+            for section_id, (chapter, title) in enumerate(shards.catalog[book].titles()):
+                norm_title = normalize_title(title)
+                if norm_query in norm_title:
+                    content = shards.get(book).corpus.text(section_id)
+                    if content:
+                        seen_titles.add((book, chapter, norm_title))
+                        return [{
+                            "book": book,
+                            "title_key": title,
+                            "chapter": chapter,
+                            "score": 0.0,
+                            "content": content
+                        }]
         return []
 
     def get_semantic_matches():
-        query_embedding = model.encode([query], convert_to_numpy=True)
-        distances, indices = index.search(query_embedding, top_k)
+        model = get_model()
+        with span("retrieval.encode"):
+            query_embedding = model.encode([query], convert_to_numpy=True)
+        with span("retrieval.faiss"):
+            hits = shards.search(query_embedding, fetch_k, books)
         semantic_results = []
 
-        for i in range(len(indices[0])):
-            idx = indices[0][i]
-            raw_title = metadata[idx]["title"]
-            chapter = metadata[idx]["chapter"]
-            norm_key = (chapter, normalize_title(raw_title))
-            content = normalized_kb.get(norm_key)
-
-            if content and norm_key not in seen_titles:
-                content_embedding = model.encode(content, convert_to_tensor=True)
-
-                # Check for semantic duplication
-                is_duplicate = False
-                for prev_emb in seen_embeddings:
-                    if util.cos_sim(content_embedding, prev_emb).item() >= similarity_threshold:
-                        is_duplicate = True
-                        break
-
-                if not is_duplicate:
-                    seen_embeddings.append(content_embedding)
-                    seen_titles.add(norm_key)
-                    semantic_results.append({
-                        "title_key": raw_title,
-                        "chapter": chapter,
-                        "score": distances[0][i],
-                        "content": content
-                    })
+        with span("retrieval.dedup"):
+            for distance, shard, idx in hits:
+                corpus = shard.corpus
+                raw_title = corpus.title(idx)
+                chapter = corpus.chapter(idx)
+                norm_key = (shard.book.id, chapter, normalize_title(raw_title))
+                content = corpus.text(idx)
+
+                if content and norm_key not in seen_titles:
+                    # Section bodies bypass the query embedding cache
+                    content_embedding = uncached(model).encode(content, convert_to_tensor=True)
+
+                    # Check for semantic duplication
+                    is_duplicate = False
+                    for prev_emb in seen_embeddings:
+                        if st_util.cos_sim(content_embedding, prev_emb).item() >= similarity_threshold:
+                            is_duplicate = True
+                            break
+
+                    if not is_duplicate:
+                        seen_embeddings.append(content_embedding)
+                        seen_titles.add(norm_key)
+                        semantic_results.append({
+                            "book": shard.book.id,
+                            "title_key": raw_title,
+                            "chapter": chapter,
+                            "score": distance,
+                            "content": content
+                        })
+        if rerank:
+            ranked = get_reranker().rerank(query, semantic_results, top_k, text=lambda r: r["content"])
+            semantic_results = [
+                {**result, "retrieval_score": result["score"], "score": score} for score, result in ranked
+            ]
         return semantic_results
 
     # MODE HANDLING
@@ -130,31 +175,24 @@ def search(query, top_k=5, similarity_threshold=0.98, mode="hybrid"):
     return results
 
 # Image Fetching Code (as is, with adjustments for Flask)
-# Data & FAISS index for figure retrieval
-def load_figures():
-    with open(FIGURES_JSON, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-figures_data = load_figures()
+# FAISS index for figure retrieval; its row → subchapter mapping is in the corpus store
+def get_index_figures(book=None):
+    # Kept on the shard, so it is counted against the memory budget and freed on eviction
+    return get_shards().get(book).figure_rows_index
 
-index_figures = faiss.read_index(FAISS_FIGURES_INDEX)
-
-# Load metadata mapping (Index → Subchapter)
-with open(METADATA_FIGURES_JSON, "r", encoding="utf-8") as f:
-    metadata_figures = json.load(f)
-
-def search_exact_subchapter(query, top_k=1):
-    """Find the most relevant subchapter using FAISS."""
+def search_exact_subchapter(query, top_k=1, book=None):
+    """Find the most relevant subchapter of `book` (default book if None) using FAISS."""
     debug_print(f"Searching for exact subchapter match: {query}")
-    query_embedding = image_model.encode([query], convert_to_numpy=True).astype('float32')
-    _, indices = index_figures.search(query_embedding.reshape(1, -1), top_k)
+    with span("figures.encode"):
+        query_embedding = get_model().encode([query], convert_to_numpy=True).astype('float32')
+    with span("figures.faiss"):
+        _, indices = get_index_figures(book).search(query_embedding.reshape(1, -1), top_k)
     # Pick only the closest match
-    best_match_index = str(indices[0][0])
-    best_subchapter = metadata_figures.get(best_match_index, None)
+    best_subchapter = get_corpus(book).figure_row_subchapter(int(indices[0][0]))
     debug_print(f"Best match subchapter: {best_subchapter}", 2)
     return best_subchapter
 
-def get_image_path(figure_ref):
+def get_image_path(figure_ref, image_dir=IMAGE_DIR):
     """Find image path with multiple fallback patterns."""
     debug_print(f"Locating image for: {figure_ref}", 2)
     base_name = figure_ref.replace(" ", "_")
@@ -164,23 +202,25 @@ def get_image_path(figure_ref):
         f"figure_{base_name}.png"
     ]
     for attempt in attempts:
-        test_path = os.path.join(IMAGE_DIR, attempt)
+        test_path = os.path.join(image_dir, attempt)
         if os.path.exists(test_path):
             debug_print(f"✅ Found image at: {test_path}", 3)
-            return os.path.join(IMAGE_DIR, attempt) # Return the full path for Flask
+            return os.path.join(image_dir, attempt) # Return the full path for Flask
     debug_print(" No valid image path found", 3)
     return None
 
-def fetch_figures_only(subchapter_name): # Changed parameter name to be more explicit
-    """Retrieve only figures (images + raw descriptions) for a given subchapter."""
+def fetch_figures_only(subchapter_name, book=None): # Changed parameter name to be more explicit
+    """Retrieve only figures (images + raw descriptions) for a given subchapter of `book`."""
     debug_print(f"Retrieving figures for subchapter: {subchapter_name}")
-    figures = [fig for fig in figures_data if fig["subchapter"] == subchapter_name]
+    shards = get_shards()
+    image_dir = shards.catalog[book or shards.catalog.default].path("images")
+    figures = get_corpus(book).figures_for_subchapter(subchapter_name)
     if not figures:
         debug_print(f"No relevant figures found for subchapter: {subchapter_name}")
         return "No relevant figures found."
     figure_blocks = []
     for fig in figures:
-        fig_path = get_image_path(fig['figure'])
+        fig_path = get_image_path(fig['figure'], image_dir)
         if fig_path:
             figure_blocks.append({
                 "name": fig['figure'],
@@ -190,29 +230,34 @@ def fetch_figures_only(subchapter_name): # Changed parameter name to be more exp
     return figure_blocks
 
 # Revised Figure Retrieval for Lesson Multimedia Integration 
-def retrieve_and_expand_figures(query):
+@traced("media.figures")
+def retrieve_and_expand_figures(query, book=None):
     """
     Retrieve figures related to the query and generate HTML to display them.
     """
-    search_results = search(query, mode="hybrid", top_k=1)
-    if not search_results:
-        return "<p>No relevant text found for image retrieval.</p>"
-
-    best_text_match = search_results[0]
-    subchapter_name = best_text_match["title_key"] # Use the title_key as the subchapter name
-
-    blocks = fetch_figures_only(subchapter_name)
-    if isinstance(blocks, str):
-        # An error message was returned
-        return f"<p>{blocks}</p>"
+    shards = get_shards()
+    book = book or shards.catalog.default
+    image_dir = shards.catalog[book].path("images")
+    image_store, url_prefix = shards.image_store(book), shards.image_prefix(book)
+    blocks = []
+    has_image = lambda fig: get_image_path(fig["figure"], image_dir) is not None
+    for fig in get_figure_index(book).search(query, k=3, keep=has_image):
+        fig_path = get_image_path(fig["figure"], image_dir)
+        if fig_path:
+            blocks.append({"name": fig["figure"], "path": fig_path, "desc": fig["description"]})
+    if not blocks:
+        return "<p>No relevant figures found.</p>"
 
     figure_html = "<div style='margin-top: 20px;'><h3>📊 Visual Aids</h3>"
     # Limit to 3 figures
     for fig in blocks[:3]:
         clean_desc = fig['desc']  # Optionally, you can process the description further
+        image_name = os.path.basename(fig['path'])
+        srcset = image_store.srcset(image_name, url_prefix)
+        responsive = f"srcset='{srcset}' sizes='(max-width: 800px) 100vw, 800px'" if srcset else ""
         figure_html += f"""
         <div style='margin-bottom: 20px; border: 1px solid #ddd; padding: 10px; border-radius: 5px;'>
-            <img src='/{fig['path']}' style='max-width: 100%; height: auto; display: block; margin: 0 auto;'>
+            <img src='{image_store.url(image_name, url_prefix)}' {responsive} loading='lazy' style='max-width: 100%; height: auto; display: block; margin: 0 auto;'>
             <p style='text-align: center; font-style: italic;'>{clean_desc or 'Visual demonstration'}</p>
         </div>
         """
@@ -220,6 +265,7 @@ def retrieve_and_expand_figures(query):
     return figure_html
 
 # Functions for Video & Lesson Generation (Adjusted for Flask)
+@traced("media.video")
 def fetch_animated_videos(topic, num_videos=1):
     search_query = f"ytsearch{num_videos}:{topic} animation explained in english"
     print(f"Searching for: {search_query}")
@@ -250,8 +296,6 @@ def fetch_animated_videos(topic, num_videos=1):
 
 def generate_topic_hook(topic):
     """Generate a short, engaging hook for the topic using the LLM."""
-    LLM_API_KEY = "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" # Ensure this is secure in a real app
-    LLM_API_URL = "https://api.groq.com/openai/v1/chat/completions"
     prompt = f"""
 You are a science educator. Create a SHORT (1-2 sentences), engaging hook for the topic *{topic}* for 8th-grade students using one of these techniques:
 - A surprising fact/question
@@ -262,45 +306,21 @@ You are a science educator. Create a SHORT (1-2 sentences), engaging hook for th
 Return ONLY the hook.
 """
     try:
-        response = requests.post(
-            LLM_API_URL,
-            headers={"Authorization": f"Bearer {LLM_API_KEY}"},
-            json={
-                "model": "llama3-70b-8192",
-                "messages": [{"role": "user", "content": prompt}],
-                "max_tokens": 1000,
-                "temperature": 0.9
-            }
-        )
-        response.raise_for_status()  # Raise an exception for HTTP errors
-        hook = response.json()["choices"][0]["message"]["content"].strip()
-        return hook
-    except requests.exceptions.RequestException as e:
+        with span("llm.hook"):
+            return llm_router.complete("hook", prompt)
+    except llm_router.LLMError as e:
         print(f"Error generating topic hook: {e}")
         return "Let's explore this exciting topic!" # Fallback
 
 def generate_funny_intro(topic):
     """Generate an introduction that begins with a funny story or meme about the topic."""
-    LLM_API_KEY = "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" # Ensure this is secure
-    LLM_API_URL = "https://api.groq.com/openai/v1/chat/completions"
     prompt = f"""
 You are a creative and humorous science educator. Tell a short, funny story or describe a relatable meme about *{topic}* to engage 8th-grade students. Avoid using video introductions. Return ONLY the story.
 """
     try:
-        response = requests.post(
-            LLM_API_URL,
-            headers={"Authorization": f"Bearer {LLM_API_KEY}"},
-            json={
-                "model": "llama3-70b-8192",
-                "messages": [{"role": "user", "content": prompt}],
-                "max_tokens": 1000,
-                "temperature": 0.9
-            }
-        )
-        response.raise_for_status()
-        funny_intro = response.json()["choices"][0]["message"]["content"].strip()
-        return funny_intro
-    except requests.exceptions.RequestException as e:
+        with span("llm.intro"):
+            return llm_router.complete("intro", prompt)
+    except llm_router.LLMError as e:
         print(f"Error generating funny intro: {e}")
         return f"Get ready for some fun as we dive into {topic}!" # Fallback
 
@@ -315,10 +335,28 @@ def generate_dynamic_intro(topic):
 Quick prediction: What do you think happens when...? Let's find out in our lesson!</p>
 """
 
-def generate_text_lesson(query):
+EXPLANATION_TEMPLATE = PromptTemplate(
+    "explanation",
+    prefix="""
+You are an engaging, fun-loving, and knowledgeable 8th-grade science teacher.
+Your task is to generate a richly detailed, smooth, and engaging explanation of the textbook content below that:
+- Uses every sentence from the textbook content as a base.
+- Expands each idea with real-life analogies, fun facts, surprising trivia, and interesting stories kids can relate to.
+- Breaks down complex terms into simple, visual language.
+- Feels like a passionate teacher telling a story, not reading a script.
+- Uses HTML with <h2>, <h3>, <p>, and <ul><li> where helpful.
+- Ensures smooth transitions between paragraphs.
+""",
+    body="""Topic: '{title}'.
+Textbook Content:
+"{content}"
+""",
+)
+
+def generate_text_lesson(query, books=None):
     """Generate a dynamic lesson using the FAISS-retrieved textbook content."""
     debug_print(f"Searching for relevant text using hybrid search: {query}")
-    search_results = search(query, mode="hybrid", top_k=1) # Adjust top_k as needed
+    search_results = search(query, mode="hybrid", top_k=1, books=books) # Adjust top_k as needed
     if not search_results:
         return "<p>No relevant information found.</p>"
     # Use the top result from the search
@@ -328,44 +366,16 @@ def generate_text_lesson(query):
     # Build the introductory section using a funny story/meme.
     introduction = generate_dynamic_intro(cleaned_title)
     # Enhanced Explanation Generation from Textbook Content via LLM
-    LLM_API_KEY = "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" # Ensure this is secure
-    LLM_API_URL = "https://api.groq.com/openai/v1/chat/completions"
-    prompt = f"""
-You are an engaging, fun-loving, and knowledgeable 8th-grade science teacher.
-Below is the textbook content for the topic titled '{cleaned_title}'.
-Your task is to generate a richly detailed, smooth, and engaging explanation that:
-- Uses every sentence from the textbook content as a base.
-- Expands each idea with real-life analogies, fun facts, surprising trivia, and interesting stories kids can relate to.
-- Breaks down complex terms into simple, visual language.
-- Feels like a passionate teacher telling a story, not reading a script.
-- Uses HTML with <h2>, <h3>, <p>, and <ul><li> where helpful.
-- Ensures smooth transitions between paragraphs.
-Textbook Content:
-"{retrieved_content}"
-"""
+    prompt = EXPLANATION_TEMPLATE.build([(1.0, retrieved_content)], title=cleaned_title)
     debug_print("Sending LLM request with enhanced textbook expansion prompt...", 2)
     try:
-        response = requests.post(
-            LLM_API_URL,
-            headers={"Authorization": f"Bearer {LLM_API_KEY}"},
-            json={
-                "model": "llama3-70b-8192",
-                "messages": [{"role": "user", "content": prompt}],
-                "max_tokens": 4000,
-                "temperature": 0.8
-            }
-        )
-        response.raise_for_status()
-        result = response.json()
-        if "choices" in result:
-            ai_explanation = result["choices"][0]["message"]["content"]
-        else:
-            ai_explanation = f"<p>Error: {result}</p>"
-    except requests.exceptions.RequestException as e:
+        with span("llm.explanation"):
+            ai_explanation = llm_router.complete("explanation", prompt)
+    except llm_router.LLMError as e:
         ai_explanation = f"<p>Error generating explanation: {e}</p>"
 
     # Multimedia Integration: Figures & Video
-    multimedia_html = retrieve_and_expand_figures(query)
+    multimedia_html = retrieve_and_expand_figures(query, best_match["book"])
     video = fetch_animated_videos(cleaned_title)
     if video:
         video_html = f"""
@@ -394,9 +404,9 @@ Textbook Content:
     return text_lesson_html
 
 # Final Integration: AI Teacher Lesson with Multimedia (Adjusted for Flask)
-def generate_ai_teacher_lesson(query):
+def generate_ai_teacher_lesson(query, books=None):
     debug_print("Generating AI Teacher Lesson...")
-    text_lesson_html = generate_text_lesson(query)
+    text_lesson_html = generate_text_lesson(query, books)
     final_html = f"""
     <html>
     <head>
@@ -424,21 +434,104 @@ def generate_ai_teacher_lesson(query):
     """
     return final_html
 
+# Warmup steps run in the background once the socket is bound
+@on_warmup
+def warm_data():
+    get_corpus()
+
+@on_warmup
+def warm_indexes():
+    get_shards().get()
+    get_index_figures()
+
+@on_warmup
+def warm_model():
+    # Section and figure-subchapter titles are the most common queries
+    titles = get_corpus().titles()
+    titles += get_corpus().figure_subchapters()
+    get_model().preload(titles)
+    get_figure_index().load()
+
 # Flask Routes
 @app.route("/", methods=["GET"])
 def index():
     return render_template("index.html")
 
+@app.route("/ready", methods=["GET"])
+def ready():
+    status = readiness()
+    return jsonify(status), (200 if status["ready"] else 503)
+
+@app.route("/stats", methods=["GET"])
+def stats():
+    return jsonify({
+        "admission": admission.stats(),
+        "rate_limits": rate_limiter.stats(),
+        "embedding_cache": embedding_cache.stats(),
+        "llm": llm_router.router.stats(),
+        "prompts": prompt_builder.stats.summary(),
+        "shards": get_shards().stats(),
+    })
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return registry.render(), 200, {"Content-Type": "text/plain; version=0.0.4"}
+
+@app.route("/traces", methods=["GET"])
+def traces():
+    return jsonify(list(recent_traces))
+
 @app.route("/lesson", methods=["POST"])
 def generate_lesson():
+    start = time.perf_counter()
+    # Send "X-Trace: 1" to force a trace for this request
+    trace = start_trace("lesson", force=request.headers.get("X-Trace") == "1")
     query = request.form["query"]
-    lesson_html = generate_ai_teacher_lesson(query)
-    return render_template("lesson.html", lesson=Markup(lesson_html))
-
-@app.route('/<path:filename>')
-def send_image(filename):
-    return send_from_directory('.', filename)
+    # Optional textbook routing: one book, or every book for a grade and/or subject
+    books = get_shards().catalog.route(
+        book=request.form.get("book"), grade=request.form.get("grade"), subject=request.form.get("subject")
+    )
+    if not books:
+        return jsonify({"error": "No textbook matches this book/grade/subject"}), 404
+    try:
+        # One LLM slot per lesson page; shed with 503 + Retry-After when the queue is full
+        with admission.slot(INTERACTIVE), span("lesson.total"):
+            lesson_html = generate_ai_teacher_lesson(query, books)
+    except Overloaded as e:
+        return (
+            jsonify({"error": str(e), "retry_after": e.retry_after}),
+            503,
+            {"Retry-After": str(e.retry_after)},
+        )
+    record_request(time.perf_counter() - start)
+    response = app.make_response(render_template("lesson.html", lesson=Markup(lesson_html)))
+    if trace is not None:
+        response.headers["Server-Timing"] = trace.server_timing()
+        recent_traces.append(trace.to_dict())
+    return response
+
+@app.route("/images/<path:filename>")
+def send_figure(filename):
+    # <book id>/<name> for catalog books, bare names for the default book.
+    # ?w= picks the smallest variant at least that wide; WebP if the browser accepts it
+    image_store, filename = get_shards().resolve_image(filename)
+    found = image_store.select(filename, request.args.get("w", type=int), request.headers.get("Accept", ""))
+    if found is None:
+        abort(404)
+    path, etag, mimetype = found
+    headers = response_headers(etag, versioned=request.args.get("v") == image_store.version(filename))
+    if not_modified(request.headers.get("If-None-Match"), etag):
+        return "", 304, headers
+    response = send_file(path, mimetype=mimetype, etag=False, max_age=None)
+    response.headers.update(headers)
+    return response
 
 if __name__ == "__main__":
-    from flask import send_from_directory
-    app.run(debug=False) # Set debug to False for production
\ No newline at end of file
+    from werkzeug.serving import make_server
+    # Bind the socket first, then load models/indexes in the background.
+    # Set EAGER_STARTUP=1 to finish warming up before serving requests.
+    server = make_server(os.environ.get("HOST", "127.0.0.1"), int(os.environ.get("PORT", "5000")), app, threaded=True)
+    start_warmup()
+    if os.environ.get("EAGER_STARTUP") == "1":
+        wait_ready()
+    server.serve_forever()
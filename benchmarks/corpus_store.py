@@ -0,0 +1,161 @@
+"""
+JSON loaders vs. the memory-mapped corpus store (LANGCHAIN/TOOLS/corpus_store.py).
+
+Each variant runs in a fresh subprocess so resident memory is measured from a
+clean interpreter:
+
+* json:  json.load of knowledgebase/metadata/output/subchapter_metadata plus the
+         normalized (chapter, title) dict, as app.py used to keep in memory
+* store: CorpusStore on a prebuilt corpus.bin
+
+Reported per variant: load time, RSS growth split into private (anonymous)
+memory and file-backed pages (shared between workers for the store), and the
+latency of random section id -> content lookups.
+
+    python benchmarks/corpus_store.py --runs 5 --lookups 20000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SOURCES = {
+    "knowledge_path": os.path.join(ROOT, "knowledgebase.json"),
+    "metadata_path": os.path.join(ROOT, "metadata.json"),
+    "figures_path": os.path.join(ROOT, "output.json"),
+    "figure_rows_path": os.path.join(ROOT, "subchapter_metadata.json"),
+}
+
+
+def memory_kb():
+    """VmRSS / RssAnon / RssFile of this process in kB (Linux)."""
+    values = {}
+    with open("/proc/self/status", "r") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in ("VmRSS", "RssAnon", "RssFile"):
+                values[key] = int(rest.split()[0])
+    return values
+
+
+def load_json():
+    def read(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    knowledge = read(SOURCES["knowledge_path"])
+    metadata = read(SOURCES["metadata_path"])
+    figures = read(SOURCES["figures_path"])
+    figure_rows = read(SOURCES["figure_rows_path"])
+    normalized = {
+        (chapter, title.strip().lower()): content
+        for chapter, topics in knowledge.items() for title, content in topics.items()
+    }
+
+    def lookup(i):
+        meta = metadata[i]
+        return normalized.get((meta["chapter"], meta["title"].strip().lower()), "")
+
+    return len(metadata), lookup, (knowledge, figures, figure_rows)
+
+
+def load_store(path):
+    from LANGCHAIN.TOOLS.corpus_store import CorpusStore
+
+    store = CorpusStore(path)
+    return len(store), store.text, store
+
+
+def child(variant, store_path, lookups, seed):
+    # Import up front so module/numpy memory is not counted as corpus memory
+    import numpy  # noqa: F401
+    from LANGCHAIN.TOOLS import corpus_store  # noqa: F401
+
+    before = memory_kb()
+    start = time.perf_counter()
+    count, lookup, keep = load_json() if variant == "json" else load_store(store_path)
+    load_seconds = time.perf_counter() - start
+    after = memory_kb()
+
+    rng = random.Random(seed)
+    ids = [rng.randrange(count) for _ in range(lookups)]
+    start = time.perf_counter()
+    chars = sum(len(lookup(i)) for i in ids)
+    lookup_seconds = time.perf_counter() - start
+    touched = memory_kb()
+
+    print(json.dumps({
+        "load_seconds": load_seconds,
+        "rss_kb": after["VmRSS"] - before["VmRSS"],
+        "anon_kb": after["RssAnon"] - before["RssAnon"],
+        "file_kb": touched["RssFile"] - before["RssFile"],
+        "lookup_us": 1e6 * lookup_seconds / max(1, lookups),
+        "chars": chars,
+        "sections": count,
+    }))
+    del keep
+
+
+def run_variant(variant, store_path, runs, lookups):
+    samples = []
+    for run in range(runs):
+        proc = subprocess.run(
+            [sys.executable, __file__, "--child", variant, "--store", store_path,
+             "--lookups", str(lookups), "--seed", str(run)],
+            cwd=ROOT, capture_output=True, text=True,
+        )
+        if proc.returncode:
+            sys.exit(proc.stderr.strip())
+        samples.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+    median = lambda key: round(statistics.median(s[key] for s in samples), 4)
+    return {
+        "sections": samples[0]["sections"],
+        "load_seconds_p50": median("load_seconds"),
+        "rss_delta_kb_p50": median("rss_kb"),
+        "private_kb_p50": median("anon_kb"),
+        "file_backed_kb_p50": median("file_kb"),
+        "lookup_us_p50": median("lookup_us"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--lookups", type=int, default=20000)
+    parser.add_argument("--store", default=os.path.join(ROOT, "corpus.bin"))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--child", choices=["json", "store"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.store, args.lookups, args.seed)
+        return
+
+    from LANGCHAIN.TOOLS.corpus_store import build_corpus
+
+    start = time.perf_counter()
+    build_corpus(args.store, **SOURCES)
+    build_seconds = time.perf_counter() - start
+
+    report = {
+        "source_json_bytes": sum(os.path.getsize(path) for path in SOURCES.values()),
+        "store_bytes": os.path.getsize(args.store),
+        "build_seconds": round(build_seconds, 3),
+        "json": run_variant("json", args.store, args.runs, args.lookups),
+        "store": run_variant("store", args.store, args.runs, args.lookups),
+    }
+    report["load_speedup"] = round(
+        report["json"]["load_seconds_p50"] / max(report["store"]["load_seconds_p50"], 1e-9), 1
+    )
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
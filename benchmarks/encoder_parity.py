@@ -0,0 +1,88 @@
+"""
+Parity check and throughput benchmark for the ONNX int8 encoder backend.
+
+Encodes the section titles from metadata.json with the torch SentenceTransformer
+and with OnnxEncoder, checks the cosine similarity of every pair against a
+threshold, then measures single-query throughput (queries/sec per core) for
+each backend. Exits non-zero if parity fails.
+
+    python benchmarks/encoder_parity.py --threads 1 2 4
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+
+from LANGCHAIN.TOOLS.encoders import OnnxEncoder, get_encoder
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+def load_queries(limit):
+    with open(os.path.join(ROOT, "metadata.json"), "r", encoding="utf-8") as f:
+        titles = [item["title"].strip() for item in json.load(f)]
+    return titles[:limit]
+
+
+def cosine_parity(reference, candidate):
+    reference = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    candidate = candidate / np.linalg.norm(candidate, axis=1, keepdims=True)
+    return (reference * candidate).sum(axis=1)
+
+
+def queries_per_second(encoder, queries, rounds):
+    encoder.encode(queries[:4])
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for query in queries:
+            encoder.encode([query], convert_to_numpy=True)
+    return rounds * len(queries) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1])
+    parser.add_argument("--min-cosine", type=float, default=0.98)
+    args = parser.parse_args()
+
+    import torch
+
+    queries = load_queries(args.queries)
+    reference_model = get_encoder(args.model, backend="torch", device="cpu", cached=False)
+    reference = reference_model.encode(queries, convert_to_numpy=True)
+
+    report = {"model": args.model, "queries": len(queries), "throughput": []}
+    for threads in args.threads:
+        torch.set_num_threads(threads)
+        onnx_model = OnnxEncoder(args.model, threads=threads)
+        if "parity" not in report:
+            sims = cosine_parity(reference, onnx_model.encode(queries, convert_to_numpy=True))
+            report["parity"] = {
+                "min_cosine": float(sims.min()),
+                "mean_cosine": float(sims.mean()),
+                "passed": bool(sims.min() >= args.min_cosine),
+            }
+        torch_qps = queries_per_second(reference_model, queries, args.rounds)
+        onnx_qps = queries_per_second(onnx_model, queries, args.rounds)
+        report["throughput"].append({
+            "threads": threads,
+            "torch_qps_per_core": round(torch_qps / threads, 1),
+            "onnx_int8_qps_per_core": round(onnx_qps / threads, 1),
+            "speedup": round(onnx_qps / torch_qps, 2),
+        })
+
+    print(json.dumps(report, indent=2))
+    return 0 if report["parity"]["passed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,261 @@
+"""
+Load generator for the Flask /lesson page and the FastAPI /chat and /ws/lesson endpoints.
+
+Replays a query mix (metadata.json section titles, plus request titles from a
+.jsonl file when given) at a target concurrency and reports p50/p95/p99 latency,
+time to first byte/token, requests/sec and server RSS. Results can be stored as
+a named baseline and later runs diffed against it.
+
+    # start an app against local mock LLM/video services
+    python benchmarks/mock_services.py --target flask &
+    python benchmarks/loadgen.py --target lesson --concurrency 8 --requests 200 --save-baseline flask-lesson
+    python benchmarks/loadgen.py --target lesson --concurrency 8 --requests 200 --compare flask-lesson
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_DIR = os.path.join(ROOT, "benchmarks", "baselines")
+
+DEFAULT_PORTS = {"lesson": 5000, "chat": 8000, "ws": 8000}
+
+
+# -------------------------
+# Query mix
+# -------------------------
+def load_queries(paths, seed):
+    queries = []
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            if path.endswith(".jsonl"):
+                queries += [json.loads(line)["title"] for line in f if line.strip()]
+            else:
+                queries += [item["title"].strip() for item in json.load(f)]
+    random.Random(seed).shuffle(queries)
+    return queries
+
+
+# -------------------------
+# Single requests (each returns (ttfb_seconds, total_seconds, ok))
+# -------------------------
+def _http(host, port, method, path, body, headers):
+    start = time.perf_counter()
+    conn = http.client.HTTPConnection(host, port, timeout=300)
+    try:
+        conn.request(method, path, body=body, headers=headers)
+        resp = conn.getresponse()
+        first = resp.read(1)
+        ttfb = time.perf_counter() - start
+        while resp.read(65536):
+            pass
+        return ttfb if first else None, time.perf_counter() - start, resp.status < 400
+    finally:
+        conn.close()
+
+
+def lesson_request(host, port, query):
+    body = urllib.parse.urlencode({"query": query})
+    return _http(host, port, "POST", "/lesson", body, {"Content-Type": "application/x-www-form-urlencoded"})
+
+
+def chat_request(host, port, query):
+    body = json.dumps({"subtopic": query, "history": [], "question": f"Explain {query} for 3 marks"})
+    return _http(host, port, "POST", "/chat", body, {"Content-Type": "application/json"})
+
+
+def ws_request(host, port, query):
+    import websockets
+
+    async def run():
+        start = time.perf_counter()
+        ttft = None
+        async with websockets.connect(f"ws://{host}:{port}/ws/lesson", max_size=None) as ws:
+            await ws.send(json.dumps({"subtopic": query}))
+            async for message in ws:
+                if ttft is None:
+                    ttft = time.perf_counter() - start
+                if message == "[[DONE]]":
+                    break
+        return ttft, time.perf_counter() - start, True
+
+    return asyncio.run(run())
+
+
+REQUESTS = {"lesson": lesson_request, "chat": chat_request, "ws": ws_request}
+
+
+# -------------------------
+# RSS sampling
+# -------------------------
+def read_rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss / (1024 * 1024)
+    except Exception:
+        return None
+
+
+class RSSSampler(threading.Thread):
+    def __init__(self, pid, interval=0.5):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self._halt = threading.Event()
+
+    def run(self):
+        while not self._halt.is_set():
+            rss = read_rss_mb(self.pid)
+            if rss is not None:
+                self.samples.append(rss)
+            self._halt.wait(self.interval)
+
+    def stop(self):
+        self._halt.set()
+        self.join()
+
+
+# -------------------------
+# Run + report
+# -------------------------
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 4)
+
+
+def run_load(target, host, port, queries, concurrency, total):
+    send = REQUESTS[target]
+    results = []
+    lock = threading.Lock()
+
+    def one(i):
+        query = queries[i % len(queries)]
+        try:
+            ttfb, elapsed, ok = send(host, port, query)
+        except Exception:
+            ttfb, elapsed, ok = None, None, False
+        with lock:
+            results.append((ttfb, elapsed, ok))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    return results, time.perf_counter() - start
+
+
+def summarize(target, results, wall, concurrency, rss_samples):
+    latencies = [r[1] for r in results if r[2] and r[1] is not None]
+    ttfbs = [r[0] for r in results if r[2] and r[0] is not None]
+    return {
+        "target": target,
+        "concurrency": concurrency,
+        "requests": len(results),
+        "errors": sum(1 for r in results if not r[2]),
+        "wall_seconds": round(wall, 3),
+        "rps": round(len(latencies) / wall, 3) if wall else None,
+        "latency": {
+            "p50": percentile(latencies, 0.50),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99),
+            "mean": round(statistics.mean(latencies), 4) if latencies else None,
+        },
+        "ttfb": {
+            "p50": percentile(ttfbs, 0.50),
+            "p95": percentile(ttfbs, 0.95),
+            "p99": percentile(ttfbs, 0.99),
+        },
+        "rss_mb": {
+            "start": round(rss_samples[0], 1) if rss_samples else None,
+            "peak": round(max(rss_samples), 1) if rss_samples else None,
+        },
+    }
+
+
+def _flatten(report, prefix=""):
+    flat = {}
+    for key, value in report.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def diff_reports(baseline, current):
+    """Per-metric change of `current` relative to `baseline`."""
+    base, cur = _flatten(baseline), _flatten(current)
+    rows = {}
+    for key in sorted(set(base) & set(cur)):
+        if base[key]:
+            rows[key] = {"baseline": base[key], "current": cur[key],
+                         "change_pct": round(100 * (cur[key] - base[key]) / base[key], 1)}
+    return rows
+
+
+def baseline_path(name):
+    return os.path.join(BASELINE_DIR, f"{name}.json")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=sorted(REQUESTS), default="lesson")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--queries", nargs="+",
+                        default=[os.path.join(ROOT, "metadata.json"), os.path.join(ROOT, "requests.jsonl")],
+                        help="metadata-style .json files and/or .jsonl files with a 'title' field")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--server-pid", type=int, help="Sample this process's RSS during the run")
+    parser.add_argument("--save-baseline", metavar="NAME")
+    parser.add_argument("--compare", metavar="NAME", help="Diff against a stored baseline")
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries, args.seed)
+    if not queries:
+        sys.exit("No queries found")
+
+    sampler = RSSSampler(args.server_pid) if args.server_pid else None
+    if sampler:
+        sampler.start()
+    results, wall = run_load(args.target, args.host, args.port or DEFAULT_PORTS[args.target],
+                             queries, args.concurrency, args.requests)
+    if sampler:
+        sampler.stop()
+
+    report = summarize(args.target, results, wall, args.concurrency, sampler.samples if sampler else [])
+    output = {"report": report}
+    if args.compare:
+        with open(baseline_path(args.compare), "r", encoding="utf-8") as f:
+            output["diff"] = diff_reports(json.load(f), report)
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        with open(baseline_path(args.save_baseline), "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps(output, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""
+Local stand-ins for Groq/Gemini and YouTube used by the load tests.
+
+* MockLLMServer: OpenAI-compatible /v1/chat/completions endpoint with a
+  configurable time-to-first-token and streaming rate. Every LLM route is pointed
+  at it through llm_router's GROQ_API_URL / LLM_ROUTER_CONFIG, so Gemini tasks
+  are served by it as well.
+* install_mock_yt_dlp: puts a fake `yt_dlp` module first on sys.path (so the
+  backend's video worker processes import it too) whose searches sleep for a
+  configurable time and return a fixed video.
+* backend_layout: the FastAPI backend imports itself as `backend` with its
+  tools as `backend.tools`, while the repo keeps LANGCHAIN/BACKEND and
+  LANGCHAIN/TOOLS side by side; this builds that package layout in a temp dir.
+
+Run an app against the mocks:
+
+    python benchmarks/mock_services.py --target flask --llm-ttft 0.4 --llm-tps 80 --video-latency 1.5
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TASKS = ("hook", "intro", "explanation", "lesson", "chat", "classify", "summarize")
+
+LOREM = (
+    "Magnesium burns with a dazzling white flame and forms magnesium oxide. [[HALT]] "
+    "This is a combination reaction because two substances join to form one product. [[HALT]] "
+    "Still with me? [[HALT]] "
+)
+
+
+class _QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients routinely hang up right after [DONE]
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+
+class MockLLMServer:
+    """Threaded HTTP server speaking the OpenAI chat-completions protocol."""
+
+    def __init__(self, host="127.0.0.1", port=0, ttft=0.3, tokens_per_second=60.0, reply_words=120):
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.reply_words = reply_words
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                server.requests += 1
+                words = server.reply(body)
+                time.sleep(server.ttft)
+                if body.get("stream"):
+                    self._stream(body, words)
+                else:
+                    self._complete(body, words)
+
+            def _complete(self, body, words):
+                time.sleep(len(words) / server.tokens_per_second)
+                payload = json.dumps({
+                    "model": body.get("model"),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": " ".join(words)}}],
+                }).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _stream(self, body, words):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                delay = 1.0 / server.tokens_per_second
+                for word in words:
+                    event = {"choices": [{"index": 0, "delta": {"content": word + " "}}]}
+                    self._chunk(f"data: {json.dumps(event)}\n\n".encode())
+                    time.sleep(delay)
+                self._chunk(b"data: [DONE]\n\n")
+                self._chunk(b"")
+
+            def _chunk(self, data):
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+        self.httpd = _QuietHTTPServer((host, port), Handler)
+
+    def reply(self, body):
+        text = (LOREM * (self.reply_words // 20 + 1)).split(" ")
+        return [w for w in text if w][:self.reply_words]
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1/chat/completions"
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, name="mock-llm", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+
+
+def route_all_tasks_to(url, model="mock-llm"):
+    """Point every llm_router task at the mock server; returns the env vars to set."""
+    routes = {task: {"primary": ["groq", model], "hedge": None, "max_tokens": 1000} for task in TASKS}
+    fd, path = tempfile.mkstemp(prefix="mock_routes_", suffix=".json")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(routes, f)
+    return {
+        "GROQ_API_URL": url,
+        "GROQ_API_KEY": "mock",
+        "LLM_ROUTER_CONFIG": path,
+        # The mock has no quota; keep the provider rate limit out of the measurements
+        "LLM_RATE_LIMITS": json.dumps({f"groq:{model}": [10000, 10000]}),
+    }
+
+
+MOCK_YT_DLP = '''
+import time
+
+LATENCY = {latency!r}
+VIDEO_ID = {video_id!r}
+DURATION = {duration!r}
+
+
+class DownloadError(Exception):
+    pass
+
+
+class YoutubeDL:
+    def __init__(self, opts=None):
+        self.opts = opts or {{}}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def extract_info(self, query, download=False):
+        time.sleep(LATENCY)
+        return {{"entries": [{{
+            "title": f"Mock video for {{query}}",
+            "url": f"https://www.youtube.com/watch?v={{VIDEO_ID}}",
+            "id": VIDEO_ID,
+            "duration": DURATION,
+        }}]}}
+'''
+
+
+def install_mock_yt_dlp(latency=1.0, video_id="dQw4w9WgXcQ", duration=240):
+    """
+    Put a fake yt_dlp module first on sys.path (must run before the app imports it).
+    It is written to a file rather than injected into sys.modules because the
+    backend searches from spawned worker processes, which inherit sys.path.
+    """
+    directory = tempfile.mkdtemp(prefix="mock-yt-dlp-")
+    with open(os.path.join(directory, "yt_dlp.py"), "w", encoding="utf-8") as f:
+        f.write(MOCK_YT_DLP.format(latency=latency, video_id=video_id, duration=duration))
+    sys.path.insert(0, directory)
+    sys.modules.pop("yt_dlp", None)
+    import yt_dlp
+    return yt_dlp
+
+
+def _link(src, dst):
+    """Symlink `dst` to `src`, or copy it where symlinks are not permitted (Windows without developer mode)."""
+    try:
+        os.symlink(src, dst, target_is_directory=os.path.isdir(src))
+    except OSError:
+        if os.path.isdir(src):
+            shutil.copytree(src, dst)
+        else:
+            shutil.copy2(src, dst)
+
+
+def backend_layout(directory=None):
+    """
+    Directory containing the `backend` package as deployed: backend/ holds
+    LANGCHAIN/BACKEND and backend/tools/ holds LANGCHAIN/TOOLS (plus the images).
+    Run the backend with this as its working directory.
+    """
+    directory = directory or tempfile.mkdtemp(prefix="backend-app-")
+    backend = os.path.join(directory, "backend")
+    tools = os.path.join(backend, "tools")
+    os.makedirs(tools, exist_ok=True)
+    for src_dir, dst_dir in ((os.path.join(ROOT, "LANGCHAIN", "BACKEND"), backend),
+                             (os.path.join(ROOT, "LANGCHAIN", "TOOLS"), tools)):
+        for name in os.listdir(src_dir):
+            dst = os.path.join(dst_dir, name)
+            if name != "__pycache__" and not os.path.lexists(dst):
+                _link(os.path.join(src_dir, name), dst)
+    if not os.path.lexists(os.path.join(tools, "images")):
+        _link(os.path.join(ROOT, "images"), os.path.join(tools, "images"))
+    return directory
+
+
+def serve_app(target, port, args):
+    """Start the mock LLM, patch yt_dlp and run the requested app in this process."""
+    llm = MockLLMServer(ttft=args.llm_ttft, tokens_per_second=args.llm_tps, reply_words=args.reply_words).start()
+    os.environ.update(route_all_tasks_to(llm.url))
+    install_mock_yt_dlp(latency=args.video_latency)
+
+    if target == "flask":
+        os.chdir(ROOT)
+        sys.path.insert(0, ROOT)
+        from werkzeug.serving import make_server
+        import app as flask_app
+        server = make_server("127.0.0.1", port, flask_app.app, threaded=True)
+        flask_app.start_warmup()
+        server.serve_forever()
+    else:
+        # The backend package is imported as `backend`; --app-dir must contain it
+        app_dir = args.app_dir or backend_layout()
+        os.chdir(app_dir)
+        sys.path.insert(0, app_dir)
+        import uvicorn
+        uvicorn.run("backend.main:app", host="127.0.0.1", port=port, log_level="warning")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=["flask", "fastapi"], default="flask")
+    parser.add_argument("--port", type=int, default=None)
+    parser.add_argument("--app-dir", default=None,
+                        help="Directory containing the `backend` package (fastapi target; "
+                             "default: a temp dir built by backend_layout())")
+    parser.add_argument("--llm-ttft", type=float, default=0.3, help="Mock LLM time to first token (s)")
+    parser.add_argument("--llm-tps", type=float, default=60.0, help="Mock LLM streaming rate (tokens/s)")
+    parser.add_argument("--reply-words", type=int, default=120)
+    parser.add_argument("--video-latency", type=float, default=1.0, help="Mock yt_dlp search time (s)")
+    args = parser.parse_args()
+    port = args.port or (5000 if args.target == "flask" else 8000)
+    serve_app(args.target, port, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Cross-encoder rerank cost vs. prompt-token savings.
+
+For each query (section titles from metadata.json, plus request titles from a
+.jsonl file when given) this compares:
+
+* baseline: first-stage FAISS top-k (default 5) sections, as used today
+* reranked: RERANK_CANDIDATES first-stage hits reranked to the top 2
+
+and reports the rerank latency (cold, and warm from the pair-score cache), the
+prompt tokens of the retrieved context in both cases, and the LLM prefill time
+those tokens cost at --prefill-tps, so the net effect per request is visible.
+
+    python benchmarks/rerank_cost.py --queries 100 --baseline-k 5 --top-k 2
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import app
+from LANGCHAIN.TOOLS.prompt_builder import count_tokens
+from LANGCHAIN.TOOLS.reranker import RERANK_CANDIDATES, get_reranker
+
+
+def load_queries(limit, extra):
+    with open(os.path.join(ROOT, "metadata.json"), "r", encoding="utf-8") as f:
+        queries = [item["title"].strip() for item in json.load(f)]
+    if extra and os.path.exists(extra):
+        with open(extra, "r", encoding="utf-8") as f:
+            queries += [json.loads(line)["title"] for line in f if line.strip()]
+    return queries[:limit]
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 4) if ordered else None
+
+
+def context_tokens(results):
+    return count_tokens("\n".join(result["content"] for result in results))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--extra-queries", default=os.path.join(ROOT, "requests.jsonl"))
+    parser.add_argument("--baseline-k", type=int, default=5)
+    parser.add_argument("--top-k", type=int, default=2)
+    parser.add_argument("--candidates", type=int, default=RERANK_CANDIDATES)
+    parser.add_argument("--prefill-tps", type=float, default=1500.0,
+                        help="LLM prompt processing rate (tokens/s) used to price context tokens")
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries, args.extra_queries)
+    reranker = get_reranker()
+    reranker.model  # load outside the timed region
+
+    rows = []
+    for query in queries:
+        candidates = app.search(query, top_k=max(args.candidates, args.baseline_k), mode="semantic", rerank=False)
+        if not candidates:
+            continue
+        baseline = candidates[:args.baseline_k]
+
+        start = time.perf_counter()
+        ranked = reranker.rerank(query, candidates, args.top_k, text=lambda r: r["content"])
+        cold = time.perf_counter() - start
+        start = time.perf_counter()
+        reranker.rerank(query, candidates, args.top_k, text=lambda r: r["content"])
+        warm = time.perf_counter() - start
+
+        reranked = [result for _, result in ranked]
+        rows.append({
+            "cold": cold,
+            "warm": warm,
+            "baseline_tokens": context_tokens(baseline),
+            "reranked_tokens": context_tokens(reranked),
+            "top1_changed": reranked[0]["title_key"] != baseline[0]["title_key"],
+        })
+
+    if not rows:
+        sys.exit("No queries returned results")
+
+    baseline_tokens = [r["baseline_tokens"] for r in rows]
+    reranked_tokens = [r["reranked_tokens"] for r in rows]
+    saved_tokens = [b - r for b, r in zip(baseline_tokens, reranked_tokens)]
+    cold = [r["cold"] for r in rows]
+    saved_prefill = [tokens / args.prefill_tps for tokens in saved_tokens]
+    report = {
+        "queries": len(rows),
+        "candidates": args.candidates,
+        "baseline_k": args.baseline_k,
+        "top_k": args.top_k,
+        "rerank_seconds": {
+            "cold_p50": percentile(cold, 0.50),
+            "cold_p95": percentile(cold, 0.95),
+            "warm_p50": percentile([r["warm"] for r in rows], 0.50),
+        },
+        "context_tokens": {
+            "baseline_mean": round(statistics.mean(baseline_tokens), 1),
+            "reranked_mean": round(statistics.mean(reranked_tokens), 1),
+            "saved_mean": round(statistics.mean(saved_tokens), 1),
+            "saved_pct": round(100 * sum(saved_tokens) / sum(baseline_tokens), 1) if sum(baseline_tokens) else None,
+        },
+        "prefill_seconds_saved_mean": round(statistics.mean(saved_prefill), 4),
+        "net_seconds_saved_cold_mean": round(statistics.mean(s - c for s, c in zip(saved_prefill, cold)), 4),
+        "top1_changed_pct": round(100 * sum(r["top1_changed"] for r in rows) / len(rows), 1),
+        "reranker": reranker.stats(),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
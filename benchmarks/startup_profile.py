@@ -0,0 +1,154 @@
+"""
+Cold-start profile for the Flask app and the FastAPI backend.
+
+Captures `python -X importtime` for the server module, then starts the server and
+measures time-to-bind, time-to-ready (GET /ready == 200) and the latency of the
+first request once ready.
+
+    python benchmarks/startup_profile.py --target flask
+    python benchmarks/startup_profile.py --target fastapi [--cwd <dir containing backend/>]
+
+Without --cwd the fastapi target runs from a temp dir holding the `backend`
+package layout (see mock_services.backend_layout).
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.parse
+import urllib.request
+
+from mock_services import backend_layout
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TARGETS = {
+    "flask": {
+        "module": "app",
+        "cwd": ROOT,
+        "cmd": [sys.executable, "app.py"],
+        "port": 5000,
+        "first_request": ("POST", "/lesson", {"query": "Combination Reaction"}),
+    },
+    "fastapi": {
+        "module": "backend.main",
+        "cwd": None,  # backend_layout()
+        "cmd": [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", "8000"],
+        "port": 8000,
+        "first_request": ("POST", "/chat", {"subtopic": "Combination Reaction", "history": [], "question": "What is it?"}),
+    },
+}
+
+
+def profile_imports(module, cwd, top=15):
+    """Run `import module` under -X importtime and return the slowest top-level imports."""
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=cwd, capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - start
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        # Only top-level imports: nested ones are indented past the single separator space
+        if not name.startswith("  "):
+            rows.append({"module": name.strip(), "cumulative_s": int(cumulative_us) / 1e6})
+    rows.sort(key=lambda r: r["cumulative_s"], reverse=True)
+    return {
+        "module": module,
+        "ok": proc.returncode == 0,
+        "error": proc.stderr.strip().splitlines()[-1] if proc.returncode else None,
+        "wall_seconds": round(wall, 3),
+        "import_seconds": round(sum(r["cumulative_s"] for r in rows), 3),
+        "slowest": rows[:top],
+    }
+
+
+def _wait_for_port(port, deadline):
+    while time.perf_counter() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return True
+        except OSError:
+            time.sleep(0.05)
+    return False
+
+
+def _request(base, method, path, payload, timeout=120):
+    url = base + path
+    if method == "GET":
+        req = urllib.request.Request(url)
+    elif path == "/lesson":
+        req = urllib.request.Request(url, data=urllib.parse.urlencode(payload).encode(), method=method)
+    else:
+        req = urllib.request.Request(
+            url, data=json.dumps(payload).encode(), method=method,
+            headers={"Content-Type": "application/json"},
+        )
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            resp.read()
+            return resp.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def profile_server(target, cwd, timeout=300):
+    """Start the server and time bind, readiness and the first request after it is ready."""
+    base = f"http://127.0.0.1:{target['port']}"
+    start = time.perf_counter()
+    deadline = start + timeout
+    proc = subprocess.Popen(target["cmd"], cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    result = {"bind_seconds": None, "ready_seconds": None, "first_request_seconds": None}
+    try:
+        if not _wait_for_port(target["port"], deadline):
+            return result
+        result["bind_seconds"] = round(time.perf_counter() - start, 3)
+
+        while time.perf_counter() < deadline:
+            if _request(base, "GET", "/ready", None) == 200:
+                result["ready_seconds"] = round(time.perf_counter() - start, 3)
+                break
+            time.sleep(0.2)
+        else:
+            return result
+
+        method, path, payload = target["first_request"]
+        req_start = time.perf_counter()
+        result["first_request_status"] = _request(base, method, path, payload)
+        result["first_request_seconds"] = round(time.perf_counter() - req_start, 3)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=sorted(TARGETS), default="flask")
+    parser.add_argument("--cwd", help="Working directory for the server (defaults per target)")
+    parser.add_argument("--imports-only", action="store_true", help="Skip starting the server")
+    parser.add_argument("--output", help="Write the JSON report here")
+    args = parser.parse_args()
+
+    target = TARGETS[args.target]
+    cwd = args.cwd or target["cwd"] or backend_layout()
+    report = {"target": args.target, "imports": profile_imports(target["module"], cwd)}
+    if not args.imports_only:
+        report["server"] = profile_server(target, cwd)
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
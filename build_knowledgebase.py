@@ -0,0 +1,309 @@
+"""
+PDF → knowledgebase.json ingestion pipeline (the steps from data_collection_code.ipynb as a CLI).
+
+* Pages are parsed in a process pool, in chunks of --pages-per-task. Each page's
+  get_text("dict") is read once: the lines are kept with their font size/boldness
+  while the font statistics are collected, so tagging needs no second pass.
+* The cleaning regexes are compiled once at import.
+* Each PDF's result is checkpointed under --checkpoint-dir, keyed by its path
+  relative to the input folder and its content hash, so adding a textbook only
+  processes the new PDF.
+* PDFs are found in the input folder and its subfolders (one per book). Chapters
+  are keyed "<n> CHAPTER" from the file name, prefixed with the subfolder; when
+  two files in one folder give the same key, both use their file names instead.
+
+    python build_knowledgebase.py textbooks/ --output knowledgebase.json --workers 8
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Bump when extraction/cleaning changes so old checkpoints are ignored
+PIPELINE_VERSION = 1
+
+# ---------------------- PRECOMPILED PATTERNS -----------------------
+SKIP_LABEL_RE = re.compile(r"^(Activity|Figure)\s*\d+(\.\d+)?", re.IGNORECASE)
+KTBS_RE = re.compile(r"©KTBS Not to be re published(?: Science)?", re.IGNORECASE)
+REPEATED_PHRASE_RE = re.compile(r"\b(\w+(?:\s+\w+){0,4})\b(?:\s+\1\b)+", re.IGNORECASE)
+BULLET_N_RE = re.compile(r"\bn\s*")
+STANDALONE_N_RE = re.compile(r"\bn\s+")
+HYPHEN_BREAK_RE = re.compile(r"(\w)-\s*(\w)")
+SPACED_HEADING_RE = re.compile(r"(\d+(?:\.\d+)+)\s+([A-Z]+(?:\s+[A-Z]+)+)")
+DUPLICATE_HEADING_RE = re.compile(r"\b(\d+(?:\.\d+)+.*?)\1\b")
+FIGURE_REPEAT_RE = re.compile(r"(Figure\s+\d+\.\d+)(\s+\1)+")
+ACTIVITY_REPEAT_RE = re.compile(r"(Activity\s+\d+\.\d+)(\s+\1)+")
+ARROW_RE = re.compile(r"([A-Za-z0-9\(\)]+)\s*[-–>]\s*([A-Za-z0-9\(\)]+)")
+EQUATION_RE = re.compile(
+    r"((?:[A-Za-z0-9\(\)]+\s*\+\s*)+[A-Za-z0-9\(\)]+)\s*→\s*((?:[A-Za-z0-9\(\)]+\s*\+\s*)*[A-Za-z0-9\(\)]+)"
+)
+SECTION_BREAK_RE = re.compile(r"(\n*)(\d+(?:\.\d+)*\s+[A-Z][^\n]+)")
+FINAL_FIXES = [
+    (re.compile(r"\b→\s*t"), "t"),
+    (re.compile(r"\b→\s*n"), "n"),
+    (re.compile(r"\b→\s*ature"), "nature"),
+    (re.compile(r"\b→\s*eeds"), "needs"),
+    (re.compile(r"\b→\s*itrate"), "nitrate"),
+    (re.compile(r"\bail\b"), "nail"),
+    (re.compile(r"\blear\s*→\s*t\b"), "learnt"),
+    (re.compile(r"→\s*ot"), "not"),
+    (re.compile(r"(Figure\s+\d+\.\d+)(\s*\1)+"), r"\1"),
+    (re.compile(r"(Activity\s+\d+\.\d+)(\s*\1)+"), r"\1"),
+]
+HEADING_LINE_RE = re.compile(r"^(\d+(?:\.\d+)+\s+.*)")
+WHITESPACE_RE = re.compile(r"\s+")
+CHAPTER_NUMBER_RE = re.compile(r"(\d+)")
+
+
+# ---------------------- CLEANING -----------------------
+def clean_full_text(text):
+    """Apply all text cleaning steps (same order as the notebook's clean_full_text)."""
+    text = KTBS_RE.sub("", text)
+    text = REPEATED_PHRASE_RE.sub(r"\1", text)
+    text = BULLET_N_RE.sub("\n- ", text)
+    text = STANDALONE_N_RE.sub(" ", text)
+    text = HYPHEN_BREAK_RE.sub(r"\1\2", text)
+    text = SPACED_HEADING_RE.sub(lambda m: m.group(1) + " " + m.group(2).replace(" ", ""), text)
+    text = DUPLICATE_HEADING_RE.sub(r"\1", text)
+    text = FIGURE_REPEAT_RE.sub(r"\1", text)
+    text = ACTIVITY_REPEAT_RE.sub(r"\1", text)
+    text = ARROW_RE.sub(r"\1 → \2", text)
+    text = EQUATION_RE.sub(r"\n\1 → \2\n", text)
+    text = SECTION_BREAK_RE.sub(r"\n\n\2\n", text)
+    for pattern, replacement in FINAL_FIXES:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def clean_content(text):
+    """Final per-section cleanup: normalize spaces, join hyphenated words, drop notices."""
+    text = WHITESPACE_RE.sub(" ", text)
+    text = HYPHEN_BREAK_RE.sub(r"\1\2", text)
+    return text.replace("©KTBS", "").replace("Not to be republished", "").strip()
+
+
+def structure_text(text):
+    """Split cleaned text into {heading: content}, preserving order."""
+    structured = {}
+    heading, buffer = "INTRODUCTION", []
+    for line in text.split("\n"):
+        line = line.strip()
+        if not line:
+            continue
+        match = HEADING_LINE_RE.match(line)
+        if match:
+            if buffer:
+                structured[heading] = clean_content(" ".join(buffer))
+                buffer = []
+            heading = match.group(1).strip()
+        else:
+            buffer.append(line)
+    if buffer:
+        structured[heading] = clean_content(" ".join(buffer))
+    return structured
+
+
+# ---------------------- EXTRACTION (worker side) -----------------------
+def extract_pages(pdf_path, first_page, last_page):
+    """
+    Read pages [first_page, last_page) once. Returns (lines, font_sizes) where each
+    line is (text, size, is_bold) and font_sizes are all span sizes seen.
+    """
+    import fitz  # PyMuPDF
+
+    lines, sizes = [], set()
+    with fitz.open(pdf_path) as doc:
+        for page_number in range(first_page, last_page):
+            for block in doc[page_number].get_text("dict")["blocks"]:
+                for line in block.get("lines", ()):
+                    spans = line["spans"]
+                    for span in spans:
+                        sizes.add(span["size"])
+                    text = " ".join(span["text"] for span in spans).strip()
+                    if text and spans:
+                        lines.append((text, spans[0]["size"], "Bold" in spans[0]["font"]))
+    return lines, sizes
+
+
+def tag_lines(lines, font_sizes):
+    """Mark headings/subheadings by font size, as extract_text_with_markers did."""
+    unique_sizes = sorted(font_sizes, reverse=True)
+    main_heading_size = unique_sizes[0] if unique_sizes else 15
+    subheading_size = unique_sizes[1] if len(unique_sizes) > 1 else 12
+
+    tagged = []
+    for text, size, bold in lines:
+        if SKIP_LABEL_RE.match(text):
+            continue
+        if size >= main_heading_size:
+            tagged.append(f"\n#HEADING# {text}\n")
+        elif size >= subheading_size and bold:
+            tagged.append(f"\n@SUBHEADING@ {text}\n")
+        else:
+            tagged.append(text)
+    return "\n".join(tagged)
+
+
+def process_text(lines, font_sizes):
+    return structure_text(clean_full_text(tag_lines(lines, font_sizes)))
+
+
+# ---------------------- CHECKPOINTS -----------------------
+def file_digest(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def checkpoint_path(checkpoint_dir, relative_path, digest):
+    stem = os.path.splitext(relative_path)[0].replace(os.sep, "__").replace("/", "__")
+    return os.path.join(checkpoint_dir, f"{stem}.{digest[:12]}.v{PIPELINE_VERSION}.json")
+
+
+def chapter_key(relative_path):
+    """'<n> CHAPTER' from the file name, prefixed with its folder (relative to the input) if any."""
+    folder, name = os.path.split(relative_path)
+    stem = os.path.splitext(name)[0]
+    match = CHAPTER_NUMBER_RE.search(stem)
+    key = f"{match.group(1)} CHAPTER" if match else stem
+    return f"{folder.replace(os.sep, '/')}/{key}" if folder else key
+
+
+def chapter_keys(relative_paths):
+    """{relative path: chapter key}; files whose keys collide are keyed by their path instead."""
+    keys = {path: chapter_key(path) for path in relative_paths}
+    counts = {}
+    for key in keys.values():
+        counts[key] = counts.get(key, 0) + 1
+    return {
+        path: key if counts[key] == 1 else os.path.splitext(path)[0].replace(os.sep, "/")
+        for path, key in keys.items()
+    }
+
+
+def page_count(pdf_path):
+    import fitz
+    with fitz.open(pdf_path) as doc:
+        return doc.page_count
+
+
+# ---------------------- PIPELINE -----------------------
+def ingest(pdf_paths, checkpoint_dir, workers=None, pages_per_task=8, force=False, root=None):
+    """
+    Process every PDF that has no valid checkpoint and return
+    ({chapter: {heading: content}}, report). Paths are keyed relative to `root`.
+    """
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    start = time.perf_counter()
+    relative = {pdf_path: os.path.relpath(pdf_path, root) if root else os.path.basename(pdf_path)
+                for pdf_path in pdf_paths}
+    keys = chapter_keys(relative.values())
+    chapters, todo, pages_skipped = {}, [], 0
+    for pdf_path in pdf_paths:
+        path = checkpoint_path(checkpoint_dir, relative[pdf_path], file_digest(pdf_path))
+        if os.path.exists(path) and not force:
+            with open(path, "r", encoding="utf-8") as f:
+                chapters[keys[relative[pdf_path]]] = json.load(f)
+            pages_skipped += page_count(pdf_path)
+        else:
+            todo.append((pdf_path, path))
+
+    pages_done = 0
+    processing_start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Fan out page chunks of every pending PDF at once
+        jobs = []
+        for pdf_path, path in todo:
+            n_pages = page_count(pdf_path)
+            pages_done += n_pages
+            chunks = [
+                pool.submit(extract_pages, pdf_path, first, min(first + pages_per_task, n_pages))
+                for first in range(0, n_pages, pages_per_task)
+            ]
+            jobs.append((pdf_path, path, chunks))
+
+        # Merge per PDF, then clean/structure in the pool as well
+        structuring = []
+        for pdf_path, path, chunks in jobs:
+            lines, sizes = [], set()
+            for future in chunks:
+                chunk_lines, chunk_sizes = future.result()
+                lines.extend(chunk_lines)
+                sizes |= chunk_sizes
+            structuring.append((pdf_path, path, pool.submit(process_text, lines, sizes)))
+
+        for pdf_path, path, future in structuring:
+            sections = future.result()
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(sections, f, ensure_ascii=False, indent=4)
+            chapters[keys[relative[pdf_path]]] = sections
+            print(f"✅ {relative[pdf_path]}: {len(sections)} sections")
+
+    end = time.perf_counter()
+    processing = end - processing_start
+    report = {
+        "pdfs": len(pdf_paths),
+        "processed": len(todo),
+        "from_checkpoint": len(pdf_paths) - len(todo),
+        "pages_processed": pages_done,
+        "pages_from_checkpoint": pages_skipped,
+        "seconds": round(end - start, 2),
+        "processing_seconds": round(processing, 2),
+        # Throughput of the pages actually extracted; checkpointed pages are not counted
+        "pages_per_sec": round(pages_done / processing, 1) if pages_done and processing else None,
+    }
+    return chapters, report
+
+
+def _chapter_sort_key(key):
+    folder, _, name = key.rpartition("/")
+    match = CHAPTER_NUMBER_RE.search(name)
+    return (folder, int(match.group(1)) if match else float("inf"), key)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="Folder of textbook PDFs (one chapter per file, optionally one subfolder per book)")
+    parser.add_argument("--output", default="knowledgebase.json")
+    parser.add_argument("--metadata-output", help="Also write a metadata.json-style title list")
+    parser.add_argument("--checkpoint-dir", default=".ingest_checkpoints")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--pages-per-task", type=int, default=8)
+    parser.add_argument("--force", action="store_true", help="Ignore existing checkpoints")
+    args = parser.parse_args()
+
+    pdf_paths = sorted(
+        os.path.join(folder, name) for folder, _, names in os.walk(args.input) for name in names
+        if name.lower().endswith(".pdf") and not name.startswith("~$")
+    )
+    if not pdf_paths:
+        print(f"❌ No PDF files found in '{args.input}'")
+        return
+
+    chapters, report = ingest(
+        pdf_paths, args.checkpoint_dir, args.workers, args.pages_per_task, args.force, root=args.input
+    )
+    knowledgebase = {key: chapters[key] for key in sorted(chapters, key=_chapter_sort_key)}
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(knowledgebase, f, ensure_ascii=False, indent=4)
+
+    if args.metadata_output:
+        metadata = [
+            {"title": title, "chapter": chapter}
+            for chapter, sections in knowledgebase.items()
+            for title in sections
+        ]
+        with open(args.metadata_output, "w", encoding="utf-8") as f:
+            json.dump(metadata, f, ensure_ascii=False, indent=4)
+
+    print(f"✅ Knowledge base saved to {args.output}")
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+import importlib.util
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# The FastAPI backend is deployed as backend/ (LANGCHAIN/BACKEND) with
+# backend/tools/ (LANGCHAIN/TOOLS); mirror that layout so `backend.main` imports
+for _name, _folder in (("backend", "BACKEND"), ("backend.tools", "TOOLS")):
+    if _name not in sys.modules:
+        _path = os.path.join(ROOT, "LANGCHAIN", _folder)
+        _spec = importlib.util.spec_from_file_location(
+            _name, os.path.join(_path, "__init__.py"), submodule_search_locations=[_path]
+        )
+        sys.modules[_name] = importlib.util.module_from_spec(_spec)
+        _spec.loader.exec_module(sys.modules[_name])
@@ -0,0 +1,63 @@
+import time
+
+import numpy as np
+
+from LANGCHAIN.TOOLS.answer_cache import AnswerCache, UNCACHEABLE_MARKERS, is_follow_up
+
+QUESTION = "What is a combination reaction for 3 marks?"
+
+
+def vec(*values):
+    return np.array(values, dtype="float32")
+
+
+def test_similar_question_hits():
+    cache = AnswerCache(threshold=0.9)
+    assert cache.put("Chemical Reactions", QUESTION, vec(1, 0), "Three points.", llm_seconds=2.0)
+    assert cache.lookup(" chemical  reactions", "Explain combination reactions for 3 marks", vec(0.99, 0.05)) == "Three points."
+    assert cache.lookup("Chemical Reactions", QUESTION, vec(0, 1)) is None
+    assert cache.stats()["saved_llm_seconds"] == 2.0
+
+
+def test_marks_are_separate_buckets():
+    cache = AnswerCache(threshold=0.9)
+    cache.put("Chemical Reactions", QUESTION, vec(1, 0), "Three points.", llm_seconds=1.0)
+    assert cache.lookup("Chemical Reactions", QUESTION.replace("3 marks", "5 marks"), vec(1, 0)) is None
+    assert cache.lookup("Chemical Reactions", "What is a combination reaction?", vec(1, 0)) is None
+
+
+def test_follow_ups_bypass_the_cache():
+    history = [{"role": "teacher", "text": "A combination reaction joins two reactants."}]
+    assert is_follow_up("yes", [])
+    assert is_follow_up("Expand the 2nd point", history)
+    assert is_follow_up("what do you mean by that?", history)
+    assert not is_follow_up(QUESTION, history)
+    assert not is_follow_up("Expand the 2nd point", [])
+
+
+def test_expired_entries_are_dropped(monkeypatch):
+    cache = AnswerCache(ttl=60)
+    cache.put("Cells", "What is a cell?", vec(1, 0), "The unit of life.", llm_seconds=1.0)
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert cache.lookup("Cells", "What is a cell?", vec(1, 0)) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_is_evicted():
+    cache = AnswerCache(max_entries=2)
+    cache.put("Cells", "What is a cell?", vec(1, 0), "Cell.", llm_seconds=1.0)
+    cache.put("Cells", "What is a tissue?", vec(0, 1), "Tissue.", llm_seconds=1.0)
+    assert cache.lookup("Cells", "What is a cell?", vec(1, 0)) == "Cell."  # now most recently used
+    cache.put("Cells", "What is an organ?", vec(-1, 0), "Organ.", llm_seconds=1.0)
+    assert cache.lookup("Cells", "What is a tissue?", vec(0, 1)) is None
+    assert cache.lookup("Cells", "What is a cell?", vec(1, 0)) == "Cell."
+    assert cache.stats()["entries"] == 2
+
+
+def test_uncacheable_answers_are_refused():
+    cache = AnswerCache()
+    for marker in UNCACHEABLE_MARKERS:
+        assert not cache.put("Cells", "What is a cell?", vec(1, 0), f"Sorry {marker}", llm_seconds=1.0)
+    assert not cache.put("Cells", "What is a cell?", vec(1, 0), "  ", llm_seconds=1.0)
+    assert cache.stats()["entries"] == 0
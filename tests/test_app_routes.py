@@ -0,0 +1,27 @@
+import pytest
+
+import app as flask_app
+
+
+@pytest.fixture
+def client():
+    return flask_app.app.test_client()
+
+
+@pytest.mark.parametrize("path", ["/app.py", "/knowledgebase.json", "/textbook_faiss.index", "/corpus.bin"])
+def test_repo_files_are_not_served(client, path):
+    assert client.get(path).status_code == 404
+
+
+@pytest.mark.parametrize("path", ["/images/../app.py", "/images/%2e%2e/app.py", "/images/..%2fapp.py"])
+def test_image_route_stays_inside_image_dir(client, path):
+    assert client.get(path).status_code == 404
+
+
+def test_only_current_image_version_is_cached_immutably(client):
+    version = flask_app.get_shards().image_store(flask_app.get_shards().catalog.default).version("Figure_1.1.png")
+    current = client.get(f"/images/Figure_1.1.png?v={version}")
+    stale = client.get("/images/Figure_1.1.png?v=00000000")
+    assert current.status_code == stale.status_code == 200
+    assert "immutable" in current.headers["Cache-Control"]
+    assert "immutable" not in stale.headers["Cache-Control"]
@@ -0,0 +1,63 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from build_knowledgebase import chapter_keys
+
+fitz = pytest.importorskip("fitz")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_pdf(path, heading, body):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((72, 72), "Chapter 1 Cells", fontsize=16)
+    page.insert_text((72, 110), heading, fontsize=12, fontname="hebo")
+    page.insert_text((72, 140), body, fontsize=11)
+    doc.save(path)
+    doc.close()
+
+
+def run_cli(tmp_path):
+    result = subprocess.run(
+        [sys.executable, os.path.join(ROOT, "build_knowledgebase.py"), str(tmp_path / "pdfs"),
+         "--output", str(tmp_path / "knowledgebase.json"), "--checkpoint-dir", str(tmp_path / "checkpoints"),
+         "--workers", "1"],
+        capture_output=True, text=True, encoding="utf-8", check=True,
+    )
+    report = json.loads(result.stdout[result.stdout.rindex("\n{") + 1:])
+    with open(tmp_path / "knowledgebase.json", "r", encoding="utf-8") as f:
+        return report, json.load(f)
+
+
+def test_second_run_resumes_from_checkpoints(tmp_path):
+    # Same chapter number in two books must not overwrite each other
+    make_pdf(str(tmp_path / "pdfs" / "chapter1.pdf"), "1.1 The cell", "Cells are the units of life.")
+    make_pdf(str(tmp_path / "pdfs" / "biology" / "chapter1.pdf"), "1.1 The cell", "Cells divide to grow.")
+
+    first, knowledgebase = run_cli(tmp_path)
+    assert sorted(knowledgebase) == ["1 CHAPTER", "biology/1 CHAPTER"]
+    assert knowledgebase["1 CHAPTER"]["1.1 The cell"] == "Cells are the units of life."
+    assert knowledgebase["biology/1 CHAPTER"]["1.1 The cell"] == "Cells divide to grow."
+    assert first["processed"] == 2 and first["pages_processed"] == 2 and first["pages_from_checkpoint"] == 0
+
+    second, again = run_cli(tmp_path)
+    assert again == knowledgebase
+    assert second["processed"] == 0 and second["from_checkpoint"] == 2
+    assert second["pages_processed"] == 0 and second["pages_from_checkpoint"] == 2
+    assert second["pages_per_sec"] is None
+
+
+def test_colliding_chapter_numbers_keep_their_paths():
+    keys = chapter_keys(["chapter1.pdf", "ch1_part2.pdf", "chapter2.pdf", os.path.join("physics", "chapter1.pdf")])
+    assert keys == {
+        "chapter1.pdf": "chapter1",
+        "ch1_part2.pdf": "ch1_part2",
+        "chapter2.pdf": "2 CHAPTER",
+        os.path.join("physics", "chapter1.pdf"): "physics/1 CHAPTER",
+    }
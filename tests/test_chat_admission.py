@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import main
+from backend.tools.admission import AdmissionController
+from backend.tools.answer_cache import AnswerCache
+
+
+class FakeEncoder:
+    def encode(self, texts, convert_to_numpy=True):
+        return np.ones((len(texts), 4), dtype="float32")
+
+
+class FakeRetriever:
+    embed_model = FakeEncoder()
+
+    def __init__(self, error=None):
+        self.error = error
+
+    def retrieve(self, query, k=5):
+        if self.error:
+            raise self.error
+        return ["Plants make food by photosynthesis."]
+
+
+def answer(*chunks):
+    async def stream_grok(prompt, task="default"):
+        for chunk in chunks:
+            yield chunk
+    return stream_grok
+
+
+@pytest.fixture
+def admission(monkeypatch):
+    controller = AdmissionController(max_active=2, max_queue=2, max_wait=0.5)
+    monkeypatch.setattr(main, "admission", controller)
+    monkeypatch.setattr(main, "answer_cache", AnswerCache())
+    monkeypatch.setattr(main, "get_rag_retriever", lambda: FakeRetriever())
+    monkeypatch.setattr(main, "stream_grok", answer("Leaves ", "use light."))
+    return controller
+
+
+@pytest.fixture
+def client():
+    return TestClient(main.app, raise_server_exceptions=False)
+
+
+def ask(client, question="How do plants make food?", history=()):
+    return client.post("/chat", json={"subtopic": "Photosynthesis", "history": list(history), "question": question})
+
+
+def test_streamed_answer_releases_slot(admission, client):
+    response = ask(client)
+    assert response.status_code == 200
+    assert response.text == "Leaves use light."
+    assert admission.active == 0
+
+
+def test_bad_history_releases_slot(admission, client):
+    # More failing requests than there are slots: none may leak one
+    for _ in range(admission.max_active + 2):
+        assert ask(client, history=[{"role": "student"}]).status_code == 500
+    assert admission.active == 0
+    assert ask(client).status_code == 200
+
+
+def test_retrieval_error_releases_slot(admission, client, monkeypatch):
+    monkeypatch.setattr(main, "get_rag_retriever", lambda: FakeRetriever(error=RuntimeError("index missing")))
+    assert ask(client).status_code == 500
+    assert admission.active == 0
+
+
+def test_empty_answer_releases_slot(admission, client, monkeypatch):
+    monkeypatch.setattr(main, "stream_grok", answer())
+    response = ask(client)
+    assert response.status_code == 200
+    assert response.text == ""
+    assert admission.active == 0
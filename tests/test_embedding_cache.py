@@ -0,0 +1,50 @@
+import numpy as np
+
+from LANGCHAIN.TOOLS.embedding_cache import CachedEncoder, EmbeddingCache, uncached
+
+
+class FakeEncoder:
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, sentences, convert_to_numpy=True, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        self.calls.append(texts)
+        vectors = np.array([[len(t) / 3.0, 1.0 / 3.0] for t in texts], dtype=np.float32)
+        return vectors[0] if single else vectors
+
+
+def test_queries_are_cached():
+    fake = FakeEncoder()
+    encoder = CachedEncoder(fake, "fake", cache=EmbeddingCache(max_entries=16))
+    first = encoder.encode(["What is rust?"])
+    second = encoder.encode(["what is  RUST?"])
+    assert fake.calls == [["What is rust?"]]
+    assert np.allclose(first, second, atol=1e-2)
+
+
+def test_miss_returns_model_precision():
+    fake = FakeEncoder()
+    encoder = CachedEncoder(fake, "fake", cache=EmbeddingCache(max_entries=16))
+    vector = encoder.encode("abcd")
+    assert vector.dtype == np.float32
+    assert vector[1] == np.float32(1.0 / 3.0)
+
+
+def test_uncached_bypasses_the_cache():
+    fake = FakeEncoder()
+    cache = EmbeddingCache(max_entries=16)
+    encoder = CachedEncoder(fake, "fake", cache=cache)
+    uncached(encoder).encode("A whole section body.")
+    assert cache.stats()["entries"] == 0
+    assert uncached(fake) is fake
+
+
+def test_backends_do_not_share_vectors():
+    cache = EmbeddingCache(max_entries=16)
+    torch_fake, onnx_fake = FakeEncoder(), FakeEncoder()
+    CachedEncoder(torch_fake, "fake", cache=cache, backend="torch").encode("What is rust?")
+    CachedEncoder(onnx_fake, "fake", cache=cache, backend="onnx-int8").encode("What is rust?")
+    assert onnx_fake.calls == [["What is rust?"]]
+    assert cache.stats()["entries"] == 2
@@ -0,0 +1,49 @@
+"""ONNX int8 vs torch encoder parity; runs only where the exported ONNX model is available."""
+import json
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("onnxruntime")
+pytest.importorskip("sentence_transformers")
+
+from LANGCHAIN.TOOLS.encoders import OnnxEncoder, _model_dir, get_encoder  # noqa: E402
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+MIN_COSINE = float(os.environ.get("ENCODER_PARITY_MIN_COSINE", "0.98"))
+TOP_K = 5
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+pytestmark = pytest.mark.skipif(
+    not os.path.exists(os.path.join(_model_dir(MODEL_NAME), "model.int8.onnx")),
+    reason="ONNX export not built (see LANGCHAIN.TOOLS.encoders.export_onnx)",
+)
+
+
+def unit(vectors):
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.fixture(scope="module")
+def embeddings():
+    with open(os.path.join(ROOT, "metadata.json"), "r", encoding="utf-8") as f:
+        titles = [item["title"].strip() for item in json.load(f)][:200]
+    reference = get_encoder(MODEL_NAME, backend="torch", device="cpu", cached=False)
+    candidate = OnnxEncoder(MODEL_NAME)
+    return (unit(reference.encode(titles, convert_to_numpy=True)),
+            unit(candidate.encode(titles, convert_to_numpy=True)))
+
+
+def test_cosine_parity(embeddings):
+    reference, candidate = embeddings
+    assert (reference * candidate).sum(axis=1).min() >= MIN_COSINE
+
+
+def test_top_k_agreement(embeddings):
+    reference, candidate = embeddings
+    # Each title as a query against the others: the nearest neighbours must (nearly) agree
+    ref_top = np.argsort(-(reference @ reference.T), axis=1)[:, 1:TOP_K + 1]
+    cand_top = np.argsort(-(candidate @ candidate.T), axis=1)[:, 1:TOP_K + 1]
+    overlap = [len(set(a) & set(b)) / TOP_K for a, b in zip(ref_top, cand_top)]
+    assert np.mean(overlap) >= 0.9
@@ -0,0 +1,49 @@
+import json
+import os
+
+import numpy as np
+
+from LANGCHAIN.TOOLS.figure_index import FigureIndex
+
+WORDS = ["leaf", "root", "cell", "light", "water", "stem"]
+
+
+class WordEncoder:
+    """One dimension per known word, so figures sharing words with the query score higher."""
+
+    def encode(self, texts, convert_to_numpy=True, **kwargs):
+        return np.array([[text.lower().count(word) + 0.01 for word in WORDS] for text in texts], dtype="float32")
+
+
+def figure(name, subchapter, description):
+    return {"figure": name, "subchapter": subchapter, "chapter": "1", "description": description}
+
+
+def make_index(tmp_path, figures):
+    figures_path = tmp_path / "output.json"
+    figures_path.write_text(json.dumps(figures), encoding="utf-8")
+    return FigureIndex(str(tmp_path / "figure.index"), str(tmp_path / "figure_metadata.json"),
+                       str(figures_path), WordEncoder())
+
+
+def test_rebuilds_when_figures_change(tmp_path):
+    index = make_index(tmp_path, [figure("Figure 1.1", "Leaf", "leaf and light")])
+    assert [f["figure"] for f in index.search("leaf", k=3, min_score=0)] == ["Figure 1.1"]
+
+    figures = [figure("Figure 1.1", "Leaf", "leaf and light"), figure("Figure 1.2", "Leaf", "leaf veins")]
+    (tmp_path / "output.json").write_text(json.dumps(figures), encoding="utf-8")
+    os.utime(tmp_path / "output.json", ns=(1, 1))
+    assert {f["figure"] for f in index.search("leaf", k=3, min_score=0)} == {"Figure 1.1", "Figure 1.2"}
+
+    # A fresh process reads the stamped index instead of rebuilding it
+    again = FigureIndex(index.index_path, index.metadata_path, index.figures_path, WordEncoder())
+    assert {f["figure"] for f in again.search("leaf", k=3, min_score=0)} == {"Figure 1.1", "Figure 1.2"}
+
+
+def test_figures_without_images_do_not_take_slots(tmp_path):
+    figures = [figure(f"Figure 1.{i}", f"Section {i}", "leaf " * (20 - i)) for i in range(12)]
+    figures.append(figure("Figure 2.1", "Roots", "root leaf"))
+    index = make_index(tmp_path, figures)
+    # Only one figure has an image file; it must still be found behind the others
+    results = index.search("leaf", k=1, min_score=0, keep=lambda fig: fig["figure"] == "Figure 2.1")
+    assert [f["figure"] for f in results] == ["Figure 2.1"]
@@ -0,0 +1,50 @@
+import json
+import os
+
+from LANGCHAIN.TOOLS.image_delivery import (
+    CACHE_CONTROL, MANIFEST_NAME, UNVERSIONED_CACHE_CONTROL, ImageStore, response_headers,
+)
+
+
+def write(path, data, mtime=None):
+    with open(path, "wb") as f:
+        f.write(data)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+def test_replaced_original_gets_new_etag(tmp_path):
+    image = tmp_path / "leaf.png"
+    write(image, b"old image", mtime=1_000_000)
+    store = ImageStore(str(tmp_path))
+    _, old_etag, _ = store.select("leaf.png")
+    old_version = store.version("leaf.png")
+    assert old_version == old_etag[:8]
+
+    write(image, b"new image!", mtime=2_000_000)
+    _, new_etag, _ = store.select("leaf.png")
+    assert new_etag != old_etag
+    assert store.version("leaf.png") == new_etag[:8]
+
+
+def test_regenerated_manifest_is_reloaded(tmp_path):
+    (tmp_path / "variants").mkdir()
+    write(tmp_path / "variants" / "leaf.w320.png", b"small")
+    manifest = tmp_path / MANIFEST_NAME
+
+    def build(etag, mtime):
+        entry = {"etag": etag, "variants": [{"file": "leaf.w320.png", "width": 320, "format": "png", "etag": etag}]}
+        write(manifest, json.dumps({"leaf.png": entry}).encode(), mtime=mtime)
+
+    build("aaaaaaaaaaaa", 1_000_000)
+    store = ImageStore(str(tmp_path))
+    assert store.select("leaf.png", 320)[1] == "aaaaaaaaaaaa"
+    build("bbbbbbbbbbbb", 2_000_000)
+    assert store.select("leaf.png", 320)[1] == "bbbbbbbbbbbb"
+    assert store.version("leaf.png") == "bbbbbbbb"
+    assert "v=bbbbbbbb" in store.srcset("leaf.png")
+
+
+def test_only_current_version_is_immutable():
+    assert response_headers("abc", versioned=True)["Cache-Control"] == CACHE_CONTROL
+    assert response_headers("abc", versioned=False)["Cache-Control"] == UNVERSIONED_CACHE_CONTROL
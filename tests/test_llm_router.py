@@ -0,0 +1,193 @@
+import time
+
+import pytest
+
+from LANGCHAIN.TOOLS import llm_router
+from LANGCHAIN.TOOLS.admission import RateLimited
+from LANGCHAIN.TOOLS.llm_router import (
+    MIN_SAMPLES_FOR_P95, CircuitBreaker, GroqProvider, LLMError, LLMRouter, MockProvider, Route,
+)
+
+
+class CountingProvider(MockProvider):
+    """Mock that counts the chunks it actually produced."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.yielded = 0
+
+    def stream(self, prompt, max_tokens=1000, temperature=0.7):
+        for chunk in super().stream(prompt, max_tokens=max_tokens, temperature=temperature):
+            self.yielded += 1
+            yield chunk
+
+
+def make_router(primary, hedge, hedge_delay=2.0, failures=5, cooldown=30.0):
+    router = LLMRouter({"task": Route(("mock", primary.model), ("mock", hedge.model))}, hedge_delay=hedge_delay)
+    for provider in (primary, hedge):
+        router.register(provider)
+        router.breakers[provider.key] = CircuitBreaker(failures=failures, cooldown=cooldown)
+    return router
+
+
+def test_failover_to_hedge_when_primary_fails():
+    primary = MockProvider("primary", fail=True)
+    hedge = MockProvider("hedge", reply="From the hedge.")
+    router = make_router(primary, hedge)
+
+    assert router.complete("task", "q") == "From the hedge."
+    assert "".join(router.stream("task", "q")).strip() == "From the hedge."
+    assert primary.calls == 2
+
+
+def test_all_providers_failing_raises():
+    router = make_router(MockProvider("primary", fail=True), MockProvider("hedge", fail=True))
+    try:
+        router.complete("task", "q")
+    except LLMError as e:
+        assert "mock:primary" in str(e) and "mock:hedge" in str(e)
+    else:
+        raise AssertionError("expected LLMError")
+
+
+def test_hedge_not_fired_before_deadline():
+    primary = MockProvider("primary", reply="Primary.")
+    hedge = MockProvider("hedge", reply="Hedge.")
+    router = make_router(primary, hedge, hedge_delay=1.0)
+
+    assert router.complete("task", "q") == "Primary."
+    assert hedge.calls == 0
+
+
+def test_hedge_fires_after_deadline_and_wins():
+    primary = MockProvider("primary", latency=1.0, reply="Primary.")
+    hedge = MockProvider("hedge", reply="Hedge.")
+    router = make_router(primary, hedge, hedge_delay=0.05)
+
+    start = time.perf_counter()
+    assert router.complete("task", "q") == "Hedge."
+    assert time.perf_counter() - start < 0.5
+
+
+def test_stream_hedge_stops_losing_stream():
+    primary = CountingProvider("primary", latency=0.3, reply=" ".join(["slow"] * 20))
+    hedge = CountingProvider("hedge", reply="fast answer")
+    router = make_router(primary, hedge, hedge_delay=0.05)
+
+    assert "".join(router.stream("task", "q")).split() == ["fast", "answer"]
+    time.sleep(0.6)
+    # The primary produced its first chunk after the hedge had won and stopped there
+    assert primary.yielded == 1
+
+
+def test_stream_close_stops_provider():
+    primary = CountingProvider("primary", chunk_delay=0.02, reply=" ".join(["word"] * 50))
+    router = make_router(primary, MockProvider("hedge"))
+
+    stream = router.stream("task", "q")
+    next(stream)
+    stream.close()
+    time.sleep(0.3)
+    assert primary.yielded < 10
+
+
+def test_stream_hedge_deadline_uses_time_to_first_chunk_per_task():
+    primary = MockProvider("primary")
+    router = make_router(primary, MockProvider("hedge"), hedge_delay=2.0)
+    ttft = router._histogram(router.ttft, primary, "task")
+    total = router._histogram(router.histograms, primary, "task")
+    for _ in range(MIN_SAMPLES_FOR_P95):
+        ttft.observe(0.1)
+        total.observe(8.0)
+
+    assert router.hedge_deadline(primary, "task", first_chunk=True) == 0.1
+    assert router.hedge_deadline(primary, "task") == 8.0
+    # Other tasks keep the default until they have their own samples
+    assert router.hedge_deadline(primary, "other", first_chunk=True) == 2.0
+
+
+def test_stream_records_ttft_and_total_separately():
+    primary = MockProvider("primary", latency=0.05, chunk_delay=0.05, reply="a b c d")
+    router = make_router(primary, MockProvider("hedge"))
+
+    list(router.stream("task", "q"))
+    stats = router.stats()["mock:primary"]["tasks"]["task"]
+    assert stats["ttft"]["count"] == 1 and stats["seconds"]["count"] == 1
+    assert stats["ttft"]["p50"] < stats["seconds"]["p50"]
+
+
+def test_circuit_opens_and_recovers():
+    primary = MockProvider("primary", fail=True)
+    hedge = MockProvider("hedge", reply="Hedge.")
+    router = make_router(primary, hedge, failures=2, cooldown=0.2)
+
+    for _ in range(2):
+        assert router.complete("task", "q") == "Hedge."
+    assert router.breakers["mock:primary"].state == "open"
+
+    # While open the primary is skipped entirely
+    assert router.complete("task", "q") == "Hedge."
+    assert primary.calls == 2
+
+    # After the cooldown one trial call goes through and closes the circuit
+    time.sleep(0.25)
+    primary.fail = False
+    assert router.complete("task", "q") == "Mock answer."
+    assert router.breakers["mock:primary"].state == "closed"
+    assert router.stats()["mock:primary"]["circuit_opens"] == 1
+
+
+def test_failed_trial_reopens_circuit():
+    breaker = CircuitBreaker(failures=1, cooldown=0.05)
+    breaker.record(False)
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert not breaker.allow()  # only one trial at a time
+    breaker.record(False)
+    assert breaker.state == "open"
+    assert breaker.opens == 2
+
+
+def test_provider_without_api_key_is_skipped(monkeypatch):
+    monkeypatch.setattr(llm_router, "GROQ_API_KEY", None)
+    hedge = MockProvider("hedge", reply="From the hedge.")
+    router = LLMRouter({"task": Route(("groq", "llama"), ("mock", "hedge"))})
+    router.register(GroqProvider("llama"))
+    router.register(hedge)
+
+    assert router.complete("task", "q") == "From the hedge."
+    assert hedge.calls == 1
+
+    router.set_route("task", ("groq", "llama"))
+    with pytest.raises(LLMError, match="API key"):
+        router.complete("task", "q")
+
+
+def test_open_circuit_does_not_spend_rate_limit_tokens(monkeypatch):
+    spent = []
+    monkeypatch.setattr(llm_router.rate_limiter, "acquire", spent.append)
+    primary = MockProvider("primary", fail=True)
+    router = make_router(primary, MockProvider("hedge", reply="Hedge."), failures=1, cooldown=30.0)
+
+    assert router.complete("task", "q") == "Hedge."
+    assert router.breakers["mock:primary"].state == "open"
+    spent.clear()
+    assert router.complete("task", "q") == "Hedge."
+    assert spent == ["mock:hedge"]
+
+
+def test_rate_limited_trial_is_handed_back(monkeypatch):
+    router = make_router(MockProvider("primary"), MockProvider("hedge"), failures=1, cooldown=0.05)
+    breaker = router.breakers["mock:primary"]
+    breaker.record(False)
+    time.sleep(0.06)
+
+    def limited(key):
+        raise RateLimited(f"{key} rate limit exceeded")
+
+    monkeypatch.setattr(llm_router.rate_limiter, "acquire", limited)
+    with pytest.raises(RateLimited):
+        router._admit(router.providers["mock:primary"])
+    # The half-open trial was not used up by a request that never went out
+    assert breaker.allow()
@@ -0,0 +1,44 @@
+import re
+
+from LANGCHAIN.TOOLS import admission, answer_cache, embedding_cache, llm_router, progress, shards, video_worker  # noqa: F401
+from LANGCHAIN.TOOLS.llm_router import MockProvider
+from LANGCHAIN.TOOLS.tracing import observe, registry
+
+SAMPLE_RE = re.compile(r"^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{[^}]*\})? \S+$")
+
+
+def family_of(name, types):
+    for suffix in ("_bucket", "_sum", "_count"):
+        if name.endswith(suffix) and types.get(name[: -len(suffix)]) == "histogram":
+            return name[: -len(suffix)]
+    return name
+
+
+def test_metrics_families_are_contiguous_and_typed():
+    router = llm_router.router
+    router.register(MockProvider("metrics"))
+    router.set_route("metrics-test", ("mock", "metrics"))
+    router.complete("metrics-test", "q")
+    list(router.stream("metrics-test", "q"))
+    observe("test.stage", 0.01)
+
+    types, seen, current = {}, set(), None
+    for line in registry.render().splitlines():
+        if line.startswith("# TYPE "):
+            _, _, name, kind = line.split(" ")
+            assert name not in types, f"duplicate TYPE for {name}"
+            types[name] = kind
+            continue
+        if line.startswith("#"):
+            continue
+        match = SAMPLE_RE.match(line)
+        assert match, line
+        family = family_of(match.group(1), types)
+        assert family in types, f"{family} has no TYPE line"
+        if family != current:
+            assert family not in seen, f"{family} is split by another family"
+            seen.add(family)
+            current = family
+
+    assert types["ai_teacher_llm_seconds"] == "histogram"
+    assert types["ai_teacher_llm_errors_total"] == "counter"
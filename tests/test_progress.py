@@ -0,0 +1,77 @@
+import asyncio
+import time
+
+from LANGCHAIN.TOOLS.progress import LessonPrefetcher, PrefetchedLesson, ProgressStore, TopicOrder
+
+TITLES = ["1.1 Chemical Equations", "1.1.1 Writing Equations", "1.2 Types of Reactions",
+          "1.2.1 Combination Reaction", "1.2.2 Decomposition Reaction"]
+
+
+def test_progress_keeps_current_and_completed_per_session():
+    store = ProgressStore()
+    store.record_started("a", "Chemical Equations")
+    assert store.get("a") == {"current": "Chemical Equations", "completed": []}
+
+    store.record_completed("a", "Chemical Equations")
+    store.record_started("a", "Writing Equations")
+    # A reconnecting student resumes where they left off
+    assert store.get("a") == {"current": "Writing Equations", "completed": ["Chemical Equations"]}
+    assert store.completed("a") == {"chemical equations"}
+    assert store.get("b") == {"current": None, "completed": []}
+
+
+def test_idle_sessions_expire(monkeypatch):
+    store = ProgressStore(ttl=60)
+    store.record_completed("a", "Chemical Equations")
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    store.record_started("a", "Writing Equations")
+    assert store.get("a") == {"current": "Writing Equations", "completed": []}
+
+
+def test_next_topic_follows_textbook_order_and_skips_completed():
+    order = TopicOrder(TITLES)
+    assert order.next_topic("Chemical Equations") == "Writing Equations"
+    assert order.next_topic("1.2 Types of Reactions", {"combination reaction"}) == "Decomposition Reaction"
+    assert order.next_topic("Decomposition Reaction") is None
+    assert order.next_topic("Photosynthesis") is None
+
+
+def test_prefetch_is_built_once_per_topic():
+    builds = []
+
+    async def build(topic):
+        builds.append(topic)
+        await asyncio.sleep(0.05)
+        return PrefetchedLesson(topic, "prompt", "Opening.")
+
+    async def run():
+        prefetcher = LessonPrefetcher(build)
+        prefetcher.schedule("1.2 Types of Reactions")
+        prefetcher.schedule("Types of  reactions")  # same topic, still building
+        lesson = await prefetcher.take("Types of Reactions")  # joins the build in progress
+        prefetcher.schedule("Types of Reactions")  # cached
+        return prefetcher, lesson
+
+    prefetcher, lesson = asyncio.run(run())
+    assert builds == ["1.2 Types of Reactions"]
+    assert lesson.opening == "Opening."
+    assert prefetcher.stats()["inflight_hits"] == 1 and prefetcher.stats()["scheduled"] == 1
+
+
+def test_cancelled_prefetch_is_not_served():
+    async def build(topic):
+        await asyncio.sleep(10)
+
+    async def run():
+        prefetcher = LessonPrefetcher(build, join_wait=0.05)
+        prefetcher.schedule("Combination Reaction")
+        task = prefetcher._tasks["combination reaction"]
+        await asyncio.sleep(0)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return prefetcher, await prefetcher.take("Combination Reaction")
+
+    prefetcher, lesson = asyncio.run(run())
+    assert lesson is None
+    assert prefetcher.stats()["building"] == 0 and prefetcher.stats()["ready"] == 0
@@ -0,0 +1,42 @@
+from LANGCHAIN.TOOLS.prompt_builder import (
+    MIN_TTFT_SAMPLES, PromptStats, PromptTemplate, count_tokens, truncate_to_tokens,
+)
+
+
+def test_truncate_keeps_whole_sentences():
+    text = "First sentence here. Second sentence follows. Third one is last."
+    assert truncate_to_tokens(text, count_tokens("First sentence here.") + 1) == "First sentence here."
+
+
+def test_truncate_cuts_oversized_first_sentence():
+    text = " ".join(["word"] * 200) + "."
+    cut = truncate_to_tokens(text, 40)
+    assert cut and text.startswith(cut)
+    assert count_tokens(cut) <= 40
+
+
+def test_pack_truncates_long_passage_under_budget():
+    template = PromptTemplate("test", prefix="P\n", body="{content}", budget=60)
+    content, used, raw = template.pack([(1.0, " ".join(["alpha"] * 300))])
+    assert content and used <= 60 < raw
+
+
+def test_ttft_estimate_uses_prompt_size_slope():
+    stats = PromptStats()
+    stats.record_build("lesson", 3000, 1000, 0.001)
+    # 0.5 s fixed overhead + 0.2 ms per prompt token
+    for i in range(MIN_TTFT_SAMPLES):
+        tokens = 500 + 100 * i
+        stats.record_ttft("lesson", tokens, 0.5 + 0.0002 * tokens)
+    entry = stats.summary()["lesson"]
+    assert abs(entry["ttft_seconds_per_1k_tokens"] - 0.2) < 1e-6
+    assert abs(entry["est_ttft_delta_seconds"] + 0.4) < 1e-6
+
+
+def test_ttft_estimate_needs_samples():
+    stats = PromptStats()
+    stats.record_build("lesson", 3000, 1000, 0.001)
+    stats.record_ttft("lesson", 1000, 0.7)
+    entry = stats.summary()["lesson"]
+    assert entry["ttft_seconds_per_1k_tokens"] is None
+    assert "est_ttft_delta_seconds" not in entry
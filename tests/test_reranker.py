@@ -0,0 +1,95 @@
+import numpy as np
+
+from LANGCHAIN.TOOLS import refactored_retriever
+from LANGCHAIN.TOOLS.refactored_retriever import RAGRetriever
+from LANGCHAIN.TOOLS.reranker import CrossEncoderReranker
+
+
+class StubModel:
+    """Scores a pair by how many query words the passage contains."""
+
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, pairs, batch_size=None, show_progress_bar=False):
+        self.calls.append(list(pairs))
+        return [sum(word in passage.lower() for word in query.lower().split()) for query, passage in pairs]
+
+
+def stub_reranker(**kwargs):
+    stub = StubModel()
+    ranker = CrossEncoderReranker("stub", **kwargs)
+    ranker._model = stub
+    return ranker, stub
+
+
+PASSAGES = ["plants need light", "cells divide", "plant cells have walls"]
+
+
+def test_rerank_orders_best_first():
+    ranker, _ = stub_reranker()
+    ranked = ranker.rerank("plant cells", PASSAGES, top_n=3)
+    assert [item for _, item in ranked] == ["plant cells have walls", "plants need light", "cells divide"]
+    assert [score for score, _ in ranked] == [2.0, 1.0, 1.0]
+
+
+def test_rerank_keeps_top_n():
+    ranker, _ = stub_reranker()
+    ranked = ranker.rerank("plant cells", PASSAGES, top_n=1)
+    assert ranked == [(2.0, "plant cells have walls")]
+    assert ranker.rerank("plant cells", [], top_n=2) == []
+
+
+def test_scores_are_cached():
+    ranker, stub = stub_reranker()
+    ranker.score("Plant cells", PASSAGES[:2])
+    ranker.score("plant  CELLS", PASSAGES)
+    assert stub.calls == [
+        [("Plant cells", "plants need light"), ("Plant cells", "cells divide")],
+        [("plant  CELLS", "plant cells have walls")],
+    ]
+    stats = ranker.stats()
+    assert (stats["hits"], stats["misses"], stats["cached_pairs"]) == (2, 3, 3)
+
+
+def test_cache_evicts_least_recently_used():
+    ranker, stub = stub_reranker(cache_size=2)
+    ranker.score("cells", PASSAGES)
+    ranker.score("cells", [PASSAGES[0]])
+    assert stub.calls[-1] == [("cells", PASSAGES[0])]
+    assert ranker.stats()["cached_pairs"] == 2
+
+
+class FakeEncoder:
+    def encode(self, sentences, convert_to_numpy=True):
+        return np.ones((len(sentences), 2), dtype=np.float32)
+
+
+class FakeIndex:
+    def search(self, query, k):
+        return np.full((1, k), 0.9, dtype=np.float32), np.arange(k).reshape(1, -1) % len(PASSAGES)
+
+
+class FakeStore:
+    def text(self, idx):
+        return PASSAGES[idx]
+
+
+def fake_retriever(monkeypatch):
+    ranker, _ = stub_reranker()
+    monkeypatch.setattr(refactored_retriever, "get_reranker", lambda: ranker)
+    retriever = RAGRetriever.__new__(RAGRetriever)
+    retriever.embed_model, retriever.index, retriever.store = FakeEncoder(), FakeIndex(), FakeStore()
+    return retriever
+
+
+def test_rerank_top_k_is_the_default(monkeypatch):
+    retriever = fake_retriever(monkeypatch)
+    monkeypatch.setattr(refactored_retriever, "RERANK_TOP_K", 2)
+    assert retriever.retrieve("plant cells", rerank=True) == ["plant cells have walls"] * 2
+
+
+def test_explicit_k_is_not_capped(monkeypatch):
+    retriever = fake_retriever(monkeypatch)
+    assert len(retriever.retrieve("plant cells", k=5, rerank=True)) == 5
+    assert len(retriever.retrieve("plant cells", rerank=False)) == 5
@@ -0,0 +1,89 @@
+import json
+
+import pytest
+
+import app as flask_app
+from LANGCHAIN.TOOLS import shards
+
+TITLES = {"sci8": ["Cell Structure"], "bio9": ["Photosynthesis"], "phy10": ["Photosynthesis and Light"]}
+
+
+class FakeCorpus:
+    def __init__(self, titles):
+        self._titles = titles
+
+    def text(self, section_id):
+        return f"About {self._titles[section_id]}."
+
+
+class FakeShard:
+    loads = []
+    sizes = {}
+    inner_product = {}
+
+    def __init__(self, book, encoder, on_resize=None):
+        self.book = book
+        self.corpus = FakeCorpus(TITLES[book.id])
+        self.higher_is_better = FakeShard.inner_product.get(book.id, False)
+        self._on_resize = on_resize
+        FakeShard.loads.append(book.id)
+
+    def nbytes(self):
+        return FakeShard.sizes.get(self.book.id, 0)
+
+    def attach_index(self, nbytes):
+        FakeShard.sizes[self.book.id] = nbytes
+        self._on_resize(self)
+
+
+@pytest.fixture
+def manager(monkeypatch, tmp_path):
+    FakeShard.loads, FakeShard.sizes, FakeShard.inner_product = [], {}, {}
+    monkeypatch.setattr(shards, "Shard", FakeShard)
+    books = []
+    for book_id, titles in TITLES.items():
+        (tmp_path / book_id).mkdir()
+        (tmp_path / book_id / "metadata.json").write_text(
+            json.dumps([{"chapter": "Chapter 1", "title": title} for title in titles]), encoding="utf-8"
+        )
+        books.append(shards.Book(book_id, root=str(tmp_path / book_id), grade=8, subject="science"))
+    manager = shards.ShardManager(shards.Catalog(books), encoder=None, memory_budget_mb=1)
+    monkeypatch.setattr(flask_app, "get_shards", lambda: manager)
+    return manager
+
+
+def test_route_without_filters_is_default_book_only(manager):
+    assert manager.catalog.route() == ["sci8"]
+    assert manager.catalog.route(grade=8) == ["sci8", "bio9", "phy10"]
+
+
+def test_map_keeps_book_order(manager):
+    assert manager.map(lambda shard: shard.book.id, ["phy10", "sci8", "bio9"]) == ["phy10", "sci8", "bio9"]
+
+
+@pytest.mark.parametrize("mode", ["hybrid", "exact"])
+@pytest.mark.parametrize("preloaded", [[], ["phy10"], ["bio9"]])
+def test_title_match_does_not_depend_on_loaded_shards(manager, mode, preloaded):
+    for book_id in preloaded:
+        manager.get(book_id)
+    results = flask_app.search("photosynthesis", mode=mode, books=["sci8", "bio9", "phy10"])
+    assert [(r["book"], r["title_key"]) for r in results] == [("bio9", "Photosynthesis")]
+    # Titles are scanned from metadata; only the matching book is loaded
+    assert set(FakeShard.loads) == set(preloaded) | {"bio9"}
+
+
+def test_lazily_attached_index_counts_against_budget(manager):
+    sci8 = manager.get("sci8")
+    manager.get("bio9")
+    assert set(manager.stats()["loaded"]) == {"sci8", "bio9"}
+    sci8.attach_index(2 * 1024 * 1024)
+    # Over budget: the least recently used other shard goes, the resized one stays
+    assert manager.stats()["loaded"] == {"sci8": 2 * 1024 * 1024}
+
+
+def test_mixed_index_metrics_are_rejected(manager):
+    FakeShard.inner_product = {"bio9": True}
+    manager.get("sci8")
+    with pytest.raises(ValueError, match="metric"):
+        manager.get("bio9")
+    assert list(manager.stats()["loaded"]) == ["sci8"]
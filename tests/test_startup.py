@@ -0,0 +1,26 @@
+import threading
+import time
+
+from LANGCHAIN.TOOLS.startup import load_once
+
+
+def test_load_once_builds_each_value_once_under_concurrency():
+    loads = []
+
+    @load_once
+    def load(name="model"):
+        loads.append(name)
+        time.sleep(0.1)
+        return object()
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(load())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert loads == ["model"]
+    assert all(result is results[0] for result in results)
+    assert load("other") is not results[0]
+    assert load.is_loaded()
@@ -0,0 +1,50 @@
+import asyncio
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import pytest
+
+from LANGCHAIN.TOOLS import video_fetcher, video_worker
+from LANGCHAIN.TOOLS.video_worker import VideoWorker
+
+VIDEO = {"title": "Photosynthesis", "url": "https://youtu.be/x", "id": "x"}
+
+
+@pytest.fixture
+def slow_search(monkeypatch):
+    calls = []
+
+    def fetch(topic, socket_timeout=10):
+        calls.append(socket_timeout)
+        time.sleep(0.5)
+        return VIDEO
+
+    monkeypatch.setattr(video_fetcher, "fetch_animated_videos", fetch)
+    return calls
+
+
+def test_search_gives_up_at_its_deadline(slow_search):
+    start = time.perf_counter()
+    assert video_worker._search("photosynthesis", time.time() + 0.1) is None
+    assert time.perf_counter() - start < 0.4
+    assert slow_search and slow_search[0] <= 0.1
+
+
+def test_search_expired_in_queue_is_skipped(slow_search):
+    assert video_worker._search("photosynthesis", time.time() - 1) is None
+    assert slow_search == []
+
+
+def test_search_within_deadline_returns_video(slow_search):
+    assert video_worker._search("photosynthesis", time.time() + 2) == VIDEO
+
+
+def test_no_coalescing_onto_expired_search():
+    worker = VideoWorker(search_timeout=5)
+    worker._pool = ThreadPoolExecutor(max_workers=1)
+    worker._inflight["photosynthesis"] = (Future(), time.time() - 1)
+    start = time.perf_counter()
+    assert asyncio.run(worker.lookup("Photosynthesis", deadline=2)) is None
+    assert time.perf_counter() - start < 0.5
+    assert worker.counts["timeouts"] == 1 and worker.counts["coalesced"] == 0
+    worker.shutdown()